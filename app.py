@@ -1,19 +1,25 @@
 # app.py
-from flask import Flask, jsonify, request, send_from_directory, send_file, render_template, session, redirect, url_for
+from flask import Flask, jsonify, request, send_from_directory, send_file, render_template, session, redirect, url_for, g, has_request_context
 from flask_cors import CORS
 import pandas as pd
+import numpy as np
 import json
 from datetime import datetime, timezone
 import requests
 import math
 import threading
+import atexit
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import time
-import random
 import io
 import base64
 import sqlite3
 import hashlib
 import hmac
+import secrets
 import os  # add this
 import base64  # already present later, fine
 import hashlib
@@ -26,7 +32,46 @@ from dotenv import load_dotenv
 # Load variables from .env or app_config.bin
 # load_dotenv() <-- replaced by config_loader
 from backend import config_loader
+import gc
+from backend.pollutant_store import PollutantFrame, POLLUTANTS
+from backend.live_share import LiveStateStore, LeaseHeartbeat, LIVE_STATE_DB, worker_id
+from backend.scheduler import SourceSchedule
+from backend.intervention_model import intervention_effect_array, stagnation_factor, weather_inputs, quantize_weather
+from backend.uncertainty import run_monte_carlo, DEFAULT_PERCENTILES
+from backend.placement import optimize_placement, DEFAULT_RESOLUTION
+from backend.scenarios import ScenarioStore, ScenarioOverlay, SCENARIO_MAX_BYTES
+from backend.activity_log import ActivityLogger, ACTIVITIES_DB
+from backend.env_table import EnvTable, synthetic_env
+from backend.dataset_cache import (
+    source_fingerprint, cache_key, read_cache, write_cache, frame_to_arrays, arrays_to_frame,
+    build_baseline_cube, day_of_year, valid_month_day,
+    month_day_of, day_slots, quantize_co2, DAYS_PER_YEAR, QUANT_MISSING, DAY_MISSING,
+)
+from backend.hot_reload import RWLock, FileWatcher, DATASET_WATCH_INTERVAL
+from backend.shared_arrays import SharedArrays, default_root, deployment_namespace, SHARED_ARRAYS_ENV_DIR
+from backend.station_day import LeanStationDay, lean_frame, frame_bytes, memory_report, STATION_DAY_COLUMNS, LEAN_NUMERIC_COLUMNS
+from backend.station_history import StationHistory, RESAMPLE_FREQS
+from backend.climatology import (
+    build_climatology, station_climatology, city_climatology, CLIMATOLOGY_STATS, CLIMATOLOGY_WINDOW,
+)
+from backend.anomalies import anomaly_scores, ANOMALY_BANDS
+from backend.chunked_dataset import container_key, read_csv_chunked, concat_frames, DEFAULT_WORKERS, DEFAULT_CHUNK_ROWS
+_t_config = time.perf_counter()
 config_loader.load_config()
+_config_ms = (time.perf_counter() - _t_config) * 1000.0
+
+
+def env_number(name, default, cast=int):
+    """Numeric setting from the environment; a malformed value warns and falls back to `default`."""
+    raw = os.environ.get(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        print(f"[warning] {name}={raw!r} is not a valid {cast.__name__}; using {default}")
+        return default
+
 
 app = Flask(__name__)
 
@@ -41,19 +86,45 @@ else:
 
 ENCRYPTED_DIR = "encrypted"
 
+# Chunked containers (tools/chunked_datasets.py): "<name>.cenc" is used instead of
+# "<name>.enc" when present; chunks are decrypted + parsed by this many threads
+CHUNKED_SUFFIX = ".cenc"
+DATASET_DECRYPT_WORKERS = env_number("DATASET_DECRYPT_WORKERS", DEFAULT_WORKERS)
+
+
+def encrypted_dataset_path(filename_enc: str):
+    """Path of the file actually loaded for `filename_enc` (chunked variant first)."""
+    path = os.path.join(ENCRYPTED_DIR, filename_enc)
+    if path.endswith(".enc"):
+        chunked = path[:-len(".enc")] + CHUNKED_SUFFIX
+        if os.path.exists(chunked):
+            return chunked
+    return path
+
 
-def load_encrypted_csv(filename_enc: str, **read_csv_kwargs):
+def load_encrypted_csv(filename_enc: str, transform=None, **read_csv_kwargs):
     """
-    Decrypt a .csv.enc file and return a pandas DataFrame.
+    Decrypt a .csv.enc file (or its chunked .csv.cenc variant) and return a
+    pandas DataFrame. transform(df) -> df, if given, is applied chunk by chunk
+    while parsing, so the untransformed frame never exists in full.
     """
     if not data_fernet:
         raise RuntimeError("DATA_FERNET_KEY not configured for encrypted CSV")
-    path = os.path.join(ENCRYPTED_DIR, filename_enc)
+    path = encrypted_dataset_path(filename_enc)
+    if path.endswith(CHUNKED_SUFFIX):
+        return read_csv_chunked(
+            path, container_key(DATA_FERNET_KEY.encode("utf-8")),
+            workers=DATASET_DECRYPT_WORKERS, transform=transform, **read_csv_kwargs,
+        )
     with open(path, "rb") as f:
         enc_data = f.read()
     raw = data_fernet.decrypt(enc_data)
     buf = io.BytesIO(raw)
-    return pd.read_csv(buf, **read_csv_kwargs)
+    if transform is None:
+        return pd.read_csv(buf, **read_csv_kwargs)
+    return concat_frames([
+        transform(chunk) for chunk in pd.read_csv(buf, chunksize=DEFAULT_CHUNK_ROWS, **read_csv_kwargs)
+    ])
 
 
 def load_encrypted_json(filename_enc: str):
@@ -93,7 +164,7 @@ def init_db():
     conn.close()
 
 def init_activity_db():
-    conn = sqlite3.connect("activities.db")
+    conn = sqlite3.connect(ACTIVITIES_DB)
     cur = conn.cursor()
     cur.execute("""
         CREATE TABLE IF NOT EXISTS activities (
@@ -111,6 +182,14 @@ def init_activity_db():
     conn.commit()
     conn.close()
 
+
+def init_databases():
+    """Create the users / activities tables and open the shared live-state DB."""
+    global live_state_store
+    init_db()
+    init_activity_db()
+    live_state_store = LiveStateStore(LIVE_STATE_DB)
+
 # ----------------------- LOGIN / REGISTER ROUTES -----------------------
 
 @app.route("/register", methods=["GET", "POST"])
@@ -177,6 +256,29 @@ OPENAQ_COUNTRY = "IN"
 # OpenAQ v3 parameter IDs – 2 = PM2.5
 OPENAQ_PM25_PARAM_ID = 2
 
+# Parameters pulled for the live estimate, in priority order (PM2.5 first so it
+# wins the call budget when we are close to the rate limit).
+# v3 parameter id -> (pollutant key, multiplier to CPCB units)
+OPENAQ_PARAMETERS = {
+    OPENAQ_PM25_PARAM_ID: ("pm25", 1.0),  # µg/m³
+    1: ("pm10", 1.0),                     # µg/m³
+    5: ("no2", 1.0),                      # µg/m³
+    4: ("co", 0.001),                     # µg/m³ -> mg/m³ (CPCB reports CO in mg/m³)
+}
+
+# India bounding box (min_lon, min_lat, max_lon, max_lat) – used for the
+# server-side /locations filter and as a cheap client-side pre-filter
+OPENAQ_INDIA_BBOX = (68.0, 6.5, 97.5, 37.5)
+
+# Ignore sensors whose latest reading is older than this (server-side filter)
+OPENAQ_MAX_AGE_HOURS = 6
+
+# Parallel page fetches (still bounded by OPENAQ_MAX_CALLS_PER_MIN)
+OPENAQ_MAX_WORKERS = 4
+
+# How long the list of Indian OpenAQ location ids stays valid
+OPENAQ_LOCATIONS_TTL = 24 * 3600
+
 
 # ---- OpenAQ cache & rate limiting ----
 OPENAQ_CACHE_TTL = 600          # seconds (10 minutes) - reuse latest OpenAQ mapping
@@ -186,20 +288,26 @@ OPENAQ_MAX_CALLS_PER_MIN = 20   # be polite with OpenAQ API
 # { "ts": unix_time, "co2_map": {...}, "ts_map": {...} }
 openaq_live_cache = {}
 
-# rolling window of timestamps of calls
+# { "ts": unix_time, "ids": set(location ids in India) }
+openaq_locations_cache = {}
+
+# rolling window of timestamps of calls (shared by parallel page fetches)
 recent_openaq_calls = []
+openaq_calls_lock = threading.Lock()
 
 
 
 # How often to refresh live data in the background (seconds); set to None to disable
-LIVE_REFRESH_INTERVAL_SECONDS = 300  # 5 minutes
+# (LIVE_REFRESH_INTERVAL_SECONDS=0 in the environment disables it too, e.g. for tools)
+LIVE_REFRESH_INTERVAL_SECONDS = env_number("LIVE_REFRESH_INTERVAL_SECONDS", 300) or None  # 5 minutes
+
+# Capture mode: if set, every raw CPCB / OpenAQ payload is saved under this
+# directory for offline replay (tools/replay_ingest.py)
+LIVE_CAPTURE_DIR = os.environ.get("LIVE_CAPTURE_DIR") or None
 
 # Max distance (meters) to map a CPCB station to one of your stations
 CPCB_MATCH_RADIUS_M = 20000  # 20 km; tune later if needed
 
-# Session RNG: seed once so generated env values are stable for a process lifetime
-SESSION_SEED = int(time.time())
-RNG = random.Random(SESSION_SEED)
 # ---- Weather cache & rate limiting ----
 WEATHER_CACHE_TTL = 900          # 15 minutes per city
 WEATHER_MAX_CALLS_PER_MIN = 60   # OpenWeather free limit (approx)
@@ -234,9 +342,6 @@ def save_weather_cache_to_disk():
     except Exception as e:
         print("[weather] failed to save disk cache:", e)
 
-init_db()
-init_activity_db();
-load_weather_cache_from_disk()
 
 # ------------ Data integrity (HMAC-SHA256) ------------
 
@@ -248,6 +353,18 @@ if not INTEGRITY_SECRET:
 INTEGRITY_SECRET = INTEGRITY_SECRET.encode("utf-8")
 
 
+# Tokens are cached by their normalized fields: a changed CO2 / env value is a
+# different key, so stale tokens are never served and simply age out of the LRU.
+INTEGRITY_TOKEN_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=INTEGRITY_TOKEN_CACHE_SIZE)
+def _integrity_token_for(fields):
+    """HMAC-SHA256 over the normalized (name, city, co2, ndvi, albedo, lulc) strings."""
+    message = "|".join(fields)
+    return hmac.new(INTEGRITY_SECRET, message.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
 def _compute_station_integrity_token(*, name, city, co2, ndvi, albedo, lulc):
     """
     Build a stable message from key station fields and compute HMAC-SHA256.
@@ -260,8 +377,7 @@ def _compute_station_integrity_token(*, name, city, co2, ndvi, albedo, lulc):
     lulc_str = str(lulc)
     city_str = (city or "")
 
-    message = "|".join([name, city_str, co2_str, ndvi_str, albedo_str, lulc_str])
-    return hmac.new(INTEGRITY_SECRET, message.encode("utf-8"), hashlib.sha256).hexdigest()
+    return _integrity_token_for((name, city_str, co2_str, ndvi_str, albedo_str, lulc_str))
 
 
 def _get_station_city(station_name: str):
@@ -286,16 +402,6 @@ OPENAQ_API_KEY = os.environ.get("OPENAQ_API_KEY")
 if not OPENAQ_API_KEY:
     print("[warning] OPENAQ_API_KEY not set; OpenAQ fallback will not work")
 
-# Generated env value ranges (realistic-ish)
-GEN_NDVI_RANGE = (0.15, 0.45)   # low to moderate vegetation
-GEN_ALBEDO_RANGE = (0.12, 0.20) # typical urban albedo range
-# plausible LULC categories (these should match keys in your lulc_mapping where possible)
-GEN_LULC_CHOICES = [
-    "Urban", "Industrial", "Residential", "Campus", "Rural",
-    "Mixed Urban", "Industrial/Residential", "Urban Vegetation",
-    "Airport", "Sports Complex", "Government", "Mixed Forest"
-]
-
 # ----------- Weather config -----------
 # Using Open-Meteo (no API key required) for simple current weather
 WEATHER_API_BASE = "https://api.open-meteo.com/v1/forecast"
@@ -320,27 +426,176 @@ def index():
 def static_files(filename):
     return send_from_directory("static", filename)
 
-# ----------- Load station locations -----------
-station_df = load_encrypted_csv("station_loc.csv.enc", quotechar='"')
-stations = []
-for _, row in station_df.iterrows():
-    stations.append({
-        "name": row["StationName"],
-        "city": row["City"],
-        "state": row["State"],
-        "lat": float(row["Lat"]),
-        "lon": float(row["Lon"])
-    })
+# ----------- Encrypted datasets + derived cache -----------
+DATASET_FILES = (
+    "station_loc.csv.enc",
+    "station_id.json.enc",
+    "station_day.csv.enc",
+    "station_env_factors.csv.enc",
+)
+# Lean station_day: only StationId / Date / CO / PM2.5 / PM10 / NO2, as categorical
+# + registry ids, int32 day numbers and float32 (STATION_DAY_LEAN=0 keeps the full CSV frame)
+STATION_DAY_LEAN = os.environ.get("STATION_DAY_LEAN", "1") != "0"
+# Parsed datasets + baseline cube, encrypted, keyed by a hash of the .enc files
+DATASET_CACHE_PATH = os.environ.get("DATASET_CACHE_PATH") or os.path.join(ENCRYPTED_DIR, "derived_cache.bin")
+
+
+def _load_datasets_from_sources():
+    """Decrypt + parse every dataset and derive the baseline cube (slow path)."""
+    station_df = load_encrypted_csv("station_loc.csv.enc", quotechar='"')
+    station_map = load_encrypted_json("station_id.json.enc")
+
+    # Cube columns: registry stations first (column = registry id), then names
+    # that only appear in station_map
+    baseline_names = [str(n) for n in station_df["StationName"]]
+    known = set(baseline_names)
+    for name in station_map.values():
+        if name not in known:
+            known.add(name)
+            baseline_names.append(name)
+
+    if STATION_DAY_LEAN:
+        lean = LeanStationDay(station_map, baseline_names)
+        station_day_df = load_encrypted_csv(
+            "station_day.csv.enc", transform=lean, usecols=list(STATION_DAY_COLUMNS),
+        )
+        cube_rows = station_day_df
+        default_bytes = lean.default_bytes
+    else:
+        station_day_df = load_encrypted_csv("station_day.csv.enc")
+        station_day_df['Date'] = pd.to_datetime(station_day_df['Date'])
+        cube_rows = lean_frame(station_day_df, station_map, {n: j for j, n in enumerate(baseline_names)})
+        default_bytes = frame_bytes(station_day_df)
+    env_df = load_encrypted_csv("station_env_factors.csv.enc")
+
+    baseline_cube, baseline_rows = build_baseline_cube(
+        cube_rows["StationIdx"], cube_rows["Day"], cube_rows["CO"], len(baseline_names),
+    )
+
+    return {
+        "station_df": station_df,
+        "station_map": station_map,
+        "station_day_df": station_day_df,
+        "station_day_default_bytes": default_bytes,
+        "env_df": env_df,
+        "baseline_names": baseline_names,
+        "baseline_cube": baseline_cube,
+        "baseline_rows": baseline_rows,
+    }
+
+
+def _datasets_to_arrays(ds):
+    return {
+        **frame_to_arrays(ds["station_df"], "station_loc"),
+        **frame_to_arrays(ds["station_day_df"], "station_day"),
+        **frame_to_arrays(ds["env_df"], "env"),
+        "station_map.keys": np.array(list(ds["station_map"].keys())),
+        "station_map.values": np.array(list(ds["station_map"].values())),
+        "baseline.names": np.array(ds["baseline_names"]),
+        "baseline.cube": ds["baseline_cube"],
+        "baseline.rows": ds["baseline_rows"],
+        "station_day.default_bytes": np.array(ds["station_day_default_bytes"], dtype=np.int64),
+    }
+
+
+def _datasets_from_arrays(arrays):
+    return {
+        "station_df": arrays_to_frame(arrays, "station_loc"),
+        "station_map": dict(zip(arrays["station_map.keys"].tolist(), arrays["station_map.values"].tolist())),
+        "station_day_df": arrays_to_frame(arrays, "station_day"),
+        "env_df": arrays_to_frame(arrays, "env"),
+        "baseline_names": arrays["baseline.names"].tolist(),
+        "baseline_cube": arrays["baseline.cube"],
+        "baseline_rows": arrays["baseline.rows"],
+        "station_day_default_bytes": int(arrays["station_day.default_bytes"]),
+    }
+
 
-# Load station ID mapping
-station_map = load_encrypted_json("station_id.json.enc")
+def dataset_source_paths():
+    """Files the datasets are loaded from (chunked variants where present)."""
+    return [encrypted_dataset_path(f) for f in DATASET_FILES]
 
-# ----------- Load historic CO data -----------
-station_day_df = load_encrypted_csv("station_day.csv.enc")
-station_day_df['Date'] = pd.to_datetime(station_day_df['Date'])
 
-# Track current CO2 baseline values (from your CSV)
+def current_source_fingerprint():
+    return source_fingerprint(dataset_source_paths(), variant="lean" if STATION_DAY_LEAN else "full")
+
+
+def load_datasets():
+    """
+    Datasets from the derived cache when it matches the current .enc files,
+    otherwise from the sources (and the cache is rewritten).
+    """
+    t0 = time.perf_counter()
+    fingerprint = None
+    key = cache_key(DATA_FERNET_KEY.encode("utf-8")) if DATA_FERNET_KEY else None
+    if key:
+        try:
+            fingerprint = current_source_fingerprint()
+            arrays = read_cache(DATASET_CACHE_PATH, key, fingerprint)
+            if arrays is not None:
+                ds = _datasets_from_arrays(arrays)
+                ds["fingerprint"] = fingerprint
+                print(f"[data] loaded derived cache in {(time.perf_counter() - t0) * 1000:.0f} ms")
+                return ds
+        except Exception as e:
+            print("[data] derived cache unusable, rebuilding:", e)
+
+    ds = _load_datasets_from_sources()
+    ds["fingerprint"] = fingerprint
+    print(f"[data] parsed encrypted datasets in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    if fingerprint and DATASET_CACHE_PATH:
+        try:
+            write_cache(DATASET_CACHE_PATH, key, fingerprint, _datasets_to_arrays(ds))
+        except Exception as e:
+            print("[data] could not write derived cache:", e)
+    return ds
+
+
+# ----------- Dataset subsystem (filled in by init_datasets) -----------
+# Everything below is empty until init_datasets() runs (create_app(), preload_app()
+# or the first request); it is read-only afterwards, so a pre-forking server can
+# load it once in the parent and share it copy-on-write. A hot reload replaces
+# all of it at once (see reload_datasets).
+dataset_fingerprint = None   # identifies the loaded .enc / .cenc contents
+dataset_version = 0          # bumped on every (re)load in this process
+
+# Station registry: registry id of each station = its position in `stations`;
+# station_lat / station_lon: float64 coordinates in registry order
+station_df = None
+stations = []
+station_index = {}
+station_lat = None
+station_lon = None
+
+# StationId -> station name, and its inverse (first StationId wins, like the old linear scans)
+station_map = {}
+station_id_by_name = {}
+
+# Historic CO data; station_history: the same rows as sorted per-station CO2 series
+station_day_df = None
+station_day_memory = {}
+station_history = None
+
+# Day-of-year climatology (backend/climatology.py): climatology_stations[doy, column, stat]
+# per baseline cube column, climatology_cities[doy, k, stat] for climatology_city_names[k]
+climatology_stations = None
+climatology_cities = None
+# climatology_estimates[doy, station, stat]: the same per registry station, but of
+# estimate_co2_array over the historic pollutants, i.e. on the scale of the live
+# estimate (CO * 1000 and the pollutant heuristic are not comparable)
+climatology_estimates = None
+climatology_city_names = []
+
+# baseline_cube[day_of_year, j]: sanitized CO2 of baseline_names[j] (NaN = no row);
+# baseline_rows[day_of_year]: station_day rows on that day
+baseline_names = []
+baseline_cube = None
+baseline_rows = None
+
+# Track current CO2 baseline values (from your CSV) and the (month, day) they are for
 station_co2 = {}
+baseline_day = None
 
 def _sanitize_co2(value, default=400.0, min_val=350.0, max_val=2000.0):
     """
@@ -360,32 +615,24 @@ def _sanitize_co2(value, default=400.0, min_val=350.0, max_val=2000.0):
     return v
 
 
-def load_today_co2():
-    """Populate station_co2 from station_day.csv using today's month/day."""
-    today = datetime.now()
-    df_today = station_day_df[
-        (station_day_df['Date'].dt.month == today.month) &
-        (station_day_df['Date'].dt.day == today.day)
-    ]
+def _baseline_values(cube, rows, names, month, day):
+    doy = int(day_of_year(month, day))
+    row = cube[doy]
+    present = np.flatnonzero(~np.isnan(row))
+    return {names[j]: float(row[j]) for j in present}, int(rows[doy])
 
-    for _, row in df_today.iterrows():
-        station_name = station_map.get(row['StationId'])
-        if station_name:
-            raw_co = None if pd.isna(row['CO']) else row['CO'] * 1000
-            co2_value = _sanitize_co2(raw_co, default=400.0, min_val=350.0, max_val=2000.0)
-            station_co2[station_name] = co2_value
 
-load_today_co2()
+def _baseline_for_day(month, day):
+    """
+    ({station_name: co2}, number of station_day rows) for a (month, day),
+    read from the baseline cube.
+    """
+    return _baseline_values(baseline_cube, baseline_rows, baseline_names, month, day)
 
-# ----------- Load station environmental factors (baseline stations only) -----------
-env_df = load_encrypted_csv("station_env_factors.csv.enc")
+
+# ----------- Station environmental factors (baseline stations only) -----------
+env_df = None
 station_env = {}  # keyed by StationId (original CSV)
-for _, row in env_df.iterrows():
-    station_env[row["StationId"]] = {
-        "ndvi": float(row["NDVI"]),
-        "albedo": float(row["Albedo"]),
-        "lulc": row["LULC"]
-    }
 
 # LULC → numeric factor mapping
 lulc_mapping = {
@@ -405,101 +652,363 @@ lulc_mapping = {
 
 # ----------- Synthetic env factors for stations without CSV entries -----------
 
-# Cache so values are stable for the whole server run
-synthetic_env_cache = {}
+# LULC labels used for synthetic stations (all present in lulc_mapping)
+SYNTHETIC_LULC_OPTIONS = [
+    "Urban",
+    "Residential",
+    "Industrial",
+    "Mixed Urban",
+    "Urban Vegetation",
+    "Campus",
+    "Government",
+]
+
+# Synthetic values come from a keyed hash of the station name, so every worker
+# and every restart agrees on them (and on the integrity tokens built from them).
+ENV_SYNTH_KEY = (os.environ.get("ENV_SYNTH_KEY") or "").encode("utf-8") or INTEGRITY_SECRET
+# Optional .npz file to persist the table between restarts
+ENV_TABLE_PATH = os.environ.get("ENV_TABLE_PATH") or None
+
+# env_table: measured + synthetic env for every registry station (array backed)
+env_table = None
+
+def _has_measured_env(station_name):
+    """True if the station has real (CSV) env factors rather than synthetic ones."""
+    sid = station_index.get(station_name)
+    if sid is not None:
+        return bool(env_table.measured[sid])
+    return station_id_by_name.get(station_name) in station_env
+
 
 def get_or_generate_env_for_station(station_name: str):
     """
-    1. If station has a real StationId in station_env, return that.
-    2. Otherwise, generate synthetic NDVI/LULC/Albedo in a realistic range,
-       using hash(station_name) so values stay stable for this process.
+    Env dict {ndvi, albedo, lulc} for a station:
+      1. real values from station_env if the station has a StationId entry there,
+      2. otherwise deterministic synthetic values (see backend/env_table.py).
+    Registry stations are a lookup in env_table.
     """
-    # 1) Try real mapping via StationId
-    station_id = None
-    for sid, name in station_map.items():
-        if name == station_name:
-            station_id = sid
-            break
+    sid = station_index.get(station_name)
+    if sid is not None:
+        return env_table.row(sid)
 
-    if station_id and station_id in station_env:
+    station_id = station_id_by_name.get(station_name)
+    if station_id is not None and station_id in station_env:
         return station_env[station_id]
+    return synthetic_env(station_name, ENV_SYNTH_KEY, SYNTHETIC_LULC_OPTIONS)
+
+
+# Older name, same values
+get_env_for_station = get_or_generate_env_for_station
+
+
+def _build_dataset_state(day=None):
+    """
+    Load the datasets and derive everything built from them, without touching
+    the module globals: {global name: value}, ready for _install_dataset_state().
+    `day` = (month, day) of the baseline to select (default: today).
+    """
+    ds = load_datasets()
+    state = {"dataset_fingerprint": ds["fingerprint"], "shared_arrays": None}
+
+    # ----------- Station locations -----------
+    station_df_ = ds["station_df"]
+    registry = []
+    for _, row in station_df_.iterrows():
+        registry.append({
+            "name": row["StationName"],
+            "city": row["City"],
+            "state": row["State"],
+            "lat": float(row["Lat"]),
+            "lon": float(row["Lon"])
+        })
+    state.update({
+        "station_df": station_df_,
+        "stations": registry,
+        "station_index": {s["name"]: i for i, s in enumerate(registry)},
+        "station_lat": np.array([s["lat"] for s in registry], dtype=np.float64),
+        "station_lon": np.array([s["lon"] for s in registry], dtype=np.float64),
+    })
+
+    # ----------- Station ID mapping -----------
+    by_name = {}
+    for sid, name in ds["station_map"].items():
+        by_name.setdefault(name, sid)
+    state.update({"station_map": ds["station_map"], "station_id_by_name": by_name})
+
+    # ----------- Historic CO data -----------
+    memory = memory_report(ds["station_day_df"], ds["station_day_default_bytes"], lean=STATION_DAY_LEAN)
+    print(
+        f"[data] station_day: {memory['rows']} rows, "
+        f"{memory['bytes'] / 1e6:.1f} MB ({'lean' if STATION_DAY_LEAN else 'full'}) vs "
+        f"{memory['default_dtype_bytes'] / 1e6:.1f} MB with default dtypes "
+        f"(saved {memory['saved_pct']}%)"
+    )
+    if day is None:
+        today = datetime.now()
+        day = (today.month, today.day)
+    values, _ = _baseline_values(ds["baseline_cube"], ds["baseline_rows"], ds["baseline_names"], *day)
+    day_df = ds["station_day_df"]
+    if not STATION_DAY_LEAN:
+        day_df = lean_frame(day_df, ds["station_map"], {n: j for j, n in enumerate(ds["baseline_names"])})
+    history = StationHistory.build(day_df["StationIdx"], day_df["Day"], day_df["CO"], len(ds["baseline_names"]))
+
+    t0 = time.perf_counter()
+    city_names = list(dict.fromkeys(s["city"] for s in registry if isinstance(s["city"], str)))
+    city_pos = {c: k for k, c in enumerate(city_names)}
+    city_of_column = np.full(len(history), -1, dtype=np.int64)
+    city_of_column[:len(registry)] = [city_pos.get(s["city"], -1) for s in registry]
+    # the live heuristic over every historic registry-station row with any pollutant
+    station_idx, days = day_df["StationIdx"].to_numpy(), day_df["Day"].to_numpy()
+    pollutants = [day_df[col].to_numpy() for col in ("PM25", "PM10", "NO2", "CO")]
+    usable = (station_idx < len(registry)) & (days != DAY_MISSING) & ~np.all(np.isnan(pollutants), axis=0)
+    state.update({
+        "climatology_stations": station_climatology(history),
+        "climatology_cities": city_climatology(history, city_of_column, len(city_names)),
+        "climatology_city_names": city_names,
+        "climatology_estimates": build_climatology(
+            np.where(usable, station_idx, -1), days, estimate_co2_array(*pollutants), len(registry),
+        ),
+    })
+    print(f"[data] climatology for {len(history)} stations / {len(city_names)} cities "
+          f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    state.update({
+        "station_day_df": ds["station_day_df"],
+        "station_day_memory": memory,
+        "station_history": history,
+        "baseline_names": ds["baseline_names"],
+        "baseline_cube": ds["baseline_cube"],
+        "baseline_rows": ds["baseline_rows"],
+        "station_co2": values,
+        "baseline_day": day,
+    })
+
+    # ----------- Env factors -----------
+    measured = {}
+    for _, row in ds["env_df"].iterrows():
+        measured[row["StationId"]] = {
+            "ndvi": float(row["NDVI"]),
+            "albedo": float(row["Albedo"]),
+            "lulc": row["LULC"]
+        }
+    table, loaded = EnvTable.load_or_build(
+        ENV_TABLE_PATH,
+        [s["name"] for s in registry],
+        {
+            name: measured[sid]
+            for name, sid in by_name.items()
+            if sid in measured
+        },
+        ENV_SYNTH_KEY,
+        SYNTHETIC_LULC_OPTIONS,
+    )
+    print(f"[env] env table for {len(table)} stations "
+          f"({int(table.measured.sum())} measured, {'loaded' if loaded else 'built'})")
+    state.update({"env_df": ds["env_df"], "station_env": measured, "env_table": table})
+
+    if SHARED_ARRAYS:
+        _share_dataset_arrays(state)
+    return state
+
+
+def _install_dataset_state(state):
+    """Make a built dataset state current and bump dataset_version."""
+    global dataset_version
+    globals().update(state)
+    dataset_version += 1
+
+
+def init_datasets():
+    """
+    Decrypt / load the datasets (or the derived cache) and build the station
+    registry, baseline cube, today's baseline and the env table.
+    """
+    _install_dataset_state(_build_dataset_state())
 
-    # 2) Synthetic / cached
-    if station_name in synthetic_env_cache:
-        return synthetic_env_cache[station_name]
-
-    # Use Python's hash() so it is deterministic per run (session),
-    # but different across runs – which is exactly what we want.
-    h = abs(hash(station_name))
-
-    # Two pseudo-random numbers in [0,1)
-    r1 = (h % 1000) / 1000.0
-    r2 = ((h // 1000) % 1000) / 1000.0
-
-    # NDVI: 0.2 – 0.6 (urban-ish → semi-green)
-    ndvi = 0.2 + r1 * 0.4
-
-    # Albedo: 0.12 – 0.22 (typical built-up/road surface range)
-    albedo = 0.12 + r2 * 0.10
-
-    # LULC: choose from known labels so lulc_mapping works
-    lulc_options = [
-        "Urban",
-        "Residential",
-        "Industrial",
-        "Mixed Urban",
-        "Urban Vegetation",
-        "Campus",
-        "Government",
-    ]
-    lulc = lulc_options[h % len(lulc_options)]
 
-    env = {
-        "ndvi": round(ndvi, 2),
-        "albedo": round(albedo, 2),
-        "lulc": lulc,
+# ----------- Shared read-only arrays (backend/shared_arrays.py) -----------
+# The numeric tables are mapped from one shared copy instead of living in every
+# worker's heap (SHARED_ARRAYS=0 keeps private copies).
+SHARED_ARRAYS = os.environ.get("SHARED_ARRAYS", "1") != "0"
+SHARED_ARRAYS_ROOT = os.path.join(
+    os.environ.get(SHARED_ARRAYS_ENV_DIR) or default_root(),
+    deployment_namespace(os.path.dirname(os.path.abspath(__file__))),
+)
+shared_arrays = None  # SharedArrays this worker is attached to
+
+
+def _share_dataset_arrays(state):
+    """
+    Replace the baseline cube, coordinates, env factors, station history,
+    climatology and lean station_day columns of a built dataset state with zero-copy read-only views of the shared
+    set for that dataset version (publishing it if this worker is first).
+    """
+    fingerprint = state["dataset_fingerprint"]
+    if not fingerprint:
+        return
+    table = state["env_table"]
+    day_df = state["station_day_df"]
+    arrays = {
+        "baseline.cube": state["baseline_cube"],
+        "baseline.rows": state["baseline_rows"],
+        "stations.lat": state["station_lat"],
+        "stations.lon": state["station_lon"],
+        "env.ndvi": table.ndvi,
+        "env.albedo": table.albedo,
+        "env.lulc_code": table.lulc_code,
+        "env.measured": table.measured,
+        **state["station_history"].arrays(),
+        "climatology.stations": state["climatology_stations"],
+        "climatology.cities": state["climatology_cities"],
+        "climatology.estimates": state["climatology_estimates"],
     }
+    if STATION_DAY_LEAN:
+        arrays["station_day.StationId"] = day_df["StationId"].array.codes
+        arrays.update({f"station_day.{col}": day_df[col].to_numpy() for col in LEAN_NUMERIC_COLUMNS})
+
+    # one set per dataset + env table version
+    name = hashlib.sha256(f"{fingerprint}|{table.fingerprint}".encode("utf-8")).hexdigest()[:32]
+    store = SharedArrays(SHARED_ARRAYS_ROOT, name)
+    try:
+        views, attached = store.publish_or_attach(arrays)
+    except OSError as e:
+        print("[data] shared arrays unavailable, keeping private copies:", e)
+        return
+
+    state.update({
+        "baseline_cube": views["baseline.cube"],
+        "baseline_rows": views["baseline.rows"],
+        "station_lat": views["stations.lat"],
+        "station_lon": views["stations.lon"],
+        "station_history": StationHistory.from_arrays(views),
+        "climatology_stations": views["climatology.stations"],
+        "climatology_cities": views["climatology.cities"],
+        "climatology_estimates": views["climatology.estimates"],
+        "shared_arrays": store,
+    })
+    table.ndvi = views["env.ndvi"]
+    table.albedo = views["env.albedo"]
+    table.lulc_code = views["env.lulc_code"]
+    table.measured = views["env.measured"]
+    if STATION_DAY_LEAN:
+        categories = day_df["StationId"].cat.categories
+        state["station_day_df"] = pd.DataFrame({
+            "StationId": pd.Series(
+                pd.Categorical.from_codes(views["station_day.StationId"], categories=categories), copy=False,
+            ),
+            **{col: pd.Series(views[f"station_day.{col}"], copy=False) for col in LEAN_NUMERIC_COLUMNS},
+        }, copy=False)
+    print(f"[data] {'attached to' if attached else 'published'} shared arrays "
+          f"({store.nbytes / 1e6:.1f} MB) at {store.path}")
 
-    synthetic_env_cache[station_name] = env
-    return env
 
+# ----------- Hot reload of the datasets -----------
+# Requests hold the read side of dataset_lock while they run, except around
+# upstream HTTP calls (_dataset_unpinned) and in views that read no dataset state
+# (@_without_dataset_pin); the live refresher only while it matches readings to
+# stations and scores them. The lock prefers writers, so this keeps a pending
+# reload from queueing every new request behind a slow network call.
+# A reload builds the new version without the lock, then swaps it in under
+# the write side: in-flight requests finish on the old version, later ones see
+# only the new one. Triggered by POST /reload_datasets or by the file watcher.
+DATASET_WATCH_INTERVAL_SECONDS = env_number("DATASET_WATCH_INTERVAL_SECONDS", DATASET_WATCH_INTERVAL)  # 0 = off
+DATASET_RELOAD_TOKEN = os.environ.get("DATASET_RELOAD_TOKEN") or None  # unset = endpoint disabled
 
-# ----------- Pre-generate session-static env for non-baseline stations -----------
-# We'll lazily populate generated_env_by_name for stations that lack a station_id env entry.
-generated_env_by_name = {}  # keyed by station_name
+dataset_lock = RWLock()
 
-def _generate_env_for_station_name(station_name):
-    """Generate and return realistic env values for a station_name; deterministic per-session."""
-    # If already generated, return stored
-    if station_name in generated_env_by_name:
-        return generated_env_by_name[station_name]
 
-    ndvi = round(RNG.uniform(*GEN_NDVI_RANGE), 3)
-    albedo = round(RNG.uniform(*GEN_ALBEDO_RANGE), 3)
-    lulc = RNG.choice(GEN_LULC_CHOICES)
+@contextmanager
+def _dataset_unpinned():
+    """
+    Release this request's pin on the dataset version around slow I/O that reads
+    no dataset state. The request is pinned again afterwards, possibly to a newer
+    version, so only self-contained values (names, coordinates) may cross the block.
+    No-op outside a pinned request.
+    """
+    pinned = has_request_context() and g.pop("dataset_read_lock", False)
+    if pinned:
+        dataset_lock.release_read()
+    try:
+        yield
+    finally:
+        if pinned:
+            dataset_lock.acquire_read()
+            g.dataset_read_lock = True
+
+
+def _without_dataset_pin(view):
+    """Mark a view that reads no dataset state: its requests are never pinned."""
+    view.dataset_pin = False
+    return view
+
+
+_reload_lock = threading.Lock()
+dataset_reload_status = {
+    "state": "idle",            # idle | building | failed
+    "last_result": None,        # reloaded | unchanged
+    "last_reload_at": None,
+    "last_duration_ms": None,
+    "last_error": None,
+}
 
-    env = {"ndvi": ndvi, "albedo": albedo, "lulc": lulc}
-    generated_env_by_name[station_name] = env
-    return env
 
-def get_env_for_station(station_name):
+def reload_datasets(force=False):
     """
-    Return env dict {ndvi, albedo, lulc} for a given station_name.
-    Preference order:
-      1) If station_name maps to a StationId present in station_env (baseline), return that.
-      2) Else return generated session-static env for station_name.
+    Rebuild the datasets and swap them in if the source files changed (or force).
+    Returns "reloaded", "unchanged" or "busy" (another reload is running).
+    Never call it while holding the read side of dataset_lock (i.e. from a request).
     """
-    # find station_id (inverse lookup)
-    station_id = None
-    for sid, name in station_map.items():
-        if name == station_name:
-            station_id = sid
-            break
+    if not _reload_lock.acquire(blocking=False):
+        return "busy"
+    t0 = time.perf_counter()
+    try:
+        dataset_reload_status["state"] = "building"
+        if not force and current_source_fingerprint() == dataset_fingerprint:
+            result = "unchanged"
+        else:
+            state = _build_dataset_state(day=baseline_day)
+            with dataset_lock.write():
+                old_names, old_version = [s["name"] for s in stations], dataset_version
+                _install_dataset_state(state)
+                # pollutant frames are keyed by registry ids, which the new version may reorder
+                _remap_live_frames(old_names, old_version)
+                if station_co2_live:
+                    # scores of the current live values against the new climatology
+                    detect_live_anomalies()
+                # memoized values built from the old data
+                _integrity_token_for.cache_clear()
+                _evaluate_cached.cache_clear()
+                _history_cached.cache_clear()
+                _baseline_day_cached.cache_clear()
+            result = "reloaded"
+            print(f"[data] datasets reloaded as version {dataset_version} "
+                  f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        dataset_reload_status.update({
+            "state": "idle",
+            "last_result": result,
+            "last_reload_at": datetime.now(timezone.utc).isoformat(),
+            "last_duration_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+            "last_error": None,
+        })
+        return result
+    except Exception as e:
+        dataset_reload_status.update({"state": "failed", "last_error": str(e)})
+        raise
+    finally:
+        _reload_lock.release()
+
+
+def _reload_datasets_in_background(force):
+    try:
+        reload_datasets(force=force)
+    except Exception as e:
+        print("[data] dataset reload failed, keeping the current version:", e)
+
+
+def start_dataset_watcher():
+    """Reload this process's datasets when the files in ENCRYPTED_DIR change."""
+    if DATASET_WATCH_INTERVAL_SECONDS:
+        FileWatcher(dataset_source_paths, reload_datasets, DATASET_WATCH_INTERVAL_SECONDS).start()
 
-    if station_id and station_id in station_env:
-        return station_env[station_id]
-    # otherwise generate
-    return _generate_env_for_station_name(station_name)
 
 # ----------- Live CPCB storage (separate from baseline) -----------
 # station_co2_live: { station_name: estimated_co2_ppm }
@@ -507,6 +1016,55 @@ def get_env_for_station(station_name):
 station_co2_live = {}
 station_live_ts = {}
 
+# live_anomalies: { station_name: {co2, z, band, flagged, p10, p50, p90} } for every
+# station whose live value could be scored against the day's climatology;
+# live_anomalies_meta: day, time and threshold of that scoring (detect_live_anomalies)
+live_anomalies = {}
+live_anomalies_meta = {}
+
+# Raw pollutant readings behind the live estimates (columnar, see backend/pollutant_store.py)
+# station_pollutants_live: PollutantFrame of the latest refresh
+# pollutant_history:       recent refreshes, oldest first
+LIVE_POLLUTANT_HISTORY_LEN = 288  # 24 h at the default 5-minute refresh
+station_pollutants_live = PollutantFrame.empty()
+pollutant_history = deque(maxlen=LIVE_POLLUTANT_HISTORY_LEN)
+
+
+def _frame_for_registry(frame):
+    """
+    `frame` if its ids refer to the current station registry, else an empty frame
+    (a frame that raced a reload is dropped rather than read against the wrong stations).
+    """
+    if frame.dataset_version == dataset_version:
+        return frame
+    return PollutantFrame.empty(source=frame.source, ts=frame.ts, dataset_version=dataset_version)
+
+
+def _remap_live_frames(old_names, old_version):
+    """
+    Re-key the live frame, the history and the cached OpenAQ frame from the registry
+    of `old_version` onto the current one; readings of dropped stations are lost.
+    Runs under the write side of dataset_lock, right after the new version is installed.
+    """
+    global station_pollutants_live, pollutant_history
+
+    new_of_old = np.array([station_index.get(n, -1) for n in old_names], dtype=np.int32)
+    remapped = {}   # the same frame object is often current, in the history and cached
+
+    def remap(frame):
+        if id(frame) not in remapped:
+            remapped[id(frame)] = (frame.remap(new_of_old, dataset_version)
+                                   if frame.dataset_version == old_version else None)
+        return remapped[id(frame)]
+
+    station_pollutants_live = remap(station_pollutants_live) or PollutantFrame.empty(dataset_version=dataset_version)
+    pollutant_history = deque((f for f in map(remap, pollutant_history) if f is not None),
+                              maxlen=LIVE_POLLUTANT_HISTORY_LEN)
+    if openaq_live_cache.get("frame") is not None:
+        openaq_live_cache["frame"] = remap(openaq_live_cache["frame"]) or PollutantFrame.empty(
+            source="openaq", dataset_version=dataset_version)
+
+
 # ----------- Helpers -----------
 def haversine_m(lat1, lon1, lat2, lon2):
     """Great-circle distance between 2 points in meters."""
@@ -534,6 +1092,39 @@ def estimate_co2_from_pollutants(pm25, pm10, no2, co):
     return round(est, 2)
 
 
+def estimate_co2_array(pm25, pm10, no2, co):
+    """
+    Vectorized estimate_co2_from_pollutants over pollutant arrays (NaN = missing,
+    counted as 0 like None). Returns float32.
+    """
+    pm25, pm10, no2, co = (np.nan_to_num(np.asarray(v, dtype=np.float64), nan=0.0) for v in (pm25, pm10, no2, co))
+    factor = (pm25 * 1.8) + (pm10 * 0.4) + (no2 * 1.2) + (co * 50.0)
+    est = np.clip(400 + (factor / 20.0), 350.0, 1200.0)
+    return np.round(est, 2).astype(np.float32)
+
+
+def estimate_co2_from_pollutant_frame(frame):
+    """
+    Vectorized estimate_co2_from_pollutants over a PollutantFrame.
+    Returns a float32 array aligned with frame.station_idx.
+    """
+    return estimate_co2_array(*(frame.columns[p] for p in POLLUTANTS))   # pm25, pm10, no2, co
+
+
+def _publish_pollutant_frame(rows, source):
+    """
+    Store one refresh worth of raw readings ({station_idx: {pollutant: value}}).
+    Call it under the read side of dataset_lock that the ids were matched under.
+    """
+    global station_pollutants_live
+
+    frame = PollutantFrame.from_rows(rows, source=source, ts=datetime.now(timezone.utc).isoformat(),
+                                     dataset_version=dataset_version)
+    station_pollutants_live = frame
+    pollutant_history.append(frame)
+    return frame
+
+
 def _parse_float(val):
     if val is None:
         return None
@@ -669,7 +1260,8 @@ def fetch_weather_for_city(city_name: str):
             "appid": OPENWEATHER_API_KEY,
             "units": "metric",  # temperature in °C, wind in m/s
         }
-        resp = requests.get(OPENWEATHER_API_BASE, params=params, timeout=10)
+        with _dataset_unpinned():
+            resp = requests.get(OPENWEATHER_API_BASE, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         recent_weather_calls.append(now)
@@ -781,7 +1373,7 @@ def _gaussian_plume_2d(Q, x_downwind, y_cross, u):
     return Q * term_y / denom
 
 
-def compute_plume_for_city(city_name: str, use_live: bool = True, grid_size: int = 25):
+def compute_plume_for_city(city_name: str, use_live: bool = True, grid_size: int = 25, overlay=None):
     """
     Build a simple 2D Gaussian-plume-based CO2 field over the selected city.
 
@@ -849,9 +1441,9 @@ def compute_plume_for_city(city_name: str, use_live: bool = True, grid_size: int
     for s in city_stations:
         name = s["name"]
         if use_live and name in station_co2_live:
-            co2_val = station_co2_live[name]
+            co2_val = _scenario_value(overlay, "live", name)
         else:
-            co2_val = station_co2.get(name)
+            co2_val = _scenario_value(overlay, "baseline", name)
 
         if co2_val is None or pd.isna(co2_val):
             continue
@@ -936,23 +1528,57 @@ def compute_plume_for_city(city_name: str, use_live: bool = True, grid_size: int
     return norm_grid
 
 # ----------- CPCB live refresh -----------
-def refresh_live_from_cpcb(timeout=15):
+def _parse_upstream_ts(value):
+    """Best-effort parse of an upstream timestamp string into a datetime (None if unknown)."""
+    if not value:
+        return None
+    s = str(value).strip()
+    for fmt in ("%d-%m-%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M:%S"):
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(s.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _newest_upstream_ts(ts_values):
+    """Most recent parseable timestamp among ts_values, as an ISO string (None if none parse)."""
+    parsed = [p for p in (_parse_upstream_ts(v) for v in ts_values) if p is not None]
+    return max(parsed).isoformat() if parsed else None
+
+
+def _schedule_failed(schedule):
+    """Record a failed poll on the source schedule (if any) and return False."""
+    if schedule is not None:
+        schedule.record_failure()
+    return False
+
+
+def _capture_payload(source, name, content):
     """
-    Robust CPCB refresh: accept payload as list or dict.
-    If dict, try common keys ('data','results','stations','feeds') or
-    look for values that are lists of state-like objects (with 'stateId' or 'citiesInState').
+    Capture mode: save a raw upstream payload under LIVE_CAPTURE_DIR/<source>/
+    so tools/replay_ingest.py can replay it offline. No-op when capture is off.
     """
-    global station_co2_live, station_live_ts
-
+    if not LIVE_CAPTURE_DIR:
+        return
     try:
-        resp = requests.get(CPCB_FEED_URL, timeout=timeout)
-        resp.raise_for_status()
-        payload = resp.json()
+        out_dir = os.path.join(LIVE_CAPTURE_DIR, source)
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"{name}_{int(time.time() * 1000)}.json")
+        with open(path, "wb") as f:
+            f.write(content or b"")
     except Exception as e:
-        print("[live][CPCB] fetch failed:", e)
-        return False
+        print("[live][capture] failed to save", source, name, ":", e)
+
 
-    # Normalize to a list of state objects (each with 'citiesInState' etc.)
+def _cpcb_state_objs(payload):
+    """
+    Normalize a CPCB payload to a list of state objects (each with 'citiesInState' etc.).
+    Returns [] if no plausible list is found.
+    """
     state_objs = []
 
     if isinstance(payload, list):
@@ -987,15 +1613,22 @@ def refresh_live_from_cpcb(timeout=15):
         if candidates:
             state_objs = candidates[0]
 
+    return state_objs
+
+
+def parse_cpcb_payload(payload):
+    """
+    Parse stage: flatten the state -> city -> station hierarchy into readings
+      { "lat", "lon", "ts", "pollutants": {pm25, pm10, no2, co} }
+    Returns (readings, total_cpcb_stations), or (None, 0) if the payload has no state list.
+    """
+    state_objs = _cpcb_state_objs(payload)
     if not state_objs:
-        print("[live][CPCB] could not locate state list in payload; payload keys:", list(payload.keys()) if isinstance(payload, dict) else type(payload))
-        return False
+        return None, 0
 
-    # Now iterate the structured state -> city -> station hierarchy
-    new_live = {}
-    new_ts = {}
+    readings = []
     total_cpcb_stations = 0
-    mapped_count = 0
+    now_iso = datetime.now(timezone.utc).isoformat()
 
     for state_obj in state_objs:
         # entries might be in different shapes; try to get cities list
@@ -1017,7 +1650,6 @@ def refresh_live_from_cpcb(timeout=15):
                     continue
                 total_cpcb_stations += 1
 
-                st_name = st.get("stationName") or st.get("Station") or st.get("StationName")
                 lat_raw = st.get("latitude") or st.get("Latitude") or st.get("lat")
                 lon_raw = st.get("longitude") or st.get("Longitude") or st.get("lon")
 
@@ -1052,258 +1684,708 @@ def refresh_live_from_cpcb(timeout=15):
                     elif "co" == idx or "co" in idx:
                         co = co if co is not None else avg_f
 
-                # find nearest station in our network
-                nearest = None
-                nearest_d = float("inf")
-                for s in stations:
-                    try:
-                        d = haversine_m(lat, lon, s["lat"], s["lon"])
-                    except Exception:
-                        continue
-                    if d < nearest_d:
-                        nearest_d = d
-                        nearest = s
-
-                if nearest is None:
-                    continue
-                if nearest_d > CPCB_MATCH_RADIUS_M:
-                    continue
-
-                our_name = nearest["name"]
+                readings.append({
+                    "lat": lat,
+                    "lon": lon,
+                    # lastUpdate may be present; otherwise use now
+                    "ts": st.get("lastUpdate") or now_iso,
+                    "pollutants": {"pm25": pm25, "pm10": pm10, "no2": no2, "co": co},
+                })
 
-                # Use the estimate_co2_from_pollutants heuristic
-                est_co2 = estimate_co2_from_pollutants(pm25, pm10, no2, co)
+    return readings, total_cpcb_stations
 
-                # If this station has baseline env factors, we keep those env factors unchanged.
-                # For mapping purposes we don't need to change est_co2, but downstream UI/intervention
-                # will pick env from CSV for baseline stations or from generated env for non-baseline ones.
-                new_live[our_name] = est_co2
-                # lastUpdate may be present; otherwise use now
-                live_ts = st.get("lastUpdate") or datetime.now(timezone.utc).isoformat()
-                new_ts[our_name] = live_ts
-                mapped_count += 1
 
-    station_co2_live = new_live
-    station_live_ts = new_ts
-
-    print(f"[live][CPCB] mapped {mapped_count} of {total_cpcb_stations} CPCB stations to our network")
-    return True
-
-def refresh_live_from_openaq(timeout=20):
+def match_readings_to_stations(readings, radius_m=CPCB_MATCH_RADIUS_M, chunk_size=2048):
     """
-    Fallback: refresh live CO2 estimates from OpenAQ v3.
+    Match stage: nearest station of our network for every reading, vectorized
+    (haversine against all stations, `chunk_size` readings at a time).
+    Returns [(station_idx, reading)] for readings within radius_m, in input order.
+    """
+    if not readings or not stations:
+        return []
 
-    v2 `/measurements` is retired; in v3 we use the "Latest" resource:
-      - GET /v3/parameters/{parameters_id}/latest
+    st_lat = np.radians(station_lat)
+    st_lon = np.radians(station_lon)
+    cos_st_lat = np.cos(st_lat)
 
-    Here we:
-      1. Call /v3/parameters/2/latest (PM2.5) with a limit.
-      2. For each result, map the coordinates to the nearest of *our* stations.
-      3. Use `estimate_co2_from_pollutants(pm25, pm10, no2, co)` with only PM2.5.
-      4. Store results in `station_co2_live` and `station_live_ts`.
-      5. Cache for OPENAQ_CACHE_TTL seconds to avoid hammering the API.
-    """
-    global station_co2_live, station_live_ts
-    global openaq_live_cache, recent_openaq_calls
+    matches = []
+    for start in range(0, len(readings), chunk_size):
+        chunk = readings[start:start + chunk_size]
+        lat = np.radians(np.array([r["lat"] for r in chunk], dtype=np.float64))[:, None]
+        lon = np.radians(np.array([r["lon"] for r in chunk], dtype=np.float64))[:, None]
 
-    if not OPENAQ_API_KEY:
-        print("[live][OpenAQ v3] OPENAQ_API_KEY is not set; cannot call v3 API")
-        return False
+        a = np.sin((st_lat - lat) / 2.0) ** 2 + np.cos(lat) * cos_st_lat * np.sin((st_lon - lon) / 2.0) ** 2
+        d = 2 * 6371000.0 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-    now = time.time()
-    print("[live][OpenAQ v3] refresh_live_from_openaq() called")
+        nearest = np.argmin(d, axis=1)
+        nearest_d = d[np.arange(len(chunk)), nearest]
+        for r, sid, dist in zip(chunk, nearest.tolist(), nearest_d.tolist()):
+            if dist <= radius_m:
+                matches.append((sid, r))
 
-    # ---- 1) Reuse cache if still fresh ----
-    try:
-        if openaq_live_cache and isinstance(openaq_live_cache, dict):
-            ts_cached = openaq_live_cache.get("ts")
-            if isinstance(ts_cached, (int, float)) and (now - ts_cached) < OPENAQ_CACHE_TTL:
-                cached_co2 = openaq_live_cache.get("co2_map") or {}
-                cached_ts  = openaq_live_cache.get("ts_map") or {}
+    return matches
 
-                station_co2_live = dict(cached_co2)
-                station_live_ts  = dict(cached_ts)
 
-                print(f"[live][OpenAQ v3] using cached mapping (stations={len(cached_co2)})")
-                return True
-    except Exception as e:
-        print("[live][OpenAQ v3] cache reuse error:", e)
+def build_live_maps(matches, merge_pollutants=False):
+    """
+    Estimate stage: turn matched readings into the live stores.
 
-    # ---- 2) Rate-limit guard ----
-    try:
-        recent_openaq_calls = [t for t in recent_openaq_calls if now - t < 60.0]
-    except Exception:
-        recent_openaq_calls = []
+    - merge_pollutants=False: the last reading matched to a station wins (CPCB:
+      each reading carries the full pollutant set)
+    - merge_pollutants=True: keep the newest value per (station, pollutant)
+      (OpenAQ: one pollutant per reading)
 
-    if len(recent_openaq_calls) >= OPENAQ_MAX_CALLS_PER_MIN:
-        if openaq_live_cache:
-            cached_co2 = openaq_live_cache.get("co2_map") or {}
-            cached_ts  = openaq_live_cache.get("ts_map") or {}
+    Returns (co2_map, ts_map, pollutant_rows) keyed by station name / registry id.
+    """
+    per_station = {}
+    for sid, r in matches:
+        if not merge_pollutants:
+            per_station[sid] = {p: (r["ts"], v) for p, v in r["pollutants"].items()}
+            continue
+        slot = per_station.setdefault(sid, {})
+        for p, v in r["pollutants"].items():
+            if v is None:
+                continue
+            prev = slot.get(p)
+            if prev is None or r["ts"] >= prev[0]:
+                slot[p] = (r["ts"], v)
 
-            station_co2_live = dict(cached_co2)
-            station_live_ts  = dict(cached_ts)
+    new_live = {}
+    new_ts = {}
+    new_pollutants = {}
+    for sid, slot in per_station.items():
+        our_name = stations[sid]["name"]
+        values = {p: v for p, (_, v) in slot.items()}
+        new_pollutants[sid] = values
+
+        # Use the estimate_co2_from_pollutants heuristic
+        new_live[our_name] = estimate_co2_from_pollutants(
+            values.get("pm25"), values.get("pm10"), values.get("no2"), values.get("co")
+        )
+        new_ts[our_name] = max(ts for ts, _ in slot.values()) if slot else datetime.now(timezone.utc).isoformat()
 
-            print("[live][OpenAQ v3] rate limit guard – reusing cached mapping")
-            return True
+    return new_live, new_ts, new_pollutants
 
-        print("[live][OpenAQ v3] rate limit reached and no cache; skipping call")
-        return False
 
-    # ---- 3) Call v3 "latest" for PM2.5 ----
-    # Docs: https://api.openaq.org/v3/parameters/2/latest
-    # Example in docs uses parameter 2 (PM2.5) with ?limit=1000
-    OPENAQ_V3_LATEST_PM25_URL = f"{OPENAQ_BASE_URL}/parameters/{OPENAQ_PM25_PARAM_ID}/latest"
+def refresh_live_from_cpcb(timeout=15, schedule=None):
+    """
+    Robust CPCB refresh: accept payload as list or dict.
+    If dict, try common keys ('data','results','stations','feeds') or
+    look for values that are lists of state-like objects (with 'stateId' or 'citiesInState').
 
-    params = {
-        "limit": OPENAQ_LIMIT,   # keep your existing limit (1000)
-        # NOTE: parameters/latest doesn't document a country filter in examples,
-        # so we grab global PM2.5 and then map by distance to your Indian stations.
-        # If OpenAQ later documents countries_id/country filter here, you can add it.
-    }
+    Pipeline: fetch -> parse_cpcb_payload -> match_readings_to_stations -> build_live_maps.
 
-    headers = {
-        "X-API-Key": OPENAQ_API_KEY
-    }
+    With a SourceSchedule, the request is conditional (ETag / If-Modified-Since)
+    and a 304 or byte-identical payload is not reparsed; the schedule records
+    the outcome and the newest lastUpdate seen. Validators / hash are only
+    committed once a payload was parsed, so a bad payload keeps counting as a failure.
+    """
+    global station_co2_live, station_live_ts
 
     try:
-        print(f"[live][OpenAQ v3] requesting {OPENAQ_V3_LATEST_PM25_URL} with params={params}")
-        resp = requests.get(OPENAQ_V3_LATEST_PM25_URL, params=params, headers=headers, timeout=timeout)
-        resp.raise_for_status()
+        headers = schedule.conditional_headers() if schedule is not None else {}
+        resp = requests.get(CPCB_FEED_URL, headers=headers, timeout=timeout)
+        if resp.status_code != 304:
+            resp.raise_for_status()
+            _capture_payload("cpcb", "feed", resp.content)
+        if schedule is not None and not schedule.payload_changed(resp):
+            schedule.record_success(changed=False)
+            print("[live][CPCB] feed unchanged since last poll; skipping parse")
+            return True
         payload = resp.json()
-        recent_openaq_calls.append(now)
     except Exception as e:
-        print("[live][OpenAQ v3] fetch failed:", e)
+        print("[live][CPCB] fetch failed:", e)
+        return _schedule_failed(schedule)
 
-        # fallback: if we have previous cache, still reuse it
-        if openaq_live_cache:
-            cached_co2 = openaq_live_cache.get("co2_map") or {}
-            cached_ts  = openaq_live_cache.get("ts_map") or {}
+    readings, total_cpcb_stations = parse_cpcb_payload(payload)
+    if readings is None:
+        print("[live][CPCB] could not locate state list in payload; payload keys:", list(payload.keys()) if isinstance(payload, dict) else type(payload))
+        return _schedule_failed(schedule)
 
-            station_co2_live = dict(cached_co2)
-            station_live_ts  = dict(cached_ts)
+    # fetch / parse ran without the dataset lock; matching reads the station registry
+    with dataset_lock.read():
+        matches = match_readings_to_stations(readings)
 
-            print("[live][OpenAQ v3] using stale cache due to fetch error")
-            return True
+        # If a station has baseline env factors, we keep those env factors unchanged.
+        # Downstream UI/intervention picks env from CSV for baseline stations or
+        # from generated env for non-baseline ones.
+        new_live, new_ts, new_pollutants = build_live_maps(matches)
 
-        return False
+        station_co2_live = new_live
+        station_live_ts = new_ts
+        _publish_pollutant_frame(new_pollutants, "cpcb")
 
-    # ---- 4) Parse Latest results ----
-    results = payload.get("results", [])
-    if not isinstance(results, list) or not results:
-        print("[live][OpenAQ v3] no results in payload or wrong structure; keys:", list(payload.keys()))
-        return False
+    if schedule is not None:
+        schedule.commit_payload(resp)
+        schedule.record_success(changed=True, newest_data_ts=_newest_upstream_ts(new_ts.values()))
 
-    new_live = {}
-    new_ts = {}
-    mapped_count = 0
-    total_points = 0
+    print(f"[live][CPCB] mapped {len(matches)} of {total_cpcb_stations} CPCB stations to our network")
+    return True
 
-    for r in results:
-        total_points += 1
+def _reserve_openaq_call():
+    """
+    Claim one slot in the OpenAQ per-minute budget.
+    Thread-safe so parallel page fetches share a single window.
+    """
+    global recent_openaq_calls
+    now = time.time()
+    with openaq_calls_lock:
+        recent_openaq_calls = [t for t in recent_openaq_calls if now - t < 60.0]
+        if len(recent_openaq_calls) >= OPENAQ_MAX_CALLS_PER_MIN:
+            return False
+        recent_openaq_calls.append(now)
+        return True
 
-        coords = r.get("coordinates") or {}
-        lat = coords.get("latitude")
-        lon = coords.get("longitude")
 
-        # Some clients might represent coords as [lon, lat] – handle list/tuple too
-        if lat is None or lon is None:
-            if isinstance(coords, (list, tuple)) and len(coords) == 2:
-                # assume [longitude, latitude] as common GeoJSON-like order
-                lon, lat = coords[0], coords[1]
+def _openaq_get(path, params, timeout=20):
+    """
+    GET one OpenAQ v3 resource within the rate limit.
+    Returns the decoded JSON payload, or None if the budget is exhausted or the call failed.
+    """
+    if not _reserve_openaq_call():
+        print("[live][OpenAQ v3] call budget exhausted; skipping", path, params.get("page"))
+        return None
 
-        if lat is None or lon is None:
-            continue
+    headers = {"X-API-Key": OPENAQ_API_KEY}
+    try:
+        resp = requests.get(f"{OPENAQ_BASE_URL}{path}", params=params, headers=headers, timeout=timeout)
+        resp.raise_for_status()
+        _capture_payload("openaq", f"{path.strip('/').replace('/', '_')}_p{params.get('page', 1)}", resp.content)
+        return resp.json()
+    except Exception as e:
+        print("[live][OpenAQ v3] fetch failed for", path, params.get("page"), ":", e)
+        return None
 
-        try:
-            lat = float(lat)
-            lon = float(lon)
-        except Exception:
-            continue
 
-        val = r.get("value")
-        try:
-            pm25_val = float(val) if val is not None else None
-        except Exception:
-            pm25_val = None
+def _openaq_page_count(payload, limit):
+    """
+    Number of pages reported by meta.found, or None if unknown.
+    v3 reports found as an int, or as a string like ">1000" when it stops counting.
+    """
+    meta = payload.get("meta") or {}
+    found = meta.get("found")
+    if isinstance(found, int):
+        return max(1, math.ceil(found / float(limit)))
+    return None
 
-        if pm25_val is None:
-            continue
 
-        # Map this latest PM2.5 point to the nearest of *our* stations
-        nearest = None
-        nearest_d = float("inf")
-        for s in stations:
+def fetch_openaq_pages(path, params, timeout=20):
+    """
+    Fetch every page of a paginated OpenAQ v3 resource.
+
+    Page 1 is fetched first to read meta.found; the remaining pages are then
+    pulled concurrently (OPENAQ_MAX_WORKERS threads), every call counted against
+    OPENAQ_MAX_CALLS_PER_MIN. If the total is unknown we keep fetching batches
+    of pages until a short page comes back.
+    Returns the concatenated `results` lists (possibly partial if the budget runs out).
+    """
+    limit = params.get("limit", OPENAQ_LIMIT)
+    first = _openaq_get(path, dict(params, page=1), timeout=timeout)
+    if not first:
+        return []
+
+    results = list(first.get("results") or [])
+    if len(results) < limit:
+        return results
+
+    n_pages = _openaq_page_count(first, limit)
+
+    def _fetch(page):
+        payload = _openaq_get(path, dict(params, page=page), timeout=timeout)
+        if not payload:
+            return None
+        return payload.get("results") or []
+
+    next_page = 2
+    with ThreadPoolExecutor(max_workers=OPENAQ_MAX_WORKERS) as pool:
+        while True:
+            if n_pages is not None:
+                batch = list(range(next_page, n_pages + 1))
+            else:
+                batch = list(range(next_page, next_page + OPENAQ_MAX_WORKERS))
+            if not batch:
+                break
+
+            short_page = False
+            for page_results in pool.map(_fetch, batch):
+                if page_results is None:
+                    # failed or over budget – keep what we have
+                    return results
+                results.extend(page_results)
+                if len(page_results) < limit:
+                    short_page = True
+
+            if short_page or n_pages is not None:
+                break
+            next_page = batch[-1] + 1
+
+    return results
+
+
+def fetch_openaq_india_location_ids(timeout=20):
+    """
+    Set of OpenAQ location ids inside India, filtered server-side (iso + bbox).
+    Cached for OPENAQ_LOCATIONS_TTL; returns the stale set (or None) if the fetch fails.
+    """
+    global openaq_locations_cache
+
+    now = time.time()
+    cached_ts = openaq_locations_cache.get("ts")
+    if isinstance(cached_ts, (int, float)) and (now - cached_ts) < OPENAQ_LOCATIONS_TTL:
+        return openaq_locations_cache.get("ids")
+
+    params = {
+        "iso": OPENAQ_COUNTRY,
+        "bbox": ",".join(str(v) for v in OPENAQ_INDIA_BBOX),
+        "limit": OPENAQ_LIMIT,
+    }
+    locations = fetch_openaq_pages("/locations", params, timeout=timeout)
+    ids = {loc.get("id") for loc in locations if loc.get("id") is not None}
+    if not ids:
+        return openaq_locations_cache.get("ids")
+
+    openaq_locations_cache = {"ts": now, "ids": ids}
+    print(f"[live][OpenAQ v3] {len(ids)} Indian locations cached")
+    return ids
+
+
+def _in_india_bbox(lat, lon):
+    min_lon, min_lat, max_lon, max_lat = OPENAQ_INDIA_BBOX
+    return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+
+
+def fetch_openaq_latest(now=None, timeout=20):
+    """
+    Fetch stage: every page of /parameters/{id}/latest for OPENAQ_PARAMETERS,
+    limited server-side to readings newer than OPENAQ_MAX_AGE_HOURS.
+    Returns { param_id: [result, ...] }.
+    """
+    now = now if now is not None else time.time()
+    datetime_min = datetime.fromtimestamp(now - OPENAQ_MAX_AGE_HOURS * 3600, tz=timezone.utc).isoformat()
+
+    results_by_param = {}
+    for param_id in OPENAQ_PARAMETERS:
+        params = {"limit": OPENAQ_LIMIT, "datetime_min": datetime_min}
+        results_by_param[param_id] = fetch_openaq_pages(f"/parameters/{param_id}/latest", params, timeout=timeout)
+    return results_by_param
+
+
+def parse_openaq_results(results_by_param, india_ids=None):
+    """
+    Parse stage: turn OpenAQ latest results into readings shaped like
+    parse_cpcb_payload's (one pollutant per reading, converted to CPCB units).
+    Points outside India (location id list, else bounding box) are dropped.
+    Returns (readings, total_points).
+    """
+    readings = []
+    total_points = 0
+    now_iso = datetime.now(timezone.utc).isoformat()
+
+    for param_id, results in results_by_param.items():
+        pollutant, unit_factor = OPENAQ_PARAMETERS[param_id]
+
+        for r in results:
+            total_points += 1
+
+            if india_ids and r.get("locationsId") not in india_ids:
+                continue
+
+            coords = r.get("coordinates") or {}
+            if isinstance(coords, (list, tuple)) and len(coords) == 2:
+                # assume [longitude, latitude] as common GeoJSON-like order
+                lon, lat = coords[0], coords[1]
+            else:
+                lat = coords.get("latitude")
+                lon = coords.get("longitude")
+
+            if lat is None or lon is None:
+                continue
+
             try:
-                d = haversine_m(lat, lon, s["lat"], s["lon"])
+                lat = float(lat)
+                lon = float(lon)
             except Exception:
                 continue
-            if d < nearest_d:
-                nearest_d = d
-                nearest = s
 
-        if nearest is None:
-            continue
+            if not _in_india_bbox(lat, lon):
+                continue
 
-        # respect your CPCB_MATCH_RADIUS_M (20km) for mapping
-        if nearest_d > CPCB_MATCH_RADIUS_M:
-            continue
+            val = r.get("value")
+            try:
+                val = float(val) * unit_factor if val is not None else None
+            except Exception:
+                val = None
 
-        our_name = nearest["name"]
+            # negative values are sensor error codes in OpenAQ
+            if val is None or val < 0:
+                continue
 
-        # We only have PM2.5 here; others are None – still fine for heuristic
-        est_co2 = estimate_co2_from_pollutants(pm25_val, None, None, None)
+            # Latest resource has datetime.{utc,local}
+            dt_info = r.get("datetime") or {}
+            ts_val = dt_info.get("utc") or dt_info.get("local") or now_iso
 
-        # If we already saw this station in this run, just overwrite with last one
-        new_live[our_name] = est_co2
+            readings.append({"lat": lat, "lon": lon, "ts": ts_val, "pollutants": {pollutant: val}})
 
-        # Latest resource has datetime.{utc,local}
-        dt_info = r.get("datetime") or {}
-        ts_val = dt_info.get("utc") or dt_info.get("local") or datetime.now(timezone.utc).isoformat()
+    return readings, total_points
 
-        new_ts[our_name] = ts_val
-        mapped_count += 1
 
-    if not new_live:
-        print("[live][OpenAQ v3] no stations mapped to your network (after processing)")
+def _use_openaq_cache(reason):
+    """
+    Copy the cached OpenAQ mapping into the live stores. Returns True if there was one.
+    The cached frame is made current again but not re-added to pollutant_history:
+    no new readings were fetched.
+    """
+    global station_co2_live, station_live_ts, station_pollutants_live
+
+    if not openaq_live_cache:
         return False
 
+    cached_co2 = openaq_live_cache.get("co2_map") or {}
+    cached_ts  = openaq_live_cache.get("ts_map") or {}
+
+    station_co2_live = dict(cached_co2)
+    station_live_ts  = dict(cached_ts)
+    station_pollutants_live = openaq_live_cache["frame"]
+
+    print(f"[live][OpenAQ v3] {reason} (stations={len(cached_co2)})")
+    return True
+
+
+def refresh_live_from_openaq(timeout=20, schedule=None):
+    """
+    Fallback: refresh live CO2 estimates from OpenAQ v3.
+
+    v2 `/measurements` is retired; in v3 we use the "Latest" resource:
+      - GET /v3/parameters/{parameters_id}/latest
+
+    Here we:
+      1. Page through /v3/parameters/{id}/latest for PM2.5, PM10, NO2 and CO
+         (pages in parallel, within OPENAQ_MAX_CALLS_PER_MIN), asking the server
+         for recent readings only (datetime_min).
+      2. Keep only Indian points: location ids from /v3/locations?iso=IN
+         (server-side filter), or the India bounding box if that list is unavailable.
+      3. Map each point to the nearest of *our* stations and keep the newest
+         reading per pollutant.
+      4. Feed the full pollutant set into `estimate_co2_from_pollutants` and
+         store results in `station_co2_live` and `station_live_ts`.
+      5. Cache for OPENAQ_CACHE_TTL seconds to avoid hammering the API.
+
+    v3 does not send validators for these resources, so with a SourceSchedule
+    only backoff and the newest reading time are tracked (cache reuse counts as unchanged).
+    """
+    global station_co2_live, station_live_ts
+    global openaq_live_cache
+
+    if not OPENAQ_API_KEY:
+        print("[live][OpenAQ v3] OPENAQ_API_KEY is not set; cannot call v3 API")
+        return _schedule_failed(schedule)
+
+    now = time.time()
+    print("[live][OpenAQ v3] refresh_live_from_openaq() called")
+
+    # ---- 1) Reuse cache if still fresh ----
+    try:
+        if openaq_live_cache and isinstance(openaq_live_cache, dict):
+            ts_cached = openaq_live_cache.get("ts")
+            if isinstance(ts_cached, (int, float)) and (now - ts_cached) < OPENAQ_CACHE_TTL:
+                if schedule is not None:
+                    schedule.record_success(changed=False)
+                return _use_openaq_cache("using cached mapping")
+    except Exception as e:
+        print("[live][OpenAQ v3] cache reuse error:", e)
+
+    # ---- 2) Rate-limit guard ----
+    with openaq_calls_lock:
+        calls_in_window = len([t for t in recent_openaq_calls if now - t < 60.0])
+    if calls_in_window >= OPENAQ_MAX_CALLS_PER_MIN:
+        if _use_openaq_cache("rate limit guard – reusing cached mapping"):
+            if schedule is not None:
+                schedule.record_success(changed=False)
+            return True
+
+        print("[live][OpenAQ v3] rate limit reached and no cache; skipping call")
+        return _schedule_failed(schedule)
+
+    # ---- 3) Indian location ids (server-side country/bbox filter) ----
+    india_ids = fetch_openaq_india_location_ids(timeout=timeout)
+
+    # ---- 4) Paginated "latest" per parameter ----
+    results_by_param = fetch_openaq_latest(now, timeout=timeout)
+
+    readings, total_points = parse_openaq_results(results_by_param, india_ids)
+    with dataset_lock.read():
+        matches = match_readings_to_stations(readings)
+        # keep the newest reading per (station, pollutant)
+        new_live, new_ts, new_pollutants = build_live_maps(matches, merge_pollutants=True)
+        if matches:
+            station_co2_live = new_live
+            station_live_ts = new_ts
+            frame = _publish_pollutant_frame(new_pollutants, "openaq")
+
+    if not matches:
+        print("[live][OpenAQ v3] no stations mapped to your network (after processing)")
+        # fallback: if we have previous cache, still reuse it
+        _schedule_failed(schedule)
+        return _use_openaq_cache("using stale cache after empty fetch")
+
+    mapped_count = len(matches)
+
     # ---- 5) Save mapping + timestamp to cache ----
     openaq_live_cache = {
         "ts": now,
         "co2_map": new_live,
         "ts_map": new_ts,
+        "frame": frame,
     }
 
-    station_co2_live = new_live
-    station_live_ts = new_ts
+    if schedule is not None:
+        schedule.record_success(changed=True, newest_data_ts=_newest_upstream_ts(new_ts.values()))
 
-    print(f"[live][OpenAQ v3] mapped {mapped_count} of {total_points} PM2.5 points to your stations")
+    print(f"[live][OpenAQ v3] mapped {mapped_count} of {total_points} points to {len(new_live)} of your stations")
     return True
 
 
-# Background refresher
-def _live_refresh_loop():
-    while True:
+# ----------- Live anomaly detection (backend/anomalies.py) -----------
+# After every refresh that changed the live values, all stations are scored at once
+# against the day-of-year climatology of the live estimator itself
+# (climatology_estimates: estimate_co2_from_pollutants over station_day's pollutants),
+# so live value and reference are on the same scale; the CO-based baseline
+# climatology is not. Scores are redone when the day of year or the datasets
+# change; the result travels with the live snapshot.
+ANOMALY_Z_THRESHOLD = env_number("ANOMALY_Z_THRESHOLD", 3.0, float)
+ANOMALY_MIN_SAMPLES = 5        # historic station-days needed to score a station
+ANOMALY_MIN_SIGMA_PPM = 2.0    # floor for the climatology spread (~22 µg/m³ of PM2.5 in the estimate)
+
+
+def _anomaly_day(now):
+    return "%02d-%02d" % (now.month, now.day)
+
+
+def live_anomalies_stale(now=None):
+    """True if there are live values whose scores are for another day or dataset version."""
+    if not station_co2_live or not live_anomalies_meta:
+        return False
+    return (live_anomalies_meta.get("day") != _anomaly_day(now or datetime.now())
+            or live_anomalies_meta.get("dataset_version") != dataset_version)
+
+
+def detect_live_anomalies(now=None):
+    """Score station_co2_live against today's live-estimate climatology and replace live_anomalies."""
+    global live_anomalies, live_anomalies_meta
+
+    t0 = time.perf_counter()
+    now = now or datetime.now()
+    try:
+        live = np.full(len(stations), np.nan)
+        for name, value in station_co2_live.items():
+            sid = station_index.get(name)
+            if sid is not None and value is not None:
+                live[sid] = value
+
+        clim = climatology_estimates[int(day_of_year(now.month, now.day))]
+        z, band, flagged = anomaly_scores(
+            live, clim, ANOMALY_Z_THRESHOLD, ANOMALY_MIN_SAMPLES, ANOMALY_MIN_SIGMA_PPM,
+        )
+        p10, p50, p90 = (clim[:, CLIMATOLOGY_STATS.index(stat)] for stat in ("p10", "p50", "p90"))
+        scored = np.flatnonzero(band >= 0)
+        anomalies = {
+            stations[sid]["name"]: {
+                "co2": round(float(live[sid]), 2),
+                "z": round(float(z[sid]), 2),
+                "band": ANOMALY_BANDS[band[sid]],
+                "flagged": bool(flagged[sid]),
+                "p10": round(float(p10[sid]), 2),
+                "p50": round(float(p50[sid]), 2),
+                "p90": round(float(p90[sid]), 2),
+            }
+            for sid in scored
+        }
+    except Exception as e:
+        # scores of the previous values would be wrong for the new ones
+        print("[live][anomaly] detection failed:", e)
+        live_anomalies, live_anomalies_meta = {}, {}
+        return
+
+    live_anomalies = anomalies
+    live_anomalies_meta = {
+        "day": _anomaly_day(now),
+        "dataset_version": dataset_version,
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+        "z_threshold": ANOMALY_Z_THRESHOLD,
+        "scored": len(scored),
+        "flagged": int(flagged.sum()),
+    }
+    print(f"[live][anomaly] {int(flagged.sum())} of {len(scored)} scored stations flagged "
+          f"in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+# ----------- Shared live refresher (multi-worker) -----------
+# Under a multi-worker server only the worker holding the lease in LIVE_STATE_DB
+# polls CPCB / OpenAQ. It publishes every refresh there and the other workers
+# just load the new version (one cheap SELECT per LIVE_SYNC_INTERVAL_SECONDS).
+LIVE_SYNC_INTERVAL_SECONDS = 5
+
+# opened by init_databases()
+live_state_store = None
+
+# version / publish time of the snapshot currently held by this worker
+live_snapshot_version = 0
+live_snapshot_published_at = 0.0
+
+
+# Per-source polling state (backend/scheduler.py): conditional requests,
+# exponential backoff with jitter on failure, faster polling while fresh data arrives.
+LIVE_MIN_INTERVAL_SECONDS = 60
+LIVE_MAX_BACKOFF_SECONDS = 3600
+
+cpcb_schedule = SourceSchedule(
+    "cpcb",
+    LIVE_REFRESH_INTERVAL_SECONDS or 300,
+    min_interval=LIVE_MIN_INTERVAL_SECONDS,
+    max_interval=LIVE_MAX_BACKOFF_SECONDS,
+)
+openaq_schedule = SourceSchedule(
+    "openaq",
+    max(LIVE_REFRESH_INTERVAL_SECONDS or 300, OPENAQ_CACHE_TTL),
+    min_interval=OPENAQ_CACHE_TTL,
+    max_interval=LIVE_MAX_BACKOFF_SECONDS,
+)
+
+
+def _refresh_live_sources(force=False):
+    """
+    Poll whichever sources are due: CPCB first, OpenAQ only while CPCB is failing.
+    `force` ignores the schedules (manual refresh).
+    Returns (ok, changed) – changed is False when the upstream payload was identical.
+    """
+    now = time.time()
+
+    if force or cpcb_schedule.is_due(now):
         try:
-            ok = refresh_live_from_cpcb()
-            if not ok:
-                print("[live] CPCB background refresh failed; trying OpenAQ fallback")
-                refresh_live_from_openaq()
+            ok = refresh_live_from_cpcb(schedule=cpcb_schedule)
         except Exception as e:
             print("[live][CPCB] refresh error:", e)
-            # try OpenAQ as last resort
-            try:
-                refresh_live_from_openaq()
-            except Exception as e2:
-                print("[live][OpenAQ] refresh error:", e2)
+            cpcb_schedule.record_failure()
+            ok = False
+        if ok:
+            return True, cpcb_schedule.last_changed
+        print("[live] CPCB refresh failed; trying OpenAQ fallback")
+
+    if cpcb_schedule.failures and (force or openaq_schedule.is_due(now)):
+        try:
+            ok = refresh_live_from_openaq(schedule=openaq_schedule)
+        except Exception as e2:
+            print("[live][OpenAQ] refresh error:", e2)
+            openaq_schedule.record_failure()
+            ok = False
+        return ok, ok and openaq_schedule.last_changed
+
+    return False, False
+
+
+def publish_live_snapshot():
+    """Publish this worker's live stores so the other workers can load them."""
+    global live_snapshot_version, live_snapshot_published_at
+
+    published_at = time.time()
+    with dataset_lock.read():
+        # keyed by station name too: the followers' registries may order stations differently
+        pollutants = _frame_for_registry(station_pollutants_live).to_dict([s["name"] for s in stations])
+    snapshot = {
+        "published_at": published_at,
+        "co2_map": station_co2_live,
+        "ts_map": station_live_ts,
+        "pollutants": pollutants,
+        "anomalies": live_anomalies,
+        "anomalies_meta": live_anomalies_meta,
+    }
+    try:
+        live_snapshot_version = live_state_store.publish(snapshot, publisher=worker_id())
+        live_snapshot_published_at = published_at
+    except Exception as e:
+        print("[live][share] publish failed:", e)
+
+
+def load_live_snapshot():
+    """
+    Follower path: swap in the newest published snapshot if it is newer than ours.
+    Returns True if a new version was loaded.
+    """
+    global station_co2_live, station_live_ts, station_pollutants_live
+    global live_anomalies, live_anomalies_meta
+    global live_snapshot_version, live_snapshot_published_at
+
+    try:
+        if live_state_store.latest_version() <= live_snapshot_version:
+            return False
+        loaded = live_state_store.load_latest(newer_than=live_snapshot_version)
+    except Exception as e:
+        print("[live][share] load failed:", e)
+        return False
+
+    if loaded is None:
+        return False
 
-        if not LIVE_REFRESH_INTERVAL_SECONDS:
-            break
-        time.sleep(LIVE_REFRESH_INTERVAL_SECONDS)
+    version, snapshot = loaded
+    with dataset_lock.read():
+        frame = PollutantFrame.from_dict(snapshot.get("pollutants") or {}, station_index,
+                                         dataset_version=dataset_version)
+        station_co2_live = snapshot.get("co2_map") or {}
+        station_live_ts = snapshot.get("ts_map") or {}
+        station_pollutants_live = frame
+        live_anomalies = snapshot.get("anomalies") or {}
+        live_anomalies_meta = snapshot.get("anomalies_meta") or {}
+        pollutant_history.append(frame)
+    live_snapshot_version = version
+    live_snapshot_published_at = snapshot.get("published_at") or time.time()
+    return True
+
+
+# Background refresher
+def _live_refresh_loop():
+    was_leader = False
+
+    while True:
+        me = worker_id()
+
+        if live_state_store.try_acquire(me):
+            if not was_leader:
+                # pick up where the previous leader left off instead of refetching at once
+                load_live_snapshot()
+                if live_snapshot_published_at:
+                    cpcb_schedule.next_due = live_snapshot_published_at + cpcb_schedule.interval
+                print("[live][share] this worker is now the live refresher:", me)
+                was_leader = True
+
+            # the lease is renewed while the refresh runs, however long it takes
+            with LeaseHeartbeat(live_state_store, me) as lease:
+                # network calls run without the dataset lock (a reload must not wait
+                # for them); matching and scoring take its read side themselves
+                ok, changed = _refresh_live_sources()
+                # unchanged values are rescored too once the day of year or the datasets changed
+                rescored = changed or live_anomalies_stale()
+                if rescored:
+                    with dataset_lock.read():
+                        detect_live_anomalies()
+                if lease.lost:
+                    print("[live][share] lease lost during the refresh; not publishing it")
+                    was_leader = False
+                elif rescored:
+                    publish_live_snapshot()
+            if not LIVE_REFRESH_INTERVAL_SECONDS:
+                live_state_store.release(me)
+                break
+        else:
+            was_leader = False
+            load_live_snapshot()
+
+        time.sleep(LIVE_SYNC_INTERVAL_SECONDS)
 
-if LIVE_REFRESH_INTERVAL_SECONDS:
-    t = threading.Thread(target=_live_refresh_loop, daemon=True)
-    t.start()
+def start_live_refresher():
+    """Start this process's refresher thread (never before a fork – see create_app)."""
+    if LIVE_REFRESH_INTERVAL_SECONDS:
+        t = threading.Thread(target=_live_refresh_loop, name="live-refresher", daemon=True)
+        t.start()
 
 # ----------- API endpoints -----------
 @app.route("/refresh_live", methods=["GET"])
@@ -1312,13 +2394,66 @@ def refresh_live_endpoint():
     Manual trigger to refresh live estimates.
 
     Tries CPCB first; if that fails, falls back to OpenAQ.
+    The result is published so every worker serves the same live data.
     """
-    ok = refresh_live_from_cpcb()
-    if not ok:
-        print("[live] CPCB refresh failed; trying OpenAQ fallback")
-        ok = refresh_live_from_openaq()
+    # the fetch can take a while, and the read lock is not reentrant (the refresh
+    # takes it around matching / scoring)
+    with _dataset_unpinned():
+        ok, changed = _refresh_live_sources(force=True)
+        if changed:
+            with dataset_lock.read():
+                detect_live_anomalies()
+            publish_live_snapshot()
+
+    return jsonify({"success": bool(ok), "changed": bool(changed), "version": live_snapshot_version})
+
+
+@app.route("/live_sources", methods=["GET"])
+def live_sources():
+    """Polling state of each upstream feed plus the live snapshot version held by this worker."""
+    return jsonify({
+        "success": True,
+        "version": live_snapshot_version,
+        "sources": [cpcb_schedule.status(), openaq_schedule.status()]
+    })
+
+
+@app.route("/anomalies", methods=["GET"])
+def live_anomalies_endpoint():
+    """
+    Stations whose live CO2 estimate is abnormal for the day of year, strongest
+    first, as scored after the last live refresh: robust z = (live - p50) / sigma
+    with p10 / p50 / p90 and sigma from the same estimator over the station's
+    historic pollutants (not the CO-based /climatology); flagged at |z| >= z_threshold.
+
+    Query params:
+      - city (optional): only this city's stations
+      - all = 1/0 (optional): every scored station, not just the flagged ones
+    """
+    city = (request.args.get("city") or "").strip()
+    include_all = request.args.get("all", "0") in ("1", "true", "True")
+    ids = _select_station_ids(city=city) if city else range(len(stations))
+
+    rows = []
+    for sid in ids:
+        name = stations[sid]["name"]
+        anomaly = live_anomalies.get(name)
+        if anomaly is None or not (include_all or anomaly["flagged"]):
+            continue
+        rows.append({
+            "name": name,
+            "city": stations[sid]["city"],
+            "live_ts": station_live_ts.get(name),
+            **anomaly,
+        })
+    rows.sort(key=lambda r: -abs(r["z"]))
 
-    return jsonify({"success": bool(ok)})
+    return jsonify({
+        "success": True,
+        "version": live_snapshot_version,
+        **live_anomalies_meta,
+        "anomalies": rows,
+    })
 
 
 @app.route("/get_weather", methods=["GET"])
@@ -1350,7 +2485,7 @@ def get_dispersion():
     use_live_param = request.args.get("use_live", "1")
     use_live = use_live_param not in ("0", "false", "False")
 
-    grid = compute_plume_for_city(city, use_live=use_live, grid_size=25)
+    grid = compute_plume_for_city(city, use_live=use_live, grid_size=25, overlay=_current_overlay())
 
     if not grid:
         return jsonify({"success": False, "error": f"No dispersion field for city '{city}'"}), 404
@@ -1363,6 +2498,29 @@ def get_dispersion():
     })
 
 
+def _station_snapshot_token(s, baseline_co2, live_est, env_data):
+    """
+    integrity_token of a station as served by /get_stations.
+    Uses the same "auto" logic as interventions: prefer baseline CO2, else live_est.
+    """
+    effective_co2 = None
+    if baseline_co2 is not None and not pd.isna(baseline_co2):
+        effective_co2 = float(baseline_co2)
+    elif live_est is not None:
+        effective_co2 = float(live_est)
+
+    if effective_co2 is None or env_data is None:
+        return None
+    return _compute_station_integrity_token(
+        name=s["name"],
+        city=s["city"],
+        co2=effective_co2,
+        ndvi=env_data["ndvi"],
+        albedo=env_data["albedo"],
+        lulc=env_data["lulc"],
+    )
+
+
 @app.route("/get_stations")
 def get_stations():
     """
@@ -1371,13 +2529,18 @@ def get_stations():
       - co2 (baseline from CSV, if present)
       - co2_estimated (CPCB-derived, if present)
       - live_ts (timestamp for live_estimate, if present)
+      - pollutants (raw pm25/pm10/no2/co behind co2_estimated, if present)
+      - anomaly_z, anomaly_band, anomaly (co2_estimated vs the day-of-year
+        climatology of the same estimate, see /anomalies; only for the shared live value)
       - ndvi, albedo, lulc (real or synthetic – always present)
     """
     data = []
+    live_frame = _frame_for_registry(station_pollutants_live)
+    overlay = _current_overlay()
     for s in stations:
         station_name = s["name"]
-        baseline_co2 = station_co2.get(station_name)
-        live_est = station_co2_live.get(station_name)
+        baseline_co2 = _scenario_value(overlay, "baseline", station_name)
+        live_est = _scenario_value(overlay, "live", station_name)
         live_ts = station_live_ts.get(station_name)
 
         info = {
@@ -1395,6 +2558,16 @@ def get_stations():
             info["co2_estimated"] = _sanitize_co2(live_est)
             info["live_ts"] = live_ts
 
+        anomaly = live_anomalies.get(station_name)
+        if anomaly is not None and live_est is not None and live_est == station_co2_live.get(station_name):
+            info["anomaly_z"] = anomaly["z"]
+            info["anomaly_band"] = anomaly["band"]
+            info["anomaly"] = anomaly["flagged"]
+
+        pollutants = live_frame.row(station_index[station_name])
+        if pollutants is not None:
+            info["pollutants"] = pollutants
+
         # env factors + integrity_token logic stays the same...
 
 
@@ -1408,28 +2581,109 @@ def get_stations():
             })
 
         # ---- NEW: integrity_token for this station snapshot ----
-        # Use the same "auto" logic as interventions: prefer baseline CO2, else live_est
-        effective_co2 = None
-        if baseline_co2 is not None and not pd.isna(baseline_co2):
-            effective_co2 = float(baseline_co2)
-        elif live_est is not None:
-            effective_co2 = float(live_est)
-
-        if effective_co2 is not None and env_data is not None:
-            token = _compute_station_integrity_token(
-                name=station_name,
-                city=s["city"],
-                co2=effective_co2,
-                ndvi=env_data["ndvi"],
-                albedo=env_data["albedo"],
-                lulc=env_data["lulc"],
-            )
+        token = _station_snapshot_token(s, baseline_co2, live_est, env_data)
+        if token is not None:
             info["integrity_token"] = token
         data.append(info)
 
     return jsonify(data)
 
 
+# Upper bound on tokens per /verify_integrity_tokens call
+MAX_VERIFY_TOKENS = 10000
+
+
+@app.route("/verify_integrity_tokens", methods=["POST"])
+def verify_integrity_tokens():
+    """
+    Revalidate many station integrity tokens at once against the current
+    snapshot (this session's scenario included).
+
+    Expected JSON:
+      { "tokens": { "<station name>": "<integrity_token>", ... } }
+
+    Returns per-station validity; for invalid or stale tokens the current token
+    is included so the client can refresh without a full /get_stations.
+    """
+    data = request.get_json(silent=True) or {}
+    tokens = data.get("tokens")
+    if not isinstance(tokens, dict) or not tokens:
+        return jsonify({"success": False, "error": "tokens must be a non-empty object"}), 400
+    if len(tokens) > MAX_VERIFY_TOKENS:
+        return jsonify({"success": False, "error": f"at most {MAX_VERIFY_TOKENS} tokens per call"}), 400
+
+    overlay = _current_overlay()
+    results = {}
+    n_valid = 0
+    for station_name, sent_token in tokens.items():
+        sid = station_index.get(station_name)
+        if sid is None:
+            results[station_name] = {"valid": False, "error": "unknown station"}
+            continue
+
+        expected = _station_snapshot_token(
+            stations[sid],
+            _scenario_value(overlay, "baseline", station_name),
+            _scenario_value(overlay, "live", station_name),
+            get_or_generate_env_for_station(station_name),
+        )
+        if expected is None:
+            results[station_name] = {"valid": False, "error": "station has no CO2 value"}
+        elif hmac.compare_digest(str(sent_token or ""), expected):
+            results[station_name] = {"valid": True}
+            n_valid += 1
+        else:
+            results[station_name] = {"valid": False, "integrity_token": expected}
+
+    return jsonify({
+        "success": True,
+        "valid": n_valid,
+        "invalid": len(tokens) - n_valid,
+        "results": results,
+    })
+
+
+@app.route("/get_pollutant_history", methods=["GET"])
+def get_pollutant_history():
+    """
+    Raw pollutant readings from the most recent live refreshes (oldest first).
+
+    Query params:
+      - station (optional): only this station's readings
+      - limit (optional): number of refreshes to return (default: all kept)
+      - estimate = 1/0 (optional): include the recomputed CO2 estimate column
+    """
+    station_name = (request.args.get("station") or "").strip()
+    try:
+        limit = int(request.args.get("limit", LIVE_POLLUTANT_HISTORY_LEN))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "limit must be an integer"}), 400
+    with_estimate = request.args.get("estimate", "0") in ("1", "true", "True")
+
+    if station_name and station_name not in station_index:
+        return jsonify({"success": False, "error": f"Unknown station '{station_name}'"}), 404
+
+    names = [s["name"] for s in stations]
+    # frames of another dataset version (a refresh that raced a reload) are left out
+    frames = [f for f in pollutant_history if f.dataset_version == dataset_version]
+    frames = frames[-limit:] if limit > 0 else []
+
+    refreshes = []
+    for frame in frames:
+        if station_name:
+            frame = frame.select([station_index[station_name]])
+        entry = frame.to_dict(names)
+        if with_estimate:
+            entry["co2_estimated"] = [round(float(v), 2) for v in estimate_co2_from_pollutant_frame(frame)]
+        refreshes.append(entry)
+
+    return jsonify({
+        "success": True,
+        "pollutants": list(POLLUTANTS),
+        "refreshes": refreshes
+    })
+
+
 def intervention_effect(base_co2, ndvi, albedo, lulc_factor, user_efficiency=None, weather=None):
     """
     Compute CO2 reduction based on NDVI, Albedo, LULC factor and optional
@@ -1466,210 +2720,1118 @@ def intervention_effect(base_co2, ndvi, albedo, lulc_factor, user_efficiency=Non
         wind = weather.get("windspeed_ms") or weather.get("windspeed")
         mixing = weather.get("mixing_height")
 
-        # Stagnation: in high-stagnation months an intervention
-        # can have more visible impact (higher local buildup).
-        if "high" in stag:
-            reduction_ratio *= 1.20
-        elif "elevated" in stag:
-            reduction_ratio *= 1.10
-        elif "low" in stag:
-            reduction_ratio *= 0.90
+        # Stagnation: in high-stagnation months an intervention
+        # can have more visible impact (higher local buildup).
+        if "high" in stag:
+            reduction_ratio *= 1.20
+        elif "elevated" in stag:
+            reduction_ratio *= 1.10
+        elif "low" in stag:
+            reduction_ratio *= 0.90
+
+        # Very low wind => a bit more impact, high wind => slightly less
+        try:
+            if wind is not None:
+                w = float(wind)
+                if w < 1.5:
+                    reduction_ratio *= 1.05
+                elif w > 5.0:
+                    reduction_ratio *= 0.90
+        except (ValueError, TypeError):
+            pass
+
+        # Low mixing height => more accumulation => more visible reduction
+        try:
+            if mixing is not None:
+                mh = float(mixing)
+                if mh < 500:
+                    reduction_ratio *= 1.05
+                elif mh > 900:
+                    reduction_ratio *= 0.92
+        except (ValueError, TypeError):
+            pass
+
+    # Safety clamp
+    reduction_ratio = max(0.0, min(reduction_ratio, 0.5))
+
+    reduced_co2 = base_co2 * (1 - reduction_ratio)
+    return round(reduced_co2, 2)
+
+# ----------- Per-session scenario overlays -----------
+# Interventions never touch station_co2 / station_co2_live; each browser session
+# gets an overlay with only the stations it changed (see backend/scenarios.py).
+#
+# Overlays are kept in this worker's memory, so a multi-worker deployment needs
+# sticky sessions (or a single worker). A session whose overlay is not here (served
+# by another worker, restart, LRU eviction) gets an X-Scenario-Missing: 1 header
+# and "scenario_missing": true from /scenario instead of silently losing its edits.
+scenario_store = ScenarioStore(max_bytes=env_number("SCENARIO_MAX_BYTES", SCENARIO_MAX_BYTES))
+
+
+def _current_overlay(create=False):
+    """
+    Overlay of the current session, or None if it has none yet.
+    With create=True a scenario id is assigned to the session when missing.
+    """
+    key = session.get("scenario_id")
+    if key is None:
+        if not create:
+            return None
+        key = secrets.token_hex(16)
+        session["scenario_id"] = key
+        return scenario_store.get_or_create(key)
+
+    overlay = scenario_store.get(key)
+    if overlay is None:
+        # the session had an overlay, but this worker does not hold it
+        if not g.get("scenario_missing"):
+            print(f"[scenario] overlay of this session is not held by worker {worker_id()} "
+                  "(other worker, restart or evicted); are sessions sticky?")
+        g.scenario_missing = True
+        if create:
+            overlay = scenario_store.get_or_create(key)
+    return overlay
+
+
+@app.after_request
+def _flag_missing_scenario(response):
+    if g.get("scenario_missing"):
+        response.headers["X-Scenario-Missing"] = "1"
+    return response
+
+
+# A session can switch its baseline to another day (/set_month_baseline) without
+# changing it for anyone else: station_co2 / baseline_day are the default day's,
+# other days come from the baseline cube (memoized, cleared on dataset reload).
+BASELINE_DAY_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=BASELINE_DAY_CACHE_SIZE)
+def _baseline_day_cached(month, day):
+    return _baseline_for_day(month, day)[0]
+
+
+def _session_baseline_day():
+    """(month, day) of the baseline this session looks at."""
+    day = session.get("baseline_day") if has_request_context() else None
+    return tuple(day) if day else baseline_day
+
+
+def _shared_store(applied_to):
+    if applied_to != "baseline":
+        return station_co2_live
+    day = _session_baseline_day()
+    return station_co2 if day == baseline_day else _baseline_day_cached(*day)
+
+
+def _scenario_value(overlay, applied_to, station_name):
+    """Shared baseline / live value of a station with the overlay applied on top."""
+    shared = _shared_store(applied_to).get(station_name)
+    if overlay is not None and shared is not None:
+        value = overlay.get(applied_to, station_name, shared)
+        if value is not None:
+            return value
+    return shared
+
+
+def _resolve_base_value(station_name, target, overlay=None):
+    """
+    Decide which current CO2 value an intervention starts from.
+    target can be: "baseline", "live", or anything else (auto → baseline then live).
+    Values of the session overlay take precedence over the shared ones.
+    Returns (base_value, applied_to) or (None, None).
+    """
+    if target == "live":
+        order = ("live", "baseline")
+    else:  # "baseline" and "auto" → prefer baseline, then live
+        order = ("baseline", "live")
+
+    for applied_to in order:
+        if station_name in _shared_store(applied_to):
+            return _scenario_value(overlay, applied_to, station_name), applied_to
+    return None, None
+
+
+def _store_reduced_values(overlay, results):
+    """
+    Record intervention results [(station_name, applied_to, reduced_co2)] in the
+    session overlay as one undo step (shared stores stay untouched).
+    """
+    overlay.apply([
+        (applied_to, station_name, reduced_co2, _shared_store(applied_to).get(station_name))
+        for station_name, applied_to, reduced_co2 in results
+    ])
+
+
+# Activity rows are written by a background thread in micro-batches (backend/activity_log.py)
+activity_logger = ActivityLogger(ACTIVITIES_DB)
+atexit.register(activity_logger.close)
+
+
+def _log_activities(rows):
+    """
+    Queue activity rows (user_id, city, station, intervention, efficiency,
+    base_co2, after_co2) for the background writer. Logging failures never break the caller.
+    """
+    activity_logger.log(rows)
+
+
+@app.route("/activity_log_stats", methods=["GET"])
+def activity_log_stats():
+    """Queue depth, batch counts and write latency of the activity writer."""
+    return jsonify({"success": True, **activity_logger.stats()})
+
+
+@app.route("/dataset_memory_stats", methods=["GET"])
+def dataset_memory_stats():
+    """
+    Memory of the loaded station_day frame vs the same rows with default pandas
+    dtypes, and whether this worker maps the shared read-only arrays.
+    """
+    return jsonify({
+        "success": True,
+        "station_day": station_day_memory,
+        "shared_arrays": {
+            "enabled": shared_arrays is not None,
+            "attached_existing": bool(shared_arrays and shared_arrays.attached),
+            "bytes": shared_arrays.nbytes if shared_arrays else 0,
+        },
+    })
+
+
+@app.route("/apply_intervention", methods=["POST"])
+def apply_intervention():
+    """
+    Apply an intervention to either:
+      - baseline CO2 (station_co2), or
+      - live CO2 estimate (station_co2_live),
+    depending on what the frontend sends in `target`.
+    target can be: "baseline", "live", or omitted (auto → baseline then live).
+    The result is stored in this session's scenario overlay only.
+    """
+    data = request.get_json()
+    play_snapshot = data.get("play_snapshot") or {}
+    station_name = data.get("station")
+    efficiency = data.get("efficiency")  # 0–50%
+    target = data.get("target") or data.get("applied_to") or "auto"
+
+    # NEW: also read city + intervention name from payload (sent by frontend)
+    station_city = data.get("city") or _get_station_city(station_name)
+    method_name = data.get("intervention")
+
+    sent_token = data.get("integrity_token")
+
+    if not station_name:
+        return jsonify({"success": False, "error": "station is required"}), 400
+
+    # validated before anything touches the overlay
+    try:
+        efficiency = float(efficiency) if efficiency is not None else None
+    except (TypeError, ValueError):
+        efficiency = math.nan
+    if efficiency is not None and not math.isfinite(efficiency):
+        return jsonify({"success": False, "error": "efficiency must be a number"}), 400
+
+    # --- Resolve env factors (same for baseline + live) ---
+    env = get_or_generate_env_for_station(station_name)
+    if not env:
+        return jsonify({
+            "success": False,
+            "error": "Station environmental data not found (even synthetic)."
+        }), 404
+
+    ndvi = env["ndvi"]
+    albedo = env["albedo"]
+    lulc_str = env["lulc"]
+    lulc_factor = lulc_mapping.get(lulc_str, 1.5)
+
+    # --- Decide which current value to use (baseline or live) ---
+    overlay = _current_overlay(create=True)
+    base_value, applied_to = _resolve_base_value(station_name, target, overlay)
+
+    if base_value is None:
+        return jsonify({
+            "success": False,
+            "error": "No CO2 value found for this station (neither baseline nor live)."
+        }), 404
+
+    # Hard clamp base_value
+    base_value = _sanitize_co2(base_value, default=400.0, min_val=350.0, max_val=2000.0)
+
+    # ---------- Integrity verification (HMAC-SHA256) ----------
+    if sent_token is not None:
+        # if city wasn't in payload, we already derived station_city above
+        expected_token = _compute_station_integrity_token(
+            name=station_name,
+            city=station_city,
+            co2=base_value,
+            ndvi=ndvi,
+            albedo=albedo,
+            lulc=lulc_str,
+        )
+
+        if not hmac.compare_digest(sent_token, expected_token):
+            return jsonify({
+                "success": False,
+                "error": "Integrity check failed for station payload."
+            }), 400
+
+    # --- Compute new CO2 after intervention ---
+    reduced_co2 = intervention_effect(base_value, ndvi, albedo, lulc_factor, efficiency)
+    reduced_co2 = _sanitize_co2(reduced_co2, default=base_value, min_val=300.0, max_val=2000.0)
+
+    # --- Persist in this session's overlay ---
+    _store_reduced_values(overlay, [(station_name, applied_to, reduced_co2)])
+    scenario_store.enforce_limits(keep=session.get("scenario_id"))
+
+    # --- NEW: Log this action into activities table ---
+    username = session.get("user") or "anonymous"
+    _log_activities([(
+        username,
+        station_city,
+        station_name,
+        method_name,
+        efficiency,
+        float(base_value),
+        float(reduced_co2),
+    )])
+
+    # NEW: compute updated integrity token for the new CO2 value (optional but useful)
+    new_token = None
+    try:
+        new_token = _compute_station_integrity_token(
+            name=station_name,
+            city=station_city,
+            co2=reduced_co2,
+            ndvi=ndvi,
+            albedo=albedo,
+            lulc=lulc_str,
+        )
+    except Exception:
+        new_token = None
+
+    
+    return jsonify({
+        "success": True,
+        "station": station_name,
+        "applied_to": applied_to,
+        "base_co2": base_value,
+        "co2_after": reduced_co2,
+        "ndvi": ndvi,
+        "albedo": albedo,
+        "lulc": lulc_factor,
+        "integrity_token": new_token
+    })
+
+
+# Upper bound on items per /apply_interventions_batch call
+MAX_BATCH_INTERVENTIONS = 5000
+
+
+@app.route("/apply_interventions_batch", methods=["POST"])
+def apply_interventions_batch():
+    """
+    Apply many interventions in one request.
+
+    Expected JSON:
+      {
+        "target": "auto" | "baseline" | "live",      (default for items)
+        "items": [
+          { "station": "...", "intervention": "...", "efficiency": 30,
+            "integrity_token": "...", "city": "...", "target": "..." },
+          ...
+        ]
+      }
+
+    Items are validated and token-checked together, the reductions are computed
+    in one vectorized intervention_effect pass, and every applied item is logged
+    in a single activities transaction. Invalid items are reported per item and
+    skipped; the rest are still applied.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+    default_target = data.get("target") or "auto"
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "error": "items must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH_INTERVENTIONS:
+        return jsonify({
+            "success": False,
+            "error": f"at most {MAX_BATCH_INTERVENTIONS} items per batch"
+        }), 400
+
+    results = [None] * len(items)
+    valid = []  # (position, resolved item dict)
+    seen = set()
+    overlay = _current_overlay(create=True)
+
+    # ---- 1) Resolve station, env and base value for every item ----
+    for pos, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[pos] = {"success": False, "error": "item must be an object"}
+            continue
+
+        station_name = item.get("station")
+        if not station_name or station_name not in station_index:
+            results[pos] = {"success": False, "station": station_name, "error": "unknown station"}
+            continue
+        if station_name in seen:
+            results[pos] = {"success": False, "station": station_name, "error": "duplicate station in batch"}
+            continue
+        seen.add(station_name)
+
+        env = get_or_generate_env_for_station(station_name)
+        base_value, applied_to = _resolve_base_value(station_name, item.get("target") or default_target, overlay)
+        if base_value is None:
+            results[pos] = {
+                "success": False,
+                "station": station_name,
+                "error": "No CO2 value found for this station (neither baseline nor live)."
+            }
+            continue
+
+        efficiency = item.get("efficiency")
+        try:
+            efficiency = float(efficiency) if efficiency is not None else None
+        except (TypeError, ValueError):
+            efficiency = None
+
+        valid.append((pos, {
+            "station": station_name,
+            "city": item.get("city") or stations[station_index[station_name]]["city"],
+            "intervention": item.get("intervention"),
+            "efficiency": efficiency,
+            "token": item.get("integrity_token"),
+            "env": env,
+            "base": _sanitize_co2(base_value, default=400.0, min_val=350.0, max_val=2000.0),
+            "applied_to": applied_to,
+        }))
+
+    # ---- 2) Integrity verification in bulk ----
+    checked = []
+    for pos, it in valid:
+        if it["token"] is not None:
+            expected_token = _compute_station_integrity_token(
+                name=it["station"],
+                city=it["city"],
+                co2=it["base"],
+                ndvi=it["env"]["ndvi"],
+                albedo=it["env"]["albedo"],
+                lulc=it["env"]["lulc"],
+            )
+            if not hmac.compare_digest(str(it["token"]), expected_token):
+                results[pos] = {
+                    "success": False,
+                    "station": it["station"],
+                    "error": "Integrity check failed for station payload."
+                }
+                continue
+        checked.append((pos, it))
+
+    # ---- 3) One vectorized pass over all accepted items ----
+    username = session.get("user") or "anonymous"
+    log_rows = []
+    stored = []
+    total_reduction = 0.0
+
+    if checked:
+        base_arr = np.array([it["base"] for _, it in checked], dtype=np.float64)
+        reduced_arr = intervention_effect_array(
+            base_arr,
+            np.array([it["env"]["ndvi"] for _, it in checked], dtype=np.float64),
+            np.array([it["env"]["albedo"] for _, it in checked], dtype=np.float64),
+            np.array([lulc_mapping.get(it["env"]["lulc"], 1.5) for _, it in checked], dtype=np.float64),
+            np.array([np.nan if it["efficiency"] is None else it["efficiency"] for _, it in checked],
+                     dtype=np.float64),
+        )
+
+        for (pos, it), reduced in zip(checked, reduced_arr.tolist()):
+            reduced_co2 = _sanitize_co2(round(reduced, 2), default=it["base"], min_val=300.0, max_val=2000.0)
+            stored.append((it["station"], it["applied_to"], reduced_co2))
+
+            log_rows.append((
+                username, it["city"], it["station"], it["intervention"],
+                it["efficiency"], float(it["base"]), float(reduced_co2),
+            ))
+            total_reduction += it["base"] - reduced_co2
+
+            results[pos] = {
+                "success": True,
+                "station": it["station"],
+                "applied_to": it["applied_to"],
+                "base_co2": it["base"],
+                "co2_after": reduced_co2,
+                "integrity_token": _compute_station_integrity_token(
+                    name=it["station"],
+                    city=it["city"],
+                    co2=reduced_co2,
+                    ndvi=it["env"]["ndvi"],
+                    albedo=it["env"]["albedo"],
+                    lulc=it["env"]["lulc"],
+                ),
+            }
+
+    if stored:
+        _store_reduced_values(overlay, stored)
+        scenario_store.enforce_limits(keep=session.get("scenario_id"))
+
+    # ---- 4) Single transaction for the activity log ----
+    _log_activities(log_rows)
+
+    return jsonify({
+        "success": bool(log_rows),
+        "applied": len(log_rows),
+        "failed": len(items) - len(log_rows),
+        "total_reduction": round(total_reduction, 2),
+        "results": results
+    })
+
+@app.route("/scenario", methods=["GET"])
+def get_scenario():
+    """
+    Stations changed on the current branch of this session's scenario, the
+    branch list, undo / redo availability and overlay store stats.
+    Overrides whose shared value has since changed (new live refresh, other
+    baseline day) are no longer listed.
+    """
+    overlay = _current_overlay()
+    changes = []
+    if overlay is not None:
+        for applied_to in ("baseline", "live"):
+            for name, value, origin in overlay.items(applied_to):
+                if _shared_store(applied_to).get(name) != origin:
+                    continue
+                changes.append({
+                    "station": name,
+                    "applied_to": applied_to,
+                    "shared_co2": origin,
+                    "co2": value,
+                })
+    return jsonify({
+        "success": True,
+        **(overlay.summary() if overlay is not None else ScenarioOverlay().summary()),
+        "changes": changes,
+        "scenario_missing": bool(g.get("scenario_missing")),
+        "store": scenario_store.stats(),
+    })
+
+
+@app.route("/reset_scenario", methods=["POST"])
+def reset_scenario():
+    """Drop this session's overlay so it sees the shared baseline / live values again."""
+    key = session.get("scenario_id")
+    removed = scenario_store.discard(key) if key else False
+    return jsonify({"success": True, "removed": removed})
+
+
+@app.route("/scenario_undo", methods=["POST"])
+def scenario_undo():
+    """Step the current branch back by one intervention (or batch)."""
+    overlay = _current_overlay()
+    done = overlay.undo() if overlay is not None else False
+    return jsonify({"success": done, **(overlay.summary() if overlay is not None else {})})
+
+
+@app.route("/scenario_redo", methods=["POST"])
+def scenario_redo():
+    """Re-apply the last undone step of the current branch."""
+    overlay = _current_overlay()
+    done = overlay.redo() if overlay is not None else False
+    return jsonify({"success": done, **(overlay.summary() if overlay is not None else {})})
+
+
+@app.route("/scenario_branch", methods=["POST"])
+def scenario_branch():
+    """
+    Branch operations on this session's scenario.
+
+    Expected JSON:
+      { "action": "fork",   "name": "alt-1", "from": "main" (optional), "switch": true }
+      { "action": "switch", "name": "alt-1" }
+      { "action": "delete", "name": "alt-1" }
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get("action") or "fork"
+    name = (data.get("name") or "").strip()
+
+    overlay = _current_overlay(create=True)
+    try:
+        if action == "fork":
+            overlay.fork(name, data.get("from"))
+            if data.get("switch", True):
+                overlay.switch(name)
+        elif action == "switch":
+            overlay.switch(name)
+        elif action == "delete":
+            overlay.delete_branch(name)
+        else:
+            return jsonify({"success": False, "error": f"unknown action '{action}'"}), 400
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    scenario_store.enforce_limits(keep=session.get("scenario_id"))
+    return jsonify({"success": True, **overlay.summary()})
+
+
+def _scenario_context():
+    """What the overrides' origins refer to: baseline day, live data and dataset version."""
+    return {
+        "baseline_day": list(_session_baseline_day() or ()) or None,
+        "live_source": station_pollutants_live.source,
+        "live_ts": station_pollutants_live.ts,
+        "live_version": live_snapshot_version,
+        "dataset_fingerprint": dataset_fingerprint,
+        "dataset_version": dataset_version,
+    }
+
+
+def _shared_values():
+    return {applied_to: _shared_store(applied_to) for applied_to in ("baseline", "live")}
+
+
+@app.route("/scenario_export", methods=["GET"])
+def scenario_export():
+    """
+    Download every branch head of this session's scenario as a .json.gz file,
+    with the baseline day / live data / dataset version its overrides start from.
+    """
+    overlay = _current_overlay()
+    if overlay is None:
+        return jsonify({"success": False, "error": "No scenario in this session"}), 404
+
+    return send_file(
+        io.BytesIO(overlay.export_bytes(context=_scenario_context())),
+        mimetype="application/gzip",
+        as_attachment=True,
+        download_name=f"scenario_{int(time.time())}.json.gz",
+    )
+
+
+@app.route("/scenario_import", methods=["POST"])
+def scenario_import():
+    """
+    Replace this session's scenario with an exported one.
+    Accepts a multipart upload (field "file") or the raw file as request body.
+    Overrides for stations that no longer exist are skipped.
+
+    Overrides only apply while the shared value they started from is current, so
+    a file saved on another baseline day, live refresh or dataset version has
+    stale ones. With ?rebase=1 (or form field rebase) they are moved onto the
+    current values keeping their relative change; otherwise they are listed in
+    "stale". A file whose overrides are all stale is rejected (409).
+    """
+    upload = request.files.get("file")
+    raw = upload.read() if upload is not None else request.get_data()
+    if not raw:
+        return jsonify({"success": False, "error": "scenario file is required"}), 400
+
+    try:
+        overlay, skipped = ScenarioOverlay.import_bytes(raw, known_stations=station_index)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    shared = _shared_values()
+    total = sum(len(m) for b in overlay.branches.values() for m in b.state)
+    rebase = (request.args.get("rebase") or request.form.get("rebase") or "0") in ("1", "true", "True")
+    rebased = overlay.rebase(shared) if rebase else 0
+    stale = overlay.stale(shared)
+    context = {"exported": overlay.context, "current": _scenario_context()}
+    if total and len(stale) == total:
+        return jsonify({
+            "success": False,
+            "error": "every override in this scenario is stale (its shared values have changed); "
+                     "import with rebase=1 to apply them to the current values",
+            "stale": stale,
+            "context": context,
+        }), 409
+
+    _current_overlay(create=True)
+    scenario_store.put(session["scenario_id"], overlay)
+    scenario_store.enforce_limits(keep=session["scenario_id"])
+    return jsonify({
+        "success": True,
+        "skipped": skipped,
+        "applied": total - len(stale),
+        "rebased": rebased,
+        "stale": stale,
+        "context": context,
+        **overlay.summary(),
+    })
+
+# ----------- Read-only scenario evaluation (array based) -----------
+
+def _select_station_ids(names=None, city=None):
+    """
+    Registry ids for an explicit list of station names, or for every station
+    of a city (exact + substring match, like compute_plume_for_city), or all stations.
+    Unknown names are ignored.
+    """
+    if names:
+        return [station_index[n] for n in names if n in station_index]
+    if city:
+        city_clean = city.strip().lower()
+        return [
+            i for i, s in enumerate(stations)
+            if isinstance(s.get("city"), str)
+            and (s["city"].strip().lower() == city_clean or city_clean in s["city"].strip().lower())
+        ]
+    return list(range(len(stations)))
+
+
+def _requested_station_ids(data):
+    """
+    _select_station_ids for a JSON body's "stations" (list of names) / "city".
+    Raises ValueError if either has the wrong type.
+    """
+    names = data.get("stations")
+    if names is not None and not (isinstance(names, list) and all(isinstance(n, str) for n in names)):
+        raise ValueError("stations must be a list of station names")
+    city = data.get("city")
+    if city is not None and not isinstance(city, str):
+        raise ValueError("city must be a string")
+    return _select_station_ids(names, (city or "").strip() or None)
+
+
+def _station_model_inputs(ids, target="auto", overlay=None):
+    """
+    Arrays for the intervention model over registry ids:
+    (base_co2, ndvi, albedo, lulc_factor), base_co2 NaN where the station has no value.
+    Reads the shared stores (plus the session overlay) only – never mutates them.
+    """
+    base = np.full(len(ids), np.nan, dtype=np.float64)
+    for k, sid in enumerate(ids):
+        value, _ = _resolve_base_value(stations[sid]["name"], target, overlay)
+        if value is not None:
+            base[k] = _sanitize_co2(value, default=400.0, min_val=350.0, max_val=2000.0)
+
+    idx = np.asarray(ids, dtype=np.int64)
+    ndvi = env_table.ndvi[idx]
+    albedo = env_table.albedo[idx]
+    lulc_factor = env_table.lulc_factors(lulc_mapping)[idx]
+    return base, ndvi, albedo, lulc_factor
+
+
+def _encode_f32(arr):
+    """Little-endian float32 bytes, base64 encoded (compact array payloads)."""
+    return base64.b64encode(np.ascontiguousarray(arr, dtype="<f4").tobytes()).decode("ascii")
+
+
+# Largest response surface /intervention_sweep will compute (stations × grid cells)
+MAX_SWEEP_CELLS = 2_000_000
+SWEEP_DEFAULT_EFFICIENCIES = [10, 20, 30, 40, 50]
+
+
+@app.route("/intervention_sweep", methods=["POST"])
+def intervention_sweep():
+    """
+    Read-only efficiency / weather response surface for a set of stations.
+
+    Expected JSON (every field optional):
+      {
+        "stations": ["...", ...]  or  "city": "Delhi",
+        "target": "auto" | "baseline" | "live",
+        "efficiencies": [10, 20, 30, 40, 50],
+        "windspeed_ms": [1.0, 3.0, 6.0],
+        "mixing_height": [400, 700, 1000],
+        "stagnation_risk": ["Low", "Moderate", "High"],
+        "format": "f32" | "json"
+      }
+
+    Returns CO2 after intervention with shape
+      [stations, efficiencies, windspeed_ms, mixing_height, stagnation_risk]
+    computed in one broadcast evaluation. Weather axes that are not given have a
+    single "no weather" entry (null). With format=f32 (default) the values are
+    base64 little-endian float32 in row-major order; format=json returns nested lists.
+    Neither station_co2 / station_co2_live nor activities.db are touched.
+    """
+    data = request.get_json(silent=True) or {}
+
+    def _axis(key, default):
+        values = data.get(key)
+        if values is None:
+            return default
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"{key} must be a non-empty list")
+        return values
+
+    try:
+        efficiencies = [float(v) for v in _axis("efficiencies", SWEEP_DEFAULT_EFFICIENCIES)]
+        winds = [None if v is None else float(v) for v in _axis("windspeed_ms", [None])]
+        mixings = [None if v is None else float(v) for v in _axis("mixing_height", [None])]
+        stags = _axis("stagnation_risk", [None])
+        if not all(s is None or isinstance(s, str) for s in stags):
+            raise ValueError("stagnation_risk entries must be strings or null")
+        ids = _requested_station_ids(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    base, ndvi, albedo, lulc_factor = _station_model_inputs(ids, data.get("target") or "auto", _current_overlay())
+
+    has_value = ~np.isnan(base)
+    skipped = [stations[sid]["name"] for sid, ok in zip(ids, has_value.tolist()) if not ok]
+    ids = [sid for sid, ok in zip(ids, has_value.tolist()) if ok]
+    base, ndvi, albedo, lulc_factor = base[has_value], ndvi[has_value], albedo[has_value], lulc_factor[has_value]
+
+    if not ids:
+        return jsonify({"success": False, "error": "No stations with a CO2 value in the selection"}), 404
+
+    shape = (len(ids), len(efficiencies), len(winds), len(mixings), len(stags))
+    if int(np.prod(shape)) > MAX_SWEEP_CELLS:
+        return jsonify({
+            "success": False,
+            "error": f"sweep too large ({int(np.prod(shape))} cells, max {MAX_SWEEP_CELLS})"
+        }), 400
+
+    # Each input gets its own axis; broadcasting builds the full surface
+    station_axis = (slice(None), None, None, None, None)
+    surface = intervention_effect_array(
+        base[station_axis],
+        ndvi[station_axis],
+        albedo[station_axis],
+        lulc_factor[station_axis],
+        np.array(efficiencies, dtype=np.float64)[None, :, None, None, None],
+        np.array([np.nan if w is None else w for w in winds], dtype=np.float64)[None, None, :, None, None],
+        np.array([np.nan if m is None else m for m in mixings], dtype=np.float64)[None, None, None, :, None],
+        np.array([stagnation_factor(s) for s in stags], dtype=np.float64)[None, None, None, None, :],
+    )
+    surface = np.clip(surface, 300.0, 2000.0)
+
+    out = {
+        "success": True,
+        "stations": [stations[sid]["name"] for sid in ids],
+        "skipped": skipped,
+        "base_co2": [round(float(v), 2) for v in base],
+        "axes": {
+            "efficiencies": efficiencies,
+            "windspeed_ms": winds,
+            "mixing_height": mixings,
+            "stagnation_risk": stags,
+        },
+        "shape": list(shape),
+    }
+    if (data.get("format") or "f32") == "json":
+        out["co2_after"] = np.round(surface, 2).tolist()
+    else:
+        out["dtype"] = "float32"
+        out["co2_after"] = _encode_f32(surface)
+    return jsonify(out)
 
-        # Very low wind => a bit more impact, high wind => slightly less
-        try:
-            if wind is not None:
-                w = float(wind)
-                if w < 1.5:
-                    reduction_ratio *= 1.05
-                elif w > 5.0:
-                    reduction_ratio *= 0.90
-        except (ValueError, TypeError):
-            pass
+# Monte Carlo limits for /intervention_uncertainty
+MC_DEFAULT_SAMPLES = 2000
+MC_MAX_SAMPLES = 20000
 
-        # Low mixing height => more accumulation => more visible reduction
-        try:
-            if mixing is not None:
-                mh = float(mixing)
-                if mh < 500:
-                    reduction_ratio *= 1.05
-                elif mh > 900:
-                    reduction_ratio *= 0.92
-        except (ValueError, TypeError):
-            pass
 
-    # Safety clamp
-    reduction_ratio = max(0.0, min(reduction_ratio, 0.5))
+def _play_weather(data):
+    """Weather dict from a request: explicit `weather`, else the play-mode snapshot's."""
+    weather = data.get("weather")
+    if isinstance(weather, dict):
+        return weather
+    snapshot = data.get("play_snapshot") or {}
+    return snapshot.get("weather") if isinstance(snapshot, dict) else None
 
-    reduced_co2 = base_co2 * (1 - reduction_ratio)
-    return round(reduced_co2, 2)
 
-@app.route("/apply_intervention", methods=["POST"])
-def apply_intervention():
+@app.route("/intervention_uncertainty", methods=["POST"])
+def intervention_uncertainty():
     """
-    Apply an intervention to either:
-      - baseline CO2 (station_co2), or
-      - live CO2 estimate (station_co2_live),
-    depending on what the frontend sends in `target`.
-    target can be: "baseline", "live", or omitted (auto → baseline then live).
+    Monte Carlo percentile bands for intervention outcomes (read-only).
+
+    Expected JSON (every field optional):
+      {
+        "stations": ["...", ...]  or  "city": "Delhi",
+        "target": "auto" | "baseline" | "live",
+        "efficiency": 30,
+        "weather": { "windspeed_ms": 2.0, "mixing_height": 600, "stagnation_risk": "High" },
+        "samples": 2000,
+        "seed": 0,
+        "percentiles": [5, 25, 50, 75, 95]
+      }
+
+    NDVI, albedo, base CO2 and weather are sampled around their current values;
+    synthetic stations get wider spreads and a random LULC class (see
+    backend/uncertainty.py). The same seed always gives the same bands.
     """
-    data = request.get_json()
-    play_snapshot = data.get("play_snapshot") or {}
-    station_name = data.get("station")
-    station_id = data.get("station_id")  # optional
-    efficiency = data.get("efficiency")  # 0–50%
-    target = data.get("target") or data.get("applied_to") or "auto"
+    data = request.get_json(silent=True) or {}
 
-    # NEW: also read city + intervention name from payload (sent by frontend)
-    station_city = data.get("city") or _get_station_city(station_name)
-    method_name = data.get("intervention")
+    try:
+        n_samples = int(data.get("samples", MC_DEFAULT_SAMPLES))
+        seed = int(data.get("seed", 0))
+        percentiles = [float(p) for p in (data.get("percentiles") or DEFAULT_PERCENTILES)]
+        efficiency = data.get("efficiency")
+        efficiency = np.nan if efficiency is None else float(efficiency)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "samples, seed, percentiles and efficiency must be numeric"}), 400
 
-    sent_token = data.get("integrity_token")
+    if not (1 <= n_samples <= MC_MAX_SAMPLES):
+        return jsonify({"success": False, "error": f"samples must be 1–{MC_MAX_SAMPLES}"}), 400
+    if not all(0 <= p <= 100 for p in percentiles):
+        return jsonify({"success": False, "error": "percentiles must be within 0–100"}), 400
+    if seed < 0:
+        return jsonify({"success": False, "error": "seed must be a non-negative integer"}), 400
 
-    if not station_name:
-        return jsonify({"success": False, "error": "station is required"}), 400
+    try:
+        ids = _requested_station_ids(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    base, ndvi, albedo, lulc_factor = _station_model_inputs(ids, data.get("target") or "auto", _current_overlay())
+
+    keep = ~np.isnan(base)
+    ids = [sid for sid, ok in zip(ids, keep.tolist()) if ok]
+    base, ndvi, albedo, lulc_factor = base[keep], ndvi[keep], albedo[keep], lulc_factor[keep]
+    if not ids:
+        return jsonify({"success": False, "error": "No stations with a CO2 value in the selection"}), 404
+
+    names = [stations[sid]["name"] for sid in ids]
+    synthetic = ~env_table.measured[np.asarray(ids, dtype=np.int64)]
+    city_names = sorted({stations[sid]["city"] or "" for sid in ids})
+    city_pos = {c: k for k, c in enumerate(city_names)}
+    city_idx = np.array([city_pos[stations[sid]["city"] or ""] for sid in ids], dtype=np.int64)
+    lulc_choices = np.array([lulc_mapping.get(l, 1.5) for l in SYNTHETIC_LULC_OPTIONS], dtype=np.float64)
+    wind, mixing, stagnation = weather_inputs(_play_weather(data))
+
+    station_pct, city_pct, chunks = run_monte_carlo(
+        np.array(ids), base, ndvi, albedo, lulc_factor, synthetic, city_idx, len(city_names),
+        lulc_choices, efficiency=efficiency, wind=wind, mixing=mixing, stagnation=stagnation,
+        n_samples=n_samples, seed=seed, percentiles=percentiles,
+    )
 
-    # --- Resolve env factors (same for baseline + live) ---
-    key = None
-    if station_id and station_id in station_env:
-        key = station_id
-    else:
-        for sid, name in station_map.items():
-            if name == station_name:
-                key = sid
-                break
+    deterministic = np.clip(
+        intervention_effect_array(base, ndvi, albedo, lulc_factor, efficiency, wind, mixing, stagnation),
+        300.0, 2000.0,
+    )
 
-    env = get_or_generate_env_for_station(station_name)
-    if not env:
-        return jsonify({
-            "success": False,
-            "error": "Station environmental data not found (even synthetic)."
-        }), 404
+    return jsonify({
+        "success": True,
+        "samples": n_samples,
+        "seed": seed,
+        "percentiles": percentiles,
+        "chunks": chunks,
+        "stations": [
+            {
+                "name": name,
+                "city": stations[sid]["city"],
+                "synthetic_env": bool(syn),
+                "base_co2": round(float(b), 2),
+                "co2_after": round(float(d), 2),
+                "co2_after_pct": [round(float(v), 2) for v in pct],
+            }
+            for name, sid, syn, b, d, pct in zip(names, ids, synthetic, base, deterministic, station_pct)
+        ],
+        "cities": [
+            {
+                "city": city,
+                "stations": int((city_idx == k).sum()),
+                "mean_co2_after_pct": [round(float(v), 2) for v in city_pct[k]],
+            }
+            for k, city in enumerate(city_names)
+        ]
+    })
 
-    ndvi = env["ndvi"]
-    albedo = env["albedo"]
-    lulc_str = env["lulc"]
-    lulc_factor = lulc_mapping.get(lulc_str, 1.5)
 
-    # --- Decide which current value to use (baseline or live) ---
-    base_value = None
-    applied_to = None
-
-    if target == "baseline":
-        if station_name in station_co2:
-            base_value = station_co2[station_name]
-            applied_to = "baseline"
-        elif station_name in station_co2_live:
-            base_value = station_co2_live[station_name]
-            applied_to = "live"
-
-    elif target == "live":
-        if station_name in station_co2_live:
-            base_value = station_co2_live[station_name]
-            applied_to = "live"
-        elif station_name in station_co2:
-            base_value = station_co2[station_name]
-            applied_to = "baseline"
-
-    else:  # "auto" → prefer baseline, then live
-        if station_name in station_co2:
-            base_value = station_co2[station_name]
-            applied_to = "baseline"
-        elif station_name in station_co2_live:
-            base_value = station_co2_live[station_name]
-            applied_to = "live"
+# Memoized what-if results for /evaluate_intervention (slider drags repeat inputs)
+EVAL_CACHE_SIZE = 50000
+
+
+@lru_cache(maxsize=EVAL_CACHE_SIZE)
+def _evaluate_cached(base_co2, ndvi, albedo, lulc_factor, efficiency, wind, mixing, stagnation):
+    """
+    Rounded, clamped CO2 after intervention for one quantized input tuple.
+    None means "not given" for efficiency / wind / mixing (NaN is not a usable cache key).
+    """
+    reduced = float(intervention_effect_array(
+        base_co2, ndvi, albedo, lulc_factor,
+        np.nan if efficiency is None else efficiency,
+        np.nan if wind is None else wind,
+        np.nan if mixing is None else mixing,
+        stagnation,
+    ))
+    return _sanitize_co2(round(reduced, 2), default=base_co2, min_val=300.0, max_val=2000.0)
+
+
+@app.route("/evaluate_intervention", methods=["POST"])
+def evaluate_intervention():
+    """
+    Read-only what-if for one station: same inputs as /apply_intervention, but
+    the play-mode weather is applied and nothing is stored or logged.
+
+    Expected JSON:
+      {
+        "station": "...",
+        "efficiency": 30,
+        "target": "auto" | "baseline" | "live",
+        "play_snapshot": { "playModeActive": true, "env": {...}, "weather": {...} }
+          or "weather": { "wind_ms": 2.0, "mixing_height_m": 600, "stagnation_risk": "High" }
+      }
+
+    With playModeActive the NDVI / albedo / LULC overrides of the play snapshot
+    are used as well. Wind and mixing height only matter through the model's
+    bands, so they are quantized to them and results are memoized.
+    """
+    data = request.get_json(silent=True) or {}
+    station_name = data.get("station")
+    if not station_name or station_name not in station_index:
+        return jsonify({"success": False, "error": "unknown station"}), 400
 
+    efficiency = data.get("efficiency")
+    try:
+        efficiency = None if efficiency is None else round(min(max(float(efficiency), 0.0), 50.0), 2)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "efficiency must be numeric"}), 400
+
+    base_value, applied_to = _resolve_base_value(
+        station_name, data.get("target") or "auto", _current_overlay()
+    )
     if base_value is None:
         return jsonify({
             "success": False,
             "error": "No CO2 value found for this station (neither baseline nor live)."
         }), 404
-
-    # Hard clamp base_value
     base_value = _sanitize_co2(base_value, default=400.0, min_val=350.0, max_val=2000.0)
 
-    # ---------- Integrity verification (HMAC-SHA256) ----------
-    if sent_token is not None:
-        # if city wasn't in payload, we already derived station_city above
-        expected_token = _compute_station_integrity_token(
-            name=station_name,
-            city=station_city,
-            co2=base_value,
-            ndvi=ndvi,
-            albedo=albedo,
-            lulc=lulc_str,
-        )
-
-        if not hmac.compare_digest(sent_token, expected_token):
-            return jsonify({
-                "success": False,
-                "error": "Integrity check failed for station payload."
-            }), 400
-
-    # --- Compute new CO2 after intervention ---
-    reduced_co2 = intervention_effect(base_value, ndvi, albedo, lulc_factor, efficiency)
-    reduced_co2 = _sanitize_co2(reduced_co2, default=base_value, min_val=300.0, max_val=2000.0)
-
-    # --- Persist in the correct in-memory store ---
-    if applied_to == "baseline":
-        station_co2[station_name] = reduced_co2
-    else:  # "live"
-        station_co2_live[station_name] = reduced_co2
-
-    # --- NEW: Log this action into activities table ---
+    env = dict(get_or_generate_env_for_station(station_name))
+    snapshot = data.get("play_snapshot")
+    if isinstance(snapshot, dict) and snapshot.get("playModeActive"):
+        for key, value in (snapshot.get("env") or {}).items():
+            if key in env and value is not None:
+                env[key] = value
     try:
-        username = session.get("user") or "anonymous"
+        ndvi = round(float(env["ndvi"]), 4)
+        albedo = round(float(env["albedo"]), 4)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "ndvi and albedo must be numeric"}), 400
+    lulc_factor = lulc_mapping.get(env["lulc"], 1.5)
 
-        conn = sqlite3.connect("activities.db")
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO activities
-              (user_id, city, station, intervention, efficiency, base_co2, after_co2)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                username,
-                station_city,
-                station_name,
-                method_name,
-                float(efficiency) if efficiency is not None else None,
-                float(base_value),
-                float(reduced_co2),
-            ),
-        )
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        # do not break main flow if logging fails
-        print("[activity] failed to insert row:", e)
+    wind, mixing, stagnation = weather_inputs(_play_weather(data))
+    wind, mixing = [None if np.isnan(v) else v for v in quantize_weather(wind, mixing)]
 
-    # NEW: compute updated integrity token for the new CO2 value (optional but useful)
-    new_token = None
-    try:
-        new_token = _compute_station_integrity_token(
-            name=station_name,
-            city=station_city,
-            co2=reduced_co2,
-            ndvi=ndvi,
-            albedo=albedo,
-            lulc=lulc_str,
-        )
-    except Exception:
-        new_token = None
+    hits_before = _evaluate_cached.cache_info().hits
+    co2_after = _evaluate_cached(base_value, ndvi, albedo, lulc_factor, efficiency, wind, mixing, stagnation)
+    cached = _evaluate_cached.cache_info().hits > hits_before
 
-    
     return jsonify({
         "success": True,
         "station": station_name,
         "applied_to": applied_to,
         "base_co2": base_value,
-        "co2_after": reduced_co2,
+        "co2_after": co2_after,
+        "reduction": round(base_value - co2_after, 2),
         "ndvi": ndvi,
         "albedo": albedo,
-        "lulc": lulc_factor,
-        "integrity_token": new_token
+        "lulc": env["lulc"],
+        "weather_bands": {
+            "windspeed_ms": wind,
+            "mixing_height": mixing,
+            "stagnation_factor": stagnation,
+        },
+        "cached": cached,
+    })
+
+
+# Upper bound on the knapsack budget resolution for /optimize_placement
+MAX_PLACEMENT_RESOLUTION = 20000
+
+
+@app.route("/optimize_placement", methods=["POST"])
+def optimize_placement_endpoint():
+    """
+    Budget-constrained intervention placement (read-only).
+
+    Expected JSON:
+      {
+        "budget": 1000000,
+        "interventions": [
+          {"name": "Roadside capture unit", "cost": 50000, "efficiency": 40},
+          {"name": "Green wall", "cost": 20000, "efficiency": 20}
+        ],
+        "stations": ["...", ...]  or  "city": "Delhi",      (optional, default all)
+        "target": "auto" | "baseline" | "live",
+        "weather": {...}  or  "play_snapshot": {...},        (optional)
+        "resolution": 2000                                   (optional)
+      }
+
+    At most one intervention is placed per station. Benefits (CO2 reduction per
+    station and intervention) come from one broadcast evaluation of the model;
+    a greedy benefit/cost pass is refined by a knapsack over the discretized
+    budget (backend/placement.py). Returns the placements ranked by reduction
+    and the marginal-benefit curve (best total reduction vs. budget).
+    """
+    data = request.get_json(silent=True) or {}
+
+    try:
+        budget = float(data.get("budget"))
+        resolution = int(data.get("resolution", DEFAULT_RESOLUTION))
+        options = data.get("interventions") or []
+        names = [str(o.get("name") or f"option {k + 1}") for k, o in enumerate(options)]
+        costs = np.array([float(o["cost"]) for o in options], dtype=np.float64)
+        efficiencies = np.array([float(o.get("efficiency", 50)) for o in options], dtype=np.float64)
+    except (TypeError, ValueError, KeyError, AttributeError):
+        return jsonify({
+            "success": False,
+            "error": "budget and interventions [{name, cost, efficiency}] are required and must be numeric"
+        }), 400
+
+    if not options:
+        return jsonify({"success": False, "error": "interventions must be a non-empty list"}), 400
+    if not (budget > 0) or not np.all(costs > 0):
+        return jsonify({"success": False, "error": "budget and every cost must be positive"}), 400
+    if not (1 <= resolution <= MAX_PLACEMENT_RESOLUTION):
+        return jsonify({"success": False, "error": f"resolution must be 1–{MAX_PLACEMENT_RESOLUTION}"}), 400
+
+    try:
+        ids = _requested_station_ids(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    base, ndvi, albedo, lulc_factor = _station_model_inputs(ids, data.get("target") or "auto", _current_overlay())
+
+    keep = ~np.isnan(base)
+    ids = [sid for sid, ok in zip(ids, keep.tolist()) if ok]
+    base, ndvi, albedo, lulc_factor = base[keep], ndvi[keep], albedo[keep], lulc_factor[keep]
+    if not ids:
+        return jsonify({"success": False, "error": "No stations with a CO2 value in the selection"}), 404
+
+    wind, mixing, stagnation = weather_inputs(_play_weather(data))
+
+    # [stations, interventions] reduction matrix
+    after = intervention_effect_array(
+        base[:, None], ndvi[:, None], albedo[:, None], lulc_factor[:, None],
+        efficiencies[None, :], wind, mixing, stagnation,
+    )
+    benefit = base[:, None] - np.clip(after, 300.0, 2000.0)
+
+    t0 = time.perf_counter()
+    result = optimize_placement(benefit, costs, budget, resolution)
+    solve_ms = (time.perf_counter() - t0) * 1000.0
+
+    choice = result["choice"]
+    placed = np.nonzero(choice >= 0)[0]
+    placed = placed[np.argsort(-benefit[placed, choice[placed]], kind="stable")]
+
+    placements = []
+    for rank, k in enumerate(placed.tolist(), start=1):
+        i = int(choice[k])
+        placements.append({
+            "rank": rank,
+            "station": stations[ids[k]]["name"],
+            "city": stations[ids[k]]["city"],
+            "intervention": names[i],
+            "cost": round(float(costs[i]), 2),
+            "base_co2": round(float(base[k]), 2),
+            "reduction": round(float(benefit[k, i]), 2),
+            "reduction_per_cost": float(benefit[k, i] / costs[i]),
+        })
+
+    return jsonify({
+        "success": True,
+        "budget": budget,
+        "method": result["method"],
+        "candidates": len(ids),
+        "total_cost": round(result["total_cost"], 2),
+        "total_reduction": round(result["total_benefit"], 2),
+        "solve_ms": round(solve_ms, 2),
+        "placements": placements,
+        "curve": [{"budget": b, "reduction": round(v, 2)} for b, v in result["curve"]],
     })
 
+
 from reportlab.platypus import (
     SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
 )
@@ -1858,6 +4020,7 @@ def _explain_reduction(entry):
     )
 
 @app.route("/generate_report", methods=["POST"])
+@_without_dataset_pin
 def generate_report():
     payload = request.get_json(force=True) or {}
 
@@ -2344,17 +4507,16 @@ def generate_report():
 @app.route("/set_month_baseline", methods=["POST", "OPTIONS"])
 def set_month_baseline():
     """
-    Switch the baseline CO2 snapshot in memory to a different
+    Switch this session's baseline CO2 snapshot to a different
     (month, day) from station_day_df.
 
     Expected JSON:
       { "month": 8, "day": 8 }
 
-    This rebuilds station_co2 using rows from station_day_df
-    where Date.month == month and Date.day == day.
+    The session then reads the baseline from the rows of station_day_df where
+    Date.month == month and Date.day == day (precomputed in baseline_cube).
+    The shared station_co2 and other sessions' baselines are not changed.
     """
-    global station_co2
-
     # Handle CORS preflight if browser sends OPTIONS
     if request.method == "OPTIONS":
         return ("", 204)
@@ -2379,13 +4541,10 @@ def set_month_baseline():
             "error": "month must be 1–12 and day 1–31"
         }), 400
 
-    # --- Filter the encrypted daily dataset for that (month, day) combo ---
-    df_sel = station_day_df[
-        (station_day_df["Date"].dt.month == month) &
-        (station_day_df["Date"].dt.day == day)
-    ]
+    # --- Look up that (month, day) in the baseline cube ---
+    n_rows = _baseline_for_day(month, day)[1] if valid_month_day(month, day) else 0
 
-    if df_sel.empty:
+    if n_rows == 0:
         # Don't wipe existing baseline, just report no match
         return jsonify({
             "success": False,
@@ -2394,34 +4553,484 @@ def set_month_baseline():
             "day": day
         }), 404
 
-    # --- Rebuild station_co2 for this snapshot ---
-    new_baseline = {}
-    for _, row in df_sel.iterrows():
-        station_id = row.get("StationId")
-        station_name = station_map.get(station_id)
-        if not station_name:
-            continue
+    session["baseline_day"] = [month, day]
+
+    # Switching the baseline day starts this session's baseline scenario afresh
+    overlay = _current_overlay()
+    if overlay is not None:
+        overlay.clear("baseline")
+
+    return jsonify({
+        "success": True,
+        "month": month,
+        "day": day,
+        "numStations": n_rows
+    })
+
+
+# ----------- Baseline ranges (read-only, for the time slider) -----------
+BASELINE_RANGE_ENCODINGS = ("float32", "uint16")
+BASELINE_RANGE_FORMATS = ("json", "binary")
+
+
+def _parse_month_day(text):
+    """'MM-DD' -> (month, day), or None if malformed / not a calendar day."""
+    try:
+        month, day = (int(part) for part in str(text).split("-"))
+    except ValueError:
+        return None
+    return (month, day) if valid_month_day(month, day) else None
+
+
+def _month_day_label(doy):
+    return "%02d-%02d" % month_day_of(doy)
+
+
+@app.route("/baseline_range", methods=["GET"])
+def baseline_range():
+    """
+    Baseline CO2 for a range of days as one [days × stations] matrix, sliced from
+    the precomputed cube. Read-only: unlike /set_month_baseline it changes nothing.
+
+    Query parameters:
+      start     MM-DD (required)
+      end       MM-DD, inclusive; a range may wrap over the year end
+      days      number of days from start (instead of end; default: rest of start's month)
+      city      only this city's stations (same matching as the city endpoints)
+      encoding  float32 (default, NaN = no data) or
+                uint16 (value = offset + code * scale, 65535 = no data)
+      format    json (default; matrix base64-encoded) or binary (raw matrix,
+                metadata in X-Baseline-* headers)
+
+    Rows are days on a leap-year calendar (02-29 included), columns registry ids
+    ascending (= positions in /get_stations); the matrix is little-endian, row-major.
+    """
+    start = _parse_month_day(request.args.get("start", ""))
+    if start is None:
+        return jsonify({"success": False, "error": "start must be a calendar day as MM-DD"}), 400
+    start_doy = int(day_of_year(*start))
+
+    if request.args.get("end"):
+        end = _parse_month_day(request.args["end"])
+        if end is None:
+            return jsonify({"success": False, "error": "end must be a calendar day as MM-DD"}), 400
+        n_days = (int(day_of_year(*end)) - start_doy) % DAYS_PER_YEAR + 1
+    elif request.args.get("days"):
+        try:
+            n_days = int(request.args["days"])
+        except ValueError:
+            n_days = 0
+        if not 1 <= n_days <= DAYS_PER_YEAR:
+            return jsonify({"success": False, "error": f"days must be 1–{DAYS_PER_YEAR}"}), 400
+    else:
+        n_days = (int(day_of_year(start[0] % 12 + 1, 1)) - start_doy) % DAYS_PER_YEAR
+
+    encoding = request.args.get("encoding", "float32")
+    fmt = request.args.get("format", "json")
+    if encoding not in BASELINE_RANGE_ENCODINGS:
+        return jsonify({"success": False, "error": f"encoding must be one of {list(BASELINE_RANGE_ENCODINGS)}"}), 400
+    if fmt not in BASELINE_RANGE_FORMATS:
+        return jsonify({"success": False, "error": f"format must be one of {list(BASELINE_RANGE_FORMATS)}"}), 400
+
+    city = request.args.get("city")
+    ids = _select_station_ids(city=city)
+    if city and not ids:
+        return jsonify({"success": False, "error": f"No stations for city: {city}"}), 404
+
+    # The cube only changes with the dataset, so the query + dataset identify the response
+    etag = hashlib.sha256(
+        f"{dataset_fingerprint}|{dataset_version}|{request.query_string.decode('latin-1')}".encode("utf-8")
+    ).hexdigest()[:32]
+    if etag in request.if_none_match:
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    slots = day_slots(start_doy, n_days)
+    matrix = baseline_cube[np.ix_(slots, np.asarray(ids, dtype=np.int64))]
+    if encoding == "uint16":
+        codes, scale, offset = quantize_co2(matrix)
+        raw = codes.astype("<u2").tobytes()
+    else:
+        scale, offset = None, None
+        raw = matrix.astype("<f4").tobytes()
+
+    meta = {
+        "start": _month_day_label(slots[0]),
+        "end": _month_day_label(slots[-1]),
+        "days": n_days,
+        "stations": len(ids),
+        "encoding": encoding,
+        "scale": scale,
+        "offset": offset,
+        "missing": int(QUANT_MISSING) if encoding == "uint16" else "NaN",
+        "version": dataset_version,
+    }
+
+    if fmt == "binary":
+        resp = app.response_class(raw, mimetype="application/octet-stream")
+        resp.headers["X-Baseline-Shape"] = f"{n_days},{len(ids)}"
+        for key in ("start", "end", "encoding", "scale", "offset", "missing"):
+            if meta[key] is not None:
+                resp.headers[f"X-Baseline-{key.capitalize()}"] = str(meta[key])
+        if city:
+            resp.headers["X-Baseline-Station-Ids"] = ",".join(map(str, ids))
+    else:
+        resp = jsonify({
+            "success": True,
+            **meta,
+            "day_labels": [_month_day_label(d) for d in slots],
+            "rows_per_day": baseline_rows[slots].tolist(),
+            "station_ids": ids,
+            "data": base64.b64encode(raw).decode("ascii"),
+        })
+    resp.set_etag(etag)
+    return resp
+
+
+# ----------- Station history (per-station sorted series) -----------
+# Memoized resampled series; keyed by (columns, day range, freq), cleared on reload
+HISTORY_CACHE_SIZE = env_number("HISTORY_CACHE_SIZE", 512)
+
+
+def _parse_date_day(text):
+    """'YYYY-MM-DD' -> int day number (days since 1970-01-01), or None."""
+    try:
+        return int(np.datetime64(str(text), "D").astype(np.int64))
+    except ValueError:
+        return None
+
+
+def _day_label(day):
+    return str(np.datetime64(int(day), "D"))
+
+
+@lru_cache(maxsize=HISTORY_CACHE_SIZE)
+def _history_cached(columns, start_day, end_day, freq):
+    """JSON-ready resampled series of station_history columns (a tuple, so it can be memoized)."""
+    res = station_history.resample(columns, start_day, end_day, freq)
+    return {
+        "periods": [_day_label(d) for d in res["period_start"]],
+        "mean": [round(float(v), 2) for v in res["mean"]],
+        "min": [round(float(v), 2) for v in res["min"]],
+        "max": [round(float(v), 2) for v in res["max"]],
+        "count": res["count"].tolist(),
+        "stations": res["stations"].tolist(),
+    }
+
+
+def _history_columns(station=None, city=None):
+    """station_history / baseline cube columns for one station name or a city."""
+    if station:
+        if station in station_index:
+            return [station_index[station]]
+        return [baseline_names.index(station)] if station in baseline_names else []
+    return _select_station_ids(city=city)
+
+
+@app.route("/station_history", methods=["GET"])
+def station_history_series():
+    """
+    Historic baseline CO2 of one station (?station=) or a city (?city=, all its
+    stations pooled) over a date range, resampled server-side.
+
+    Query parameters:
+      start, end  YYYY-MM-DD, inclusive (default: the full extent of the data)
+      freq        day | week (ISO, Monday start) | month (default: month)
+
+    Each period has mean / min / max CO2 (ppm), the number of station-days and
+    of stations with data; periods without any data are left out.
+    """
+    station = request.args.get("station")
+    city = request.args.get("city")
+    if not station and not city:
+        return jsonify({"success": False, "error": "station or city is required"}), 400
+    freq = request.args.get("freq", "month")
+    if freq not in RESAMPLE_FREQS:
+        return jsonify({"success": False, "error": f"freq must be one of {list(RESAMPLE_FREQS)}"}), 400
+
+    columns = _history_columns(station=station, city=city)
+    if not columns:
+        what = f"station: {station}" if station else f"city: {city}"
+        return jsonify({"success": False, "error": f"No history for {what}"}), 404
+
+    extent = station_history.extent(columns)
+    start_day = end_day = None
+    for name in ("start", "end"):
+        if request.args.get(name):
+            value = _parse_date_day(request.args[name])
+            if value is None:
+                return jsonify({"success": False, "error": f"{name} must be a date as YYYY-MM-DD"}), 400
+            if name == "start":
+                start_day = value
+            else:
+                end_day = value
+    if start_day is None:
+        start_day = extent[0] if extent else 0
+    if end_day is None:
+        end_day = extent[1] if extent else 0
+    if start_day > end_day:
+        return jsonify({"success": False, "error": "start must not be after end"}), 400
+
+    hits_before = _history_cached.cache_info().hits
+    series = _history_cached(tuple(columns), start_day, end_day, freq)
+    cached = _history_cached.cache_info().hits > hits_before
+    return jsonify({
+        "success": True,
+        "station": station if station else None,
+        "city": None if station else city,
+        "stations_selected": len(columns),
+        "freq": freq,
+        "start": _day_label(start_day),
+        "end": _day_label(end_day),
+        "cached": cached,
+        **series,
+    })
+
+
+# ----------- Day-of-year climatology -----------
+
+def _climatology_dict(row):
+    """{stat: value} for one [stats] row; None where there is no data."""
+    out = {}
+    for name, value in zip(CLIMATOLOGY_STATS, row):
+        if np.isnan(value):
+            out[name] = None
+        else:
+            out[name] = int(value) if name == "samples" else round(float(value), 2)
+    return out
+
+
+def _climatology_lists(block):
+    """{stat: [value per row]} for a [rows, stats] block; None where there is no data."""
+    out = {}
+    for k, name in enumerate(CLIMATOLOGY_STATS):
+        col = block[:, k]
+        if name == "samples":
+            out[name] = col.astype(np.int64).tolist()
+        else:
+            out[name] = [None if np.isnan(v) else round(float(v), 2) for v in col]
+    return out
+
 
-        co_val = row.get("CO", None)
-        if pd.isna(co_val):
-            raw_co2 = None
+@app.route("/climatology", methods=["GET"])
+def climatology():
+    """
+    Typical CO2 for a day of year from station_day: mean and p10 / p50 / p90 over
+    all days within ±CLIMATOLOGY_WINDOW of it in every year ("samples" = station-days).
+
+    ?station=NAME or ?city=NAME (all its stations pooled):
+        with day=MM-DD the stats of that day (for a station also its baseline
+        that day), without it every day of the year as one list per stat
+    ?day=MM-DD alone: [stations × stats] for every registry station in registry
+        order, as base64 float32 (format=json for nested lists)
+    """
+    station = request.args.get("station")
+    city = request.args.get("city")
+    day = None
+    if request.args.get("day"):
+        day = _parse_month_day(request.args["day"])
+        if day is None:
+            return jsonify({"success": False, "error": "day must be a calendar day as MM-DD"}), 400
+
+    if station:
+        columns = _history_columns(station=station)
+        if not columns:
+            return jsonify({"success": False, "error": f"No history for station: {station}"}), 404
+        block = climatology_stations[:, columns[0], :]
+        out = {"success": True, "station": station}
+    elif city:
+        city_clean = city.strip().lower()
+        k = next((k for k, c in enumerate(climatology_city_names) if c.strip().lower() == city_clean), None)
+        if k is None:
+            return jsonify({"success": False, "error": f"No history for city: {city}"}), 404
+        block = climatology_cities[:, k, :]
+        out = {"success": True, "city": climatology_city_names[k],
+               "stations": len(_select_station_ids(city=climatology_city_names[k]))}
+    else:
+        if day is None:
+            return jsonify({"success": False, "error": "station, city or day is required"}), 400
+        matrix = climatology_stations[int(day_of_year(*day)), :len(stations), :]
+        out = {
+            "success": True,
+            "day": "%02d-%02d" % day,
+            "window_days": CLIMATOLOGY_WINDOW,
+            "stats": list(CLIMATOLOGY_STATS),
+            "shape": list(matrix.shape),
+        }
+        if request.args.get("format") == "json":
+            out["values"] = [[None if np.isnan(v) else round(float(v), 2) for v in row] for row in matrix]
         else:
-            raw_co2 = float(co_val) * 1000.0
+            out["dtype"] = "float32"
+            out["values"] = _encode_f32(matrix)
+        return jsonify(out)
+
+    out["window_days"] = CLIMATOLOGY_WINDOW
+    if day is None:
+        out["days"] = [_month_day_label(d) for d in range(DAYS_PER_YEAR)]
+        out.update(_climatology_lists(block))
+        return jsonify(out)
+
+    doy = int(day_of_year(*day))
+    out["day"] = "%02d-%02d" % day
+    out.update(_climatology_dict(block[doy]))
+    if station:
+        value = baseline_cube[doy, columns[0]]
+        out["baseline"] = None if np.isnan(value) else round(float(value), 2)
+    return jsonify(out)
+
+
+# ----------- Application factory / startup -----------
+# Importing this module only loads config and registers routes. The subsystems
+# below are initialized explicitly by create_app() / preload_app(), or lazily by
+# the first request, each at most once per process, in this order.
+STARTUP_SUBSYSTEMS = (
+    ("databases", init_databases),
+    ("weather", load_weather_cache_from_disk),
+    ("datasets", init_datasets),
+)
+
+# Milliseconds spent per subsystem in this process ("live" = refresher start)
+startup_timings = {"config": round(_config_ms, 1)}
+_initialized = set()
+_init_lock = threading.RLock()
+_background_pid = None
+_preloaded = False
+
+
+def init_subsystems(names=None):
+    """Initialize the given subsystems (default: all) that are not up yet."""
+    if len(_initialized) == len(STARTUP_SUBSYSTEMS):
+        return
+    with _init_lock:
+        for name, init in STARTUP_SUBSYSTEMS:
+            if name in _initialized or (names is not None and name not in names):
+                continue
+            t0 = time.perf_counter()
+            init()
+            startup_timings[name] = round((time.perf_counter() - t0) * 1000.0, 1)
+            _initialized.add(name)
+
+
+def start_background_tasks():
+    """
+    Start this process's background threads (live refresher, dataset file
+    watcher). Safe to call
+    repeatedly; after a fork the child starts its own. Call it from the server's
+    post-fork hook, otherwise the worker's first request does.
+    """
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _init_lock:
+        if _background_pid == os.getpid():
+            return
+        t0 = time.perf_counter()
+        start_live_refresher()
+        start_dataset_watcher()
+        startup_timings["live"] = round((time.perf_counter() - t0) * 1000.0, 1)
+        _background_pid = os.getpid()
+
+
+def _print_startup_timings():
+    parts = ", ".join(f"{name} {ms:.0f} ms" for name, ms in startup_timings.items())
+    print(f"[startup] pid {os.getpid()}: {parts}")
+
 
-        co2_value = _sanitize_co2(raw_co2, default=400.0, min_val=350.0, max_val=2000.0)
-        new_baseline[station_name] = co2_value
+def create_app(start_background=True):
+    """
+    Initialize every subsystem and return the Flask app.
+    start_background=False leaves the live refresher to start_background_tasks().
+    """
+    init_subsystems()
+    if start_background:
+        start_background_tasks()
+    _print_startup_timings()
+    return app
+
+
+def preload_app():
+    """
+    For pre-forking servers (e.g. gunicorn --preload): load every read-only
+    subsystem in the parent without starting threads, then move everything
+    allocated so far out of the GC's reach (gc.freeze), so collections in the
+    workers do not touch – and un-share – the parent's pages. Each worker starts
+    its refresher via start_background_tasks() (post_fork hook or first request).
+    """
+    global _preloaded
+    create_app(start_background=False)
+    gc.collect()
+    gc.freeze()
+    _preloaded = True
+    return app
+
+
+@app.before_request
+def _ensure_subsystems():
+    if len(_initialized) < len(STARTUP_SUBSYSTEMS):
+        init_subsystems()
+        _print_startup_timings()
+    start_background_tasks()
+    # pin the current dataset version for the whole request (see reload_datasets)
+    if getattr(app.view_functions.get(request.endpoint), "dataset_pin", True):
+        dataset_lock.acquire_read()
+        g.dataset_read_lock = True
+
+
+@app.teardown_request
+def _release_dataset_lock(exc):
+    if g.pop("dataset_read_lock", False):
+        dataset_lock.release_read()
+
+
+@app.route("/reload_datasets", methods=["POST"])
+def reload_datasets_endpoint():
+    """
+    Rebuild the datasets in the background and swap them in (this worker; the
+    others follow through their file watcher). Requires the X-Admin-Token header
+    to match DATASET_RELOAD_TOKEN. JSON: {"force": bool} reloads even if the
+    files are unchanged.
+    """
+    if not DATASET_RELOAD_TOKEN:
+        return jsonify({"success": False, "error": "dataset reload is disabled (DATASET_RELOAD_TOKEN not set)"}), 403
+    token = request.headers.get("X-Admin-Token") or ""
+    if not hmac.compare_digest(token.encode("utf-8"), DATASET_RELOAD_TOKEN.encode("utf-8")):
+        return jsonify({"success": False, "error": "invalid admin token"}), 403
+    if _reload_lock.locked():
+        return jsonify({"success": False, "error": "a reload is already running"}), 409
 
+    payload = request.get_json(silent=True) or {}
+    threading.Thread(
+        target=_reload_datasets_in_background, args=(bool(payload.get("force")),),
+        name="dataset-reload", daemon=True,
+    ).start()
+    return jsonify({"success": True, "status": "started", "version": dataset_version}), 202
 
-    station_co2 = new_baseline
 
+@app.route("/dataset_version", methods=["GET"])
+def dataset_version_endpoint():
+    """Version / fingerprint of the datasets this worker serves, and the last reload."""
     return jsonify({
         "success": True,
-        "month": month,
-        "day": day,
-        "numStations": int(len(df_sel))
+        "version": dataset_version,
+        "fingerprint": (dataset_fingerprint or "")[:16],
+        "reload": dataset_reload_status,
+    })
+
+
+@app.route("/startup_stats", methods=["GET"])
+def startup_stats():
+    """Per-subsystem startup time of this worker process."""
+    return jsonify({
+        "success": True,
+        "pid": os.getpid(),
+        "timings_ms": startup_timings,
+        "initialized": [name for name, _ in STARTUP_SUBSYSTEMS if name in _initialized],
+        "background_started": _background_pid == os.getpid(),
+        "preloaded": _preloaded,
     })
 
 
 # ----------- Run Flask -----------
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    create_app().run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
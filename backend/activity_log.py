@@ -0,0 +1,229 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+ACTIVITIES_DB = "activities.db"
+
+ACTIVITY_QUEUE_MAX = 10000        # queued log calls (each may carry many rows)
+ACTIVITY_BATCH_ROWS = 500         # rows per commit at most
+ACTIVITY_MAX_DELAY = 0.25         # seconds a row may wait for more rows to batch with
+ACTIVITY_PUT_TIMEOUT = 0.5        # back-pressure on a full queue before dropping
+
+_INSERT_SQL = """
+    INSERT INTO activities
+      (user_id, city, station, intervention, efficiency, base_co2, after_co2)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_STOP = object()
+
+
+class ActivityLogger:
+    """
+    Background writer for the activities table.
+
+    Requests only enqueue rows; one thread drains the bounded queue over a single
+    long-lived WAL connection and commits in micro-batches (up to batch_rows rows,
+    or whatever arrived within max_delay of the first one). close() flushes
+    everything still queued. The thread starts on first use in each process, so
+    forked workers get their own writer.
+    """
+
+    def __init__(self, path=ACTIVITIES_DB, max_queue=ACTIVITY_QUEUE_MAX,
+                 batch_rows=ACTIVITY_BATCH_ROWS, max_delay=ACTIVITY_MAX_DELAY):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_batch_rows = 0
+        self._commit_ms_total = 0.0
+        self.commit_ms_max = 0.0
+        self._wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    # ---- producer side ----
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # inherited across fork: the parent's queue contents are not ours to write
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+            self._thread.start()
+
+    def log(self, rows):
+        """
+        Queue activity rows (user_id, city, station, intervention, efficiency,
+        base_co2, after_co2). Never raises; rows are dropped (and counted) only if
+        the queue stays full for ACTIVITY_PUT_TIMEOUT.
+        """
+        if not rows:
+            return
+        if self._closed:
+            try:
+                self._write([(time.time(), list(rows))])
+            except Exception as e:
+                self.errors += 1
+                print("[activity] failed to insert rows:", e)
+            return
+        self._ensure_started()
+        try:
+            self._queue.put((time.time(), list(rows)), timeout=ACTIVITY_PUT_TIMEOUT)
+        except queue.Full:
+            self.rows_dropped += len(rows)
+            print(f"[activity] queue full, dropped {len(rows)} rows")
+
+    # ---- writer side ----
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run(self):
+        conn = None
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+
+            batch = [item]
+            n_rows = len(item[1])
+            deadline = time.time() + self.max_delay
+            stop = False
+            while n_rows < self.batch_rows:
+                try:
+                    nxt = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+                n_rows += len(nxt[1])
+
+            try:
+                conn = self._write_batch(batch, conn)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                if stop:
+                    self._queue.task_done()
+
+            if stop:
+                break
+
+        if conn is not None:
+            conn.close()
+
+    def _write_batch(self, batch, conn):
+        """
+        Write one batch, retrying once on a fresh connection; if that fails too the
+        rows are dropped (counted in rows_dropped) since logging never breaks the
+        app. Returns the connection to use for the next batch (None = reconnect).
+        """
+        for attempt in (1, 2):
+            try:
+                if conn is None:
+                    conn = self._connect()
+                self._write(batch, conn)
+                return conn
+            except Exception as e:
+                self.errors += 1
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                conn = None
+                if attempt == 1:
+                    print("[activity] failed to write batch, retrying:", e)
+                else:
+                    n_rows = sum(len(entry) for _, entry in batch)
+                    self.rows_dropped += n_rows
+                    print(f"[activity] failed to write batch again, dropped {n_rows} rows:", e)
+        return None
+
+    def _write(self, batch, conn=None):
+        rows = [row for _, entry in batch for row in entry]
+        own_conn = conn is None
+        if own_conn:
+            conn = self._connect()
+        try:
+            t0 = time.time()
+            conn.executemany(_INSERT_SQL, rows)
+            conn.commit()
+            t1 = time.time()
+        finally:
+            if own_conn:
+                conn.close()
+
+        commit_ms = (t1 - t0) * 1000.0
+        wait_ms = max((t1 - queued_at) * 1000.0 for queued_at, _ in batch)
+        self.rows_written += len(rows)
+        self.batches += 1
+        self.last_batch_rows = len(rows)
+        self._commit_ms_total += commit_ms
+        self.commit_ms_max = max(self.commit_ms_max, commit_ms)
+        self._wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    # ---- lifecycle ----
+    def flush(self, timeout=None):
+        """Block until everything queued so far is committed (or timeout). Returns True if drained."""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=10):
+        """Flush queued rows and stop the writer; later log() calls write synchronously."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        deadline = time.time() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print(f"[activity] writer did not drain its queue within {timeout}s; "
+                  f"{self._queue.qsize()} queued log calls are not flushed")
+            return
+        self._thread.join(max(0.0, deadline - time.time()))
+
+    def stats(self):
+        batches = self.batches or 1
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_max": self._queue.maxsize,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "last_batch_rows": self.last_batch_rows,
+            "commit_ms_avg": round(self._commit_ms_total / batches, 3),
+            "commit_ms_max": round(self.commit_ms_max, 3),
+            "queue_wait_ms_avg": round(self._wait_ms_total / batches, 3),
+            "queue_wait_ms_max": round(self.wait_ms_max, 3),
+            "running": bool(self._thread is not None and self._thread.is_alive()),
+        }
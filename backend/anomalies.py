@@ -0,0 +1,34 @@
+import numpy as np
+
+from backend.climatology import CLIMATOLOGY_STATS
+
+# Live-vs-climatology anomaly scores for all stations at once.
+#
+# z is a robust z-score: (live - p50) / sigma, with sigma estimated from the
+# climatology's p10..p90 spread (2.563 sigma wide for a normal distribution), so a
+# single extreme historic day does not widen the band the way a std would.
+Z_PER_P10_P90 = 2.5631
+ANOMALY_BANDS = ("low", "normal", "high")   # below p10 / within p10..p90 / above p90
+
+_P10, _P50, _P90, _SAMPLES = (CLIMATOLOGY_STATS.index(s) for s in ("p10", "p50", "p90", "samples"))
+
+
+def anomaly_scores(live, clim, z_threshold=3.0, min_samples=5, min_sigma=10.0):
+    """
+    live: CO2 per station (NaN = no live value), clim: [stations, stats] climatology
+    of the day. Returns (z, band, flagged): float64 z (NaN where not scored), int8
+    index into ANOMALY_BANDS (-1 where not scored) and bool |z| >= z_threshold.
+    Stations with fewer than min_samples historic station-days are not scored;
+    sigma is at least min_sigma ppm so a flat history does not flag every wiggle.
+    """
+    live = np.asarray(live, dtype=np.float64)
+    clim = np.asarray(clim, dtype=np.float64)
+    p10, p50, p90 = clim[:, _P10], clim[:, _P50], clim[:, _P90]
+    sigma = np.maximum((p90 - p10) / Z_PER_P10_P90, min_sigma)
+
+    scored = np.isfinite(live) & np.isfinite(p50) & (np.nan_to_num(clim[:, _SAMPLES]) >= min_samples)
+    z = np.where(scored, (live - p50) / sigma, np.nan)
+    band = np.where(live < p10, 0, np.where(live > p90, 2, 1)).astype(np.int8)
+    band[~scored] = -1
+    flagged = scored & (np.abs(np.nan_to_num(z)) >= z_threshold)
+    return z, band, flagged
@@ -0,0 +1,282 @@
+import hashlib
+import io
+import json
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Chunked encrypted container for large CSV datasets (*.csv.cenc).
+#
+# Layout:
+#   MAGIC | file_id (16) | chunk_0 | ... | chunk_n | manifest | u64 manifest_offset | u32 manifest_len | MAGIC
+#
+# - every chunk is a run of whole CSV rows (no header), sealed with AES-256-GCM
+#   (12-byte nonce + ciphertext); associated data = file id + chunk index, so
+#   chunks cannot be swapped between positions or files
+# - the manifest (same sealing, index -1) holds the CSV header, the file id and
+#   per chunk: offset, length, rows and sha256 of the plaintext
+# - the manifest sits at the end so files can be written in one streaming pass
+MAGIC = b"CO2CHNK1"
+FORMAT_VERSION = 1
+DEFAULT_CHUNK_ROWS = 50000
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+_NONCE_BYTES = 12
+_FILE_ID_BYTES = 16
+_TRAILER = struct.Struct("<QI")
+
+
+def container_key(secret):
+    """AES-256 key for chunked containers, derived from the dataset key (bytes)."""
+    return HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=b"co2-chunked-dataset",
+    ).derive(secret)
+
+
+def _aad(file_id, index):
+    return MAGIC + file_id + struct.pack("<q", index)
+
+
+def _seal(aead, plaintext, aad):
+    nonce = os.urandom(_NONCE_BYTES)
+    return nonce + aead.encrypt(nonce, plaintext, aad)
+
+
+def _open(aead, sealed, aad):
+    return aead.decrypt(sealed[:_NONCE_BYTES], sealed[_NONCE_BYTES:], aad)
+
+
+def iter_csv_row_blocks(lines, rows_per_chunk):
+    """
+    Group CSV lines into blocks of whole records. A record continues over line
+    breaks while a quoted field is open (odd number of '"' so far).
+    `lines` yields bytes; the first record (the header) is returned separately.
+    Returns (header_bytes, generator of (block_bytes, n_rows)).
+    """
+    it = iter(lines)
+
+    def records():
+        pending = []
+        in_quotes = False
+        for line in it:
+            pending.append(line)
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if not in_quotes:
+                yield b"".join(pending)
+                pending = []
+        if pending:
+            yield b"".join(pending)
+
+    recs = records()
+    header = next(recs, b"")
+
+    def blocks():
+        buf = []
+        for rec in recs:
+            if not rec.strip():
+                continue
+            if not rec.endswith(b"\n"):
+                rec += b"\n"
+            buf.append(rec)
+            if len(buf) >= rows_per_chunk:
+                yield b"".join(buf), len(buf)
+                buf = []
+        if buf:
+            yield b"".join(buf), len(buf)
+
+    return header, blocks()
+
+
+def write_container(dst_path, lines, key, rows_per_chunk=DEFAULT_CHUNK_ROWS, source_name=None):
+    """
+    Encrypt CSV `lines` (iterable of bytes, header first) into a chunked
+    container, streaming: only one chunk is held in memory at a time.
+    Returns the manifest.
+    """
+    aead = AESGCM(key)
+    file_id = os.urandom(_FILE_ID_BYTES)
+    header, blocks = iter_csv_row_blocks(lines, rows_per_chunk)
+
+    chunks = []
+    tmp = f"{dst_path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + file_id)
+        for index, (block, n_rows) in enumerate(blocks):
+            sealed = _seal(aead, block, _aad(file_id, index))
+            chunks.append({
+                "offset": f.tell(),
+                "length": len(sealed),
+                "rows": n_rows,
+                "sha256": hashlib.sha256(block).hexdigest(),
+            })
+            f.write(sealed)
+
+        manifest = {
+            "version": FORMAT_VERSION,
+            "source": source_name,
+            "file_id": file_id.hex(),
+            "header": header.decode("utf-8"),
+            "total_rows": sum(c["rows"] for c in chunks),
+            "chunks": chunks,
+        }
+        sealed_manifest = _seal(aead, json.dumps(manifest).encode("utf-8"), _aad(file_id, -1))
+        manifest_offset = f.tell()
+        f.write(sealed_manifest)
+        f.write(_TRAILER.pack(manifest_offset, len(sealed_manifest)))
+        f.write(MAGIC)
+    os.replace(tmp, dst_path)
+    return manifest
+
+
+def is_container(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class ChunkedReader:
+    """
+    Random access to the chunks of a container. Chunks are read with os.pread,
+    so several threads can decrypt different chunks at the same time.
+    """
+
+    def __init__(self, path, key):
+        self.path = path
+        self._aead = AESGCM(key)
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            self.manifest = self._read_manifest()
+        except Exception:
+            os.close(self._fd)
+            raise
+        self.header = self.manifest["header"].encode("utf-8")
+        self.chunks = self.manifest["chunks"]
+
+    def _read_manifest(self):
+        size = os.fstat(self._fd).st_size
+        tail_len = _TRAILER.size + len(MAGIC)
+        if size < len(MAGIC) + tail_len or os.pread(self._fd, len(MAGIC), 0) != MAGIC:
+            raise ValueError(f"{self.path}: not a chunked dataset container")
+        tail = os.pread(self._fd, tail_len, size - tail_len)
+        if tail[_TRAILER.size:] != MAGIC:
+            raise ValueError(f"{self.path}: truncated container")
+        offset, length = _TRAILER.unpack(tail[:_TRAILER.size])
+        self.file_id = os.pread(self._fd, _FILE_ID_BYTES, len(MAGIC))
+        sealed = os.pread(self._fd, length, offset)
+        try:
+            manifest = json.loads(_open(self._aead, sealed, _aad(self.file_id, -1)))
+        except Exception:
+            raise ValueError(f"{self.path}: manifest authentication failed (wrong key or corrupted file)")
+        if manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: unsupported container version {manifest.get('version')}")
+        if manifest.get("file_id") != self.file_id.hex():
+            raise ValueError(f"{self.path}: manifest does not belong to this file")
+        return manifest
+
+    def close(self):
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def read_chunk(self, index):
+        """Decrypted, checksum-verified plaintext of one chunk (whole CSV rows)."""
+        c = self.chunks[index]
+        sealed = os.pread(self._fd, c["length"], c["offset"])
+        plain = _open(self._aead, sealed, _aad(self.file_id, index))
+        if hashlib.sha256(plain).hexdigest() != c["sha256"]:
+            raise ValueError(f"{self.path}: checksum mismatch in chunk {index}")
+        return plain
+
+    def iter_chunks(self, transform=None, workers=DEFAULT_WORKERS):
+        """
+        Yield read_chunk(i) (or transform(header, plaintext) of it) for every chunk,
+        in order. Up to 2 * workers chunks are decrypted ahead in a thread pool,
+        so at most that many plaintext chunks are alive at any time.
+        """
+        def task(index):
+            plain = self.read_chunk(index)
+            return plain if transform is None else transform(self.header, plain)
+
+        if workers <= 1 or len(self.chunks) <= 1:
+            for index in range(len(self.chunks)):
+                yield task(index)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk-decrypt") as pool:
+            pending = deque()
+            next_index = 0
+            try:
+                while pending or next_index < len(self.chunks):
+                    while next_index < len(self.chunks) and len(pending) < 2 * workers:
+                        pending.append(pool.submit(task, next_index))
+                        next_index += 1
+                    yield pending.popleft().result()
+            finally:
+                for fut in pending:
+                    fut.cancel()
+
+
+def _parse_chunk(header, plain, transform, read_csv_kwargs):
+    df = pd.read_csv(io.BytesIO(header + plain), **read_csv_kwargs)
+    return df if transform is None else transform(df)
+
+
+def concat_frames(frames):
+    """
+    pd.concat for per-chunk frames; categorical columns stay categorical (their
+    categories are unioned) instead of degrading to object.
+    """
+    columns = frames[0].columns
+    categorical = [
+        col for col in columns
+        if all(isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames)
+    ]
+    if not categorical:
+        return pd.concat(frames, ignore_index=True)
+    merged = {col: union_categoricals([f[col] for f in frames]) for col in categorical}
+    out = pd.concat([f.drop(columns=categorical) for f in frames], ignore_index=True)
+    for col, values in merged.items():
+        out[col] = values
+    return out[list(columns)]
+
+
+def read_csv_chunked(path, key, workers=DEFAULT_WORKERS, transform=None, **read_csv_kwargs):
+    """
+    DataFrame from a chunked container: chunks are decrypted, verified and parsed
+    in parallel and concatenated in file order. Peak memory is the result plus a
+    bounded window of in-flight chunks, never the whole plaintext at once.
+
+    transform(df) -> df, if given, runs on every parsed chunk inside the worker
+    (e.g. to project / downcast columns before the chunks are combined).
+    """
+    with ChunkedReader(path, key) as reader:
+        frames = list(reader.iter_chunks(
+            lambda header, plain: _parse_chunk(header, plain, transform, read_csv_kwargs), workers,
+        ))
+        if not frames:
+            return _parse_chunk(reader.header, b"", transform, read_csv_kwargs)
+    return concat_frames(frames)
+
+
+def decrypt_container(path, key, out, workers=DEFAULT_WORKERS):
+    """Write the plaintext CSV (header + all chunks) to the binary file object `out`."""
+    with ChunkedReader(path, key) as reader:
+        out.write(reader.header)
+        rows = 0
+        for index, plain in enumerate(reader.iter_chunks(workers=workers)):
+            out.write(plain)
+            rows += reader.chunks[index]["rows"]
+    return rows
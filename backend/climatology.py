@@ -0,0 +1,86 @@
+import numpy as np
+
+from backend.dataset_cache import DAYS_PER_YEAR, day_number_month_day, day_of_year
+
+# Day-of-year climatology: for every leap-year day slot and group (a station
+# column or a city) the mean and p10 / p50 / p90 of historic CO2, as one float32
+# array [366, groups, len(CLIMATOLOGY_STATS)] (NaN where a group has no data).
+#
+# With only a few years of station_day, a single calendar day has a handful of
+# values at most, so each slot pools the days within ±window of it (wrapping over
+# the year end); "samples" is the number of station-days pooled.
+CLIMATOLOGY_STATS = ("mean", "p10", "p50", "p90", "samples")
+CLIMATOLOGY_PERCENTILES = (10, 50, 90)
+CLIMATOLOGY_WINDOW = 3
+
+
+def _sortable_bits(values):
+    """uint32 for float32 values that sorts in the same order as the floats."""
+    bits = np.asarray(values, dtype=np.float32).view(np.uint32)
+    return np.where(bits >> 31, ~bits, bits | np.uint32(0x80000000))
+
+
+def _float_from_sortable(u):
+    return np.where(u >> 31, u & np.uint32(0x7FFFFFFF), ~u).astype(np.uint32).view(np.float32)
+
+
+def group_stats(keys, values, n_groups, percentiles=CLIMATOLOGY_PERCENTILES):
+    """
+    [n_groups, 2 + len(percentiles)] float32: mean, percentiles (linear
+    interpolation, like np.percentile) and count of float32 `values` per int key,
+    for all groups in one sort. (key, value) pairs are packed into one int64 and
+    sorted in place, several times faster than an argsort / lexsort + gather.
+    """
+    packed = (np.asarray(keys, dtype=np.int64) << 32) | _sortable_bits(values).astype(np.int64)
+    packed.sort()
+    k = packed >> 32
+    v = _float_from_sortable((packed & 0xFFFFFFFF).astype(np.uint32)).astype(np.float64)
+    counts = np.bincount(k, minlength=n_groups)
+    starts = np.zeros(n_groups, dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+
+    out = np.full((n_groups, 2 + len(percentiles)), np.nan, dtype=np.float32)
+    has = counts > 0
+    n = counts[has]
+    out[has, 0] = np.bincount(k, weights=v, minlength=n_groups)[has] / n
+    for i, q in enumerate(percentiles):
+        pos = starts[has] + (q / 100.0) * (n - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        out[has, 1 + i] = v[lo] + (v[hi] - v[lo]) * (pos - lo)
+    out[:, -1] = counts
+    return out
+
+
+def build_climatology(group, days, co2, n_groups, window=CLIMATOLOGY_WINDOW):
+    """
+    Climatology [366, n_groups, stats] from daily rows: group per row (-1 = skip),
+    day numbers and CO2. Every row is counted in the 2 * window + 1 day slots
+    around its own, then all (slot, group) cells are reduced in one pass.
+    """
+    group = np.asarray(group, dtype=np.int64)
+    keep = group >= 0
+    group, co2 = group[keep], np.asarray(co2)[keep]
+    doy = day_of_year(*day_number_month_day(np.asarray(days)[keep])).astype(np.int64)
+
+    shifts = np.arange(-window, window + 1)
+    slots = (doy[None, :] + shifts[:, None]) % DAYS_PER_YEAR
+    keys = (slots * n_groups + group[None, :]).ravel()
+    values = np.broadcast_to(co2, slots.shape).ravel()
+    stats = group_stats(keys, values, DAYS_PER_YEAR * n_groups)
+    return stats.reshape(DAYS_PER_YEAR, n_groups, len(CLIMATOLOGY_STATS))
+
+
+def station_climatology(history, window=CLIMATOLOGY_WINDOW):
+    """Climatology per StationHistory column: [366, columns, stats]."""
+    columns = np.repeat(np.arange(len(history)), np.diff(history.offsets))
+    return build_climatology(columns, history.days, history.co2, len(history), window)
+
+
+def city_climatology(history, city_of_column, n_cities, window=CLIMATOLOGY_WINDOW):
+    """
+    Climatology per city, pooling the station-days of all its stations:
+    city_of_column maps each history column to a city index (-1 = none).
+    """
+    columns = np.repeat(np.arange(len(history)), np.diff(history.offsets))
+    return build_climatology(np.asarray(city_of_column)[columns], history.days, history.co2, n_cities, window)
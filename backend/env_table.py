@@ -0,0 +1,151 @@
+import hashlib
+import hmac
+import os
+
+import numpy as np
+
+# Synthetic env ranges for stations without measured (CSV) factors
+SYNTH_NDVI_RANGE = (0.2, 0.6)      # urban-ish → semi-green
+SYNTH_ALBEDO_RANGE = (0.12, 0.22)  # typical built-up / road surface range
+
+ENV_TABLE_FORMAT_VERSION = 1
+
+
+def synthetic_env(station_name, key, lulc_options):
+    """
+    Synthetic {ndvi, albedo, lulc} for one station from a keyed BLAKE2b hash of
+    its name: identical in every process and across restarts for the same key.
+    """
+    digest = hashlib.blake2b(station_name.encode("utf-8"), key=key[:64], digest_size=12).digest()
+    r1 = int.from_bytes(digest[0:4], "little") / 2**32
+    r2 = int.from_bytes(digest[4:8], "little") / 2**32
+    r3 = int.from_bytes(digest[8:12], "little")
+
+    ndvi = SYNTH_NDVI_RANGE[0] + r1 * (SYNTH_NDVI_RANGE[1] - SYNTH_NDVI_RANGE[0])
+    albedo = SYNTH_ALBEDO_RANGE[0] + r2 * (SYNTH_ALBEDO_RANGE[1] - SYNTH_ALBEDO_RANGE[0])
+    return {
+        "ndvi": round(ndvi, 2),
+        "albedo": round(albedo, 2),
+        "lulc": lulc_options[r3 % len(lulc_options)],
+    }
+
+
+class EnvTable:
+    """
+    Env factors for every registry station (position in `stations`), column-wise:
+
+    - ndvi, albedo: float64
+    - lulc_code:    uint8 index into lulc_labels
+    - measured:     bool, True where the values come from the env CSV
+    """
+
+    __slots__ = ("ndvi", "albedo", "lulc_code", "measured", "lulc_labels", "fingerprint")
+
+    def __init__(self, ndvi, albedo, lulc_code, measured, lulc_labels, fingerprint=None):
+        self.ndvi = ndvi
+        self.albedo = albedo
+        self.lulc_code = lulc_code
+        self.measured = measured
+        self.lulc_labels = list(lulc_labels)
+        self.fingerprint = fingerprint
+
+    @staticmethod
+    def compute_fingerprint(station_names, measured_env, key, lulc_options):
+        """Identifies the inputs a table was built from (never exposes the key itself)."""
+        h = hashlib.sha256()
+        h.update(f"v{ENV_TABLE_FORMAT_VERSION}|{SYNTH_NDVI_RANGE}|{SYNTH_ALBEDO_RANGE}|".encode("utf-8"))
+        h.update(hmac.new(key, b"env-table", hashlib.sha256).digest())
+        h.update("|".join(lulc_options).encode("utf-8"))
+        for name in station_names:
+            env = measured_env.get(name)
+            h.update(b"\x00" + name.encode("utf-8"))
+            if env is not None:
+                h.update(f"|{env['ndvi']!r}|{env['albedo']!r}|{env['lulc']}".encode("utf-8"))
+        return h.hexdigest()
+
+    @classmethod
+    def build(cls, station_names, measured_env, key, lulc_options):
+        """
+        measured_env: { station_name: {ndvi, albedo, lulc} } for stations with CSV factors;
+        every other station gets synthetic_env().
+        """
+        n = len(station_names)
+        ndvi = np.empty(n, dtype=np.float64)
+        albedo = np.empty(n, dtype=np.float64)
+        lulc_code = np.empty(n, dtype=np.uint8)
+        measured = np.zeros(n, dtype=bool)
+        labels = list(lulc_options)
+        codes = {label: i for i, label in enumerate(labels)}
+
+        for i, name in enumerate(station_names):
+            env = measured_env.get(name)
+            if env is not None:
+                measured[i] = True
+            else:
+                env = synthetic_env(name, key, lulc_options)
+            ndvi[i] = env["ndvi"]
+            albedo[i] = env["albedo"]
+            if env["lulc"] not in codes:
+                codes[env["lulc"]] = len(labels)
+                labels.append(env["lulc"])
+            lulc_code[i] = codes[env["lulc"]]
+
+        return cls(ndvi, albedo, lulc_code, measured, labels,
+                   cls.compute_fingerprint(station_names, measured_env, key, lulc_options))
+
+    @classmethod
+    def load_or_build(cls, path, station_names, measured_env, key, lulc_options):
+        """
+        Load a persisted table from `path` if it was built from the same inputs,
+        otherwise build it and (if path is set) save it. Returns (table, loaded).
+        """
+        fingerprint = cls.compute_fingerprint(station_names, measured_env, key, lulc_options)
+        if path and os.path.exists(path):
+            try:
+                with np.load(path, allow_pickle=False) as z:
+                    if str(z["fingerprint"]) == fingerprint:
+                        return cls(z["ndvi"], z["albedo"], z["lulc_code"], z["measured"],
+                                   [str(l) for l in z["lulc_labels"]], fingerprint), True
+            except Exception as e:
+                print("[env] could not load env table, rebuilding:", e)
+
+        table = cls.build(station_names, measured_env, key, lulc_options)
+        if path:
+            try:
+                table.save(path)
+            except OSError as e:
+                print("[env] could not persist env table:", e)
+        return table, False
+
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp,
+            ndvi=self.ndvi,
+            albedo=self.albedo,
+            lulc_code=self.lulc_code,
+            measured=self.measured,
+            lulc_labels=np.array(self.lulc_labels),
+            fingerprint=np.array(self.fingerprint or ""),
+        )
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return len(self.ndvi)
+
+    @property
+    def nbytes(self):
+        return self.ndvi.nbytes + self.albedo.nbytes + self.lulc_code.nbytes + self.measured.nbytes
+
+    def row(self, station_idx):
+        """{ndvi, albedo, lulc} of one registry station."""
+        return {
+            "ndvi": float(self.ndvi[station_idx]),
+            "albedo": float(self.albedo[station_idx]),
+            "lulc": self.lulc_labels[self.lulc_code[station_idx]],
+        }
+
+    def lulc_factors(self, mapping, default=1.5):
+        """Per-station LULC factor array for a label -> factor mapping."""
+        by_code = np.array([mapping.get(label, default) for label in self.lulc_labels], dtype=np.float64)
+        return by_code[self.lulc_code]
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DATASET_WATCH_INTERVAL = 30   # seconds between stat() polls of the dataset files
+
+
+class RWLock:
+    """
+    Readers-writer lock with writer preference: once a writer waits, new readers
+    queue behind it, so a swap is never starved by a steady stream of requests.
+    Not reentrant – a thread holding the read side must not acquire it again.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+def stat_signature(paths):
+    """(path, size, mtime_ns) per file; missing files count as (path, -1, -1)."""
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_size, st.st_mtime_ns))
+        except OSError:
+            sig.append((path, -1, -1))
+    return tuple(sig)
+
+
+class FileWatcher:
+    """
+    Polls the stat() signature of `paths_fn()` every `interval` seconds and calls
+    on_change() once a changed signature has been stable for one more poll (so a
+    file still being copied into place is not picked up half-written).
+    """
+
+    def __init__(self, paths_fn, on_change, interval=DATASET_WATCH_INTERVAL):
+        self.paths_fn = paths_fn
+        self.on_change = on_change
+        self.interval = interval
+        self._seen = None
+        self._thread = None
+
+    def start(self):
+        self._seen = stat_signature(self.paths_fn())
+        self._thread = threading.Thread(target=self._run, name="dataset-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        pending = None
+        while True:
+            time.sleep(self.interval)
+            sig = stat_signature(self.paths_fn())
+            if sig == self._seen:
+                pending = None
+                continue
+            if sig != pending:
+                pending = sig       # changed: wait one more poll for it to settle
+                continue
+            self._seen = sig
+            pending = None
+            try:
+                self.on_change()
+            except Exception as e:
+                print("[data] reload after file change failed:", e)
@@ -0,0 +1,89 @@
+import numpy as np
+
+
+def stagnation_factor(label):
+    """Multiplier for a play-mode stagnation label (same rules as intervention_effect)."""
+    stag = label.lower() if isinstance(label, str) else ""
+    if "high" in stag:
+        return 1.20
+    if "elevated" in stag:
+        return 1.10
+    if "low" in stag:
+        return 0.90
+    return 1.0
+
+
+def _to_float(value):
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def weather_inputs(weather):
+    """
+    Split a play-mode weather dict into the numeric inputs of intervention_effect_array:
+    (windspeed_ms, mixing_height, stagnation multiplier). Missing values are NaN / 1.0.
+    Accepts both the intervention_effect keys and the frontend play snapshot keys
+    (wind_ms, mixing_height_m).
+    """
+    if not weather or not isinstance(weather, dict):
+        return np.nan, np.nan, 1.0
+    wind = weather.get("windspeed_ms") or weather.get("windspeed") or weather.get("wind_ms")
+    mixing = weather.get("mixing_height")
+    if mixing is None:
+        mixing = weather.get("mixing_height_m")
+    return _to_float(wind), _to_float(mixing), stagnation_factor(weather.get("stagnation_risk"))
+
+
+def quantize_weather(windspeed_ms, mixing_height):
+    """
+    Map wind speed and mixing height to one representative value per band the
+    model distinguishes (wind <1.5 / 1.5–5 / >5 m/s, mixing <500 / 500–900 / >900 m),
+    so cache keys built from them give exactly the same result. NaN stays NaN.
+    """
+    wind = float(windspeed_ms)
+    if not np.isnan(wind):
+        wind = 1.0 if wind < 1.5 else (6.0 if wind > 5.0 else 3.0)
+    mixing = float(mixing_height)
+    if not np.isnan(mixing):
+        mixing = 400.0 if mixing < 500 else (1000.0 if mixing > 900 else 700.0)
+    return wind, mixing
+
+
+def intervention_effect_array(base_co2, ndvi, albedo, lulc_factor, user_efficiency=np.nan,
+                              windspeed_ms=np.nan, mixing_height=np.nan, stagnation=1.0):
+    """
+    Vectorized intervention_effect: every argument is a scalar or an array and
+    they are broadcast together, so one call can cover many stations, a grid of
+    efficiencies / weather values, or Monte Carlo samples.
+
+    NaN means "not given" for user_efficiency, windspeed_ms and mixing_height;
+    `stagnation` is the multiplier from stagnation_factor().
+    Returns the unrounded reduced CO2 as a float64 array.
+    """
+    ndvi = np.clip(np.asarray(ndvi, dtype=np.float64), 0, 1)
+    albedo = np.clip(np.asarray(albedo, dtype=np.float64), 0, 1)
+    lulc_factor = np.clip(np.asarray(lulc_factor, dtype=np.float64), 0.1, 3)
+
+    # Env-driven potential (max 30% reduction)
+    env_score = (0.6 * ndvi + 0.3 * albedo) / lulc_factor
+    reduction_ratio = np.minimum(env_score * 0.3, 0.3)
+
+    # Scale by planner's selected efficiency (0–50%)
+    eff = np.asarray(user_efficiency, dtype=np.float64)
+    reduction_ratio = reduction_ratio * np.where(np.isnan(eff), 1.0, np.clip(eff, 0.0, 50.0) / 50.0)
+
+    # --- Weather modulation (play mode) ---
+    reduction_ratio = reduction_ratio * np.asarray(stagnation, dtype=np.float64)
+
+    wind = np.asarray(windspeed_ms, dtype=np.float64)
+    reduction_ratio = reduction_ratio * np.where(wind < 1.5, 1.05, np.where(wind > 5.0, 0.90, 1.0))
+
+    mh = np.asarray(mixing_height, dtype=np.float64)
+    reduction_ratio = reduction_ratio * np.where(mh < 500, 1.05, np.where(mh > 900, 0.92, 1.0))
+
+    # Safety clamp
+    reduction_ratio = np.clip(reduction_ratio, 0.0, 0.5)
+
+    return np.asarray(base_co2, dtype=np.float64) * (1 - reduction_ratio)
@@ -0,0 +1,177 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+
+# Shared store for live snapshots when several worker processes serve the app.
+# One worker holds the refresher lease and publishes; the others just load new versions.
+LIVE_STATE_DB = "live_state.db"
+LIVE_LEASE_NAME = "live_refresher"
+LIVE_LEASE_TTL = 60          # seconds; the leader renews well before this
+LIVE_SNAPSHOTS_KEPT = 5      # older published versions are pruned
+
+
+def worker_id():
+    """Identity used for the lease; pid changes after fork, so each worker is distinct."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LiveStateStore:
+    """
+    SQLite-backed lease + snapshot table shared by every worker on this host.
+
+    - lease:     single row per lease name (holder, expires_at)
+    - snapshots: versioned, zlib-compressed JSON payloads published by the leader
+    """
+
+    def __init__(self, path=LIVE_STATE_DB, lease_ttl=LIVE_LEASE_TTL):
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lease (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT,
+                    expires_at REAL
+                );
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL,
+                    publisher TEXT,
+                    payload BLOB
+                );
+            """)
+        finally:
+            conn.close()
+
+    # ---- leader election ----
+    def try_acquire(self, holder, name=LIVE_LEASE_NAME):
+        """
+        Take or renew the lease. Returns True if `holder` is the leader afterwards.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT holder, expires_at FROM lease WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None or row[0] == holder or row[1] < now:
+                conn.execute(
+                    "INSERT OR REPLACE INTO lease (name, holder, expires_at) VALUES (?, ?, ?)",
+                    (name, holder, now + self.lease_ttl),
+                )
+                conn.execute("COMMIT")
+                return True
+            conn.execute("ROLLBACK")
+            return False
+        except sqlite3.Error as e:
+            print("[live][share] lease error:", e)
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            return False
+        finally:
+            conn.close()
+
+    def release(self, holder, name=LIVE_LEASE_NAME):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM lease WHERE name = ? AND holder = ?", (name, holder))
+        finally:
+            conn.close()
+
+    # ---- snapshots ----
+    def publish(self, snapshot, publisher=None):
+        """Store a new snapshot (any JSON-serializable dict) and return its version."""
+        blob = zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"))
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(
+                "INSERT INTO snapshots (created_at, publisher, payload) VALUES (?, ?, ?)",
+                (time.time(), publisher, blob),
+            )
+            version = cur.lastrowid
+            conn.execute(
+                "DELETE FROM snapshots WHERE version <= ?", (version - LIVE_SNAPSHOTS_KEPT,)
+            )
+            conn.execute("COMMIT")
+            return version
+        finally:
+            conn.close()
+
+    def latest_version(self):
+        """Cheap check used by followers: highest published version (0 if none)."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT MAX(version) FROM snapshots").fetchone()
+            return row[0] or 0
+        finally:
+            conn.close()
+
+    def load_latest(self, newer_than=0):
+        """
+        Return (version, snapshot) for the newest snapshot if its version is
+        greater than `newer_than`, else None.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT version, payload FROM snapshots WHERE version > ? ORDER BY version DESC LIMIT 1",
+                (newer_than,),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return row[0], json.loads(zlib.decompress(row[1]).decode("utf-8"))
+
+
+class LeaseHeartbeat:
+    """
+    Keeps a held lease renewed from a background thread for the duration of a
+    `with` block, so one refresh that outlasts the TTL (slow feeds, paged
+    fallbacks, waiting for a dataset swap) cannot lose it halfway.
+    `lost` is True once a renewal failed: another worker took over, and the
+    result of this refresh must not be published. While it is False the lease
+    was renewed less than ttl / 3 ago, so it is safe to publish.
+    """
+
+    def __init__(self, store, holder, name=LIVE_LEASE_NAME):
+        self.store = store
+        self.holder = holder
+        self.name = name
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.store.lease_ttl / 3.0):
+            if not self.store.try_acquire(self.holder, self.name):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,107 @@
+import numpy as np
+
+# Budget is discretized into this many cost units for the knapsack pass
+DEFAULT_RESOLUTION = 2000
+
+
+def greedy_allocation(benefit, costs, budget):
+    """
+    Greedy pass: take (station, intervention) options by benefit per unit cost,
+    at most one intervention per station, while the budget allows.
+    benefit: [stations, interventions]; costs: [interventions].
+    Returns (choice array with -1 = none, total benefit, total cost).
+    """
+    n_stations, n_options = benefit.shape
+    choice = np.full(n_stations, -1, dtype=np.int64)
+
+    ratio = benefit / costs[None, :]
+    order = np.argsort(-ratio, axis=None, kind="stable")
+    spent = 0.0
+    gained = 0.0
+    for flat in order.tolist():
+        s, i = divmod(flat, n_options)
+        if benefit[s, i] <= 0:
+            break
+        if choice[s] >= 0 or spent + costs[i] > budget:
+            continue
+        choice[s] = i
+        spent += costs[i]
+        gained += benefit[s, i]
+    return choice, gained, spent
+
+
+def knapsack_allocation(benefit, costs, budget, resolution=DEFAULT_RESOLUTION):
+    """
+    Multiple-choice knapsack (at most one intervention per station) by dynamic
+    programming over the budget split into `resolution` units. Costs are rounded
+    up to whole units, so every returned allocation is within budget.
+
+    Returns (choice, total benefit, total cost, best[b]) where best[b] is the
+    largest total benefit reachable with b units – the marginal-benefit curve.
+    """
+    n_stations, n_options = benefit.shape
+    unit = budget / float(resolution)
+    unit_costs = np.ceil(costs / unit - 1e-9).astype(np.int64)
+
+    dp = np.zeros(resolution + 1)
+    # picks[s, b] = option chosen for station s when b units are available (-1 = none)
+    picks = np.full((n_stations, resolution + 1), -1, dtype=np.int16 if n_options < 32000 else np.int32)
+
+    for s in range(n_stations):
+        new_dp = dp.copy()
+        for i in range(n_options):
+            c = unit_costs[i]
+            if c > resolution or benefit[s, i] <= 0:
+                continue
+            cand = np.full(resolution + 1, -np.inf)
+            cand[c:] = dp[:resolution + 1 - c] + benefit[s, i]
+            better = cand > new_dp
+            new_dp = np.where(better, cand, new_dp)
+            picks[s, better] = i
+        dp = new_dp
+
+    # backtrack from the full budget
+    choice = np.full(n_stations, -1, dtype=np.int64)
+    b = resolution
+    for s in range(n_stations - 1, -1, -1):
+        i = int(picks[s, b])
+        if i >= 0:
+            choice[s] = i
+            b -= unit_costs[i]
+
+    chosen = choice >= 0
+    gained = float(benefit[chosen, choice[chosen]].sum())
+    spent = float(costs[choice[chosen]].sum())
+    # dp starts at zero for every b, so dp[b] is already "best with cost <= b"
+    return choice, gained, spent, dp
+
+
+def optimize_placement(benefit, costs, budget, resolution=DEFAULT_RESOLUTION, curve_points=50):
+    """
+    Greedy allocation refined by the knapsack pass; the better of the two wins.
+
+    Returns dict with choice (-1 = none per station), total_benefit, total_cost,
+    method, and curve = [(budget, best total benefit)] sampled from the knapsack
+    table at `curve_points` evenly spaced budgets.
+    """
+    benefit = np.asarray(benefit, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.float64)
+
+    g_choice, g_gain, g_cost = greedy_allocation(benefit, costs, budget)
+    k_choice, k_gain, k_cost, best = knapsack_allocation(benefit, costs, budget, resolution)
+
+    if k_gain > g_gain + 1e-9:
+        choice, gain, cost, method = k_choice, k_gain, k_cost, "knapsack"
+    else:
+        choice, gain, cost, method = g_choice, g_gain, g_cost, "greedy"
+
+    unit = budget / float(resolution)
+    steps = np.unique(np.linspace(0, resolution, max(2, curve_points)).round().astype(np.int64))
+    curve = [(round(float(b) * unit, 2), float(best[b])) for b in steps]
+    return {
+        "choice": choice,
+        "total_benefit": gain,
+        "total_cost": cost,
+        "method": method,
+        "curve": curve,
+    }
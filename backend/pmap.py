@@ -0,0 +1,160 @@
+# Persistent (immutable) hash map with structural sharing.
+# A hash array mapped trie: every `set` copies only the O(log32 n) nodes on the
+# path to the key and shares the rest with the previous version, so keeping many
+# versions (undo history, scenario branches) costs memory proportional to the
+# number of changes, and taking a copy is free.
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_BITS = 64
+
+_MISSING = object()
+
+
+def _popcount(x):
+    return bin(x).count("1")
+
+
+class _Node:
+    """Bitmap-indexed trie node; slots hold leaves (hash, key, value), _Node or _Collision."""
+
+    __slots__ = ("bitmap", "slots")
+
+    def __init__(self, bitmap, slots):
+        self.bitmap = bitmap
+        self.slots = slots
+
+
+class _Collision:
+    """Leaves whose 64-bit hashes are identical."""
+
+    __slots__ = ("leaves",)
+
+    def __init__(self, leaves):
+        self.leaves = leaves
+
+
+_EMPTY_NODE = _Node(0, ())
+
+
+def _hash(key):
+    return hash(key) & ((1 << _HASH_BITS) - 1)
+
+
+def _merge(shift, leaf1, leaf2):
+    """Smallest subtree holding two leaves with different keys."""
+    if shift >= _HASH_BITS:
+        return _Collision((leaf1, leaf2))
+    i1 = (leaf1[0] >> shift) & _MASK
+    i2 = (leaf2[0] >> shift) & _MASK
+    if i1 == i2:
+        return _Node(1 << i1, (_merge(shift + _BITS, leaf1, leaf2),))
+    if i1 < i2:
+        return _Node((1 << i1) | (1 << i2), (leaf1, leaf2))
+    return _Node((1 << i1) | (1 << i2), (leaf2, leaf1))
+
+
+def _assoc(node, shift, leaf):
+    """Returns (new node, added) with `leaf` set; `node` itself is never modified."""
+    h, key, value = leaf
+
+    if isinstance(node, _Collision):
+        for k, (_, lk, lv) in enumerate(node.leaves):
+            if lk == key:
+                if lv is value:
+                    return node, False
+                return _Collision(node.leaves[:k] + (leaf,) + node.leaves[k + 1:]), False
+        return _Collision(node.leaves + (leaf,)), True
+
+    bit = 1 << ((h >> shift) & _MASK)
+    idx = _popcount(node.bitmap & (bit - 1))
+
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, node.slots[:idx] + (leaf,) + node.slots[idx:]), True
+
+    item = node.slots[idx]
+    if isinstance(item, (_Node, _Collision)):
+        child, added = _assoc(item, shift + _BITS, leaf)
+        if child is item:
+            return node, False
+    elif item[1] == key:
+        if item[2] is value:
+            return node, False
+        child, added = leaf, False
+    else:
+        child, added = _merge(shift + _BITS, item, leaf), True
+
+    return _Node(node.bitmap, node.slots[:idx] + (child,) + node.slots[idx + 1:]), added
+
+
+def _iter_leaves(node):
+    if isinstance(node, _Collision):
+        yield from node.leaves
+        return
+    for item in node.slots:
+        if isinstance(item, (_Node, _Collision)):
+            yield from _iter_leaves(item)
+        else:
+            yield item
+
+
+class PMap:
+    """
+    Immutable mapping. `set` returns a new PMap sharing structure with this one.
+
+        m1 = PMap()
+        m2 = m1.set("a", 1)      # m1 is unchanged
+    """
+
+    __slots__ = ("_root", "_len")
+
+    def __init__(self, _root=_EMPTY_NODE, _len=0):
+        self._root = _root
+        self._len = _len
+
+    @classmethod
+    def from_items(cls, items):
+        m = cls()
+        for key, value in items:
+            m = m.set(key, value)
+        return m
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        for _, key, _ in _iter_leaves(self._root):
+            yield key
+
+    def get(self, key, default=None):
+        h = _hash(key)
+        node = self._root
+        shift = 0
+        while True:
+            if isinstance(node, _Collision):
+                for _, lk, lv in node.leaves:
+                    if lk == key:
+                        return lv
+                return default
+            bit = 1 << ((h >> shift) & _MASK)
+            if not node.bitmap & bit:
+                return default
+            item = node.slots[_popcount(node.bitmap & (bit - 1))]
+            if isinstance(item, (_Node, _Collision)):
+                node = item
+                shift += _BITS
+                continue
+            return item[2] if item[1] == key else default
+
+    def set(self, key, value):
+        root, added = _assoc(self._root, 0, (_hash(key), key, value))
+        if root is self._root:
+            return self
+        return PMap(root, self._len + (1 if added else 0))
+
+    def items(self):
+        for _, key, value in _iter_leaves(self._root):
+            yield key, value
@@ -0,0 +1,131 @@
+import numpy as np
+
+# Pollutant columns kept for every live refresh (CPCB units: µg/m³, CO in mg/m³)
+POLLUTANTS = ("pm25", "pm10", "no2", "co")
+
+
+class PollutantFrame:
+    """
+    Raw pollutant readings from one live refresh, stored column-wise.
+
+    - station_idx: int32 registry ids (position in the `stations` list), sorted
+    - one float32 array per pollutant, aligned with station_idx; NaN = not reported
+    - dataset_version: version of the registry the ids refer to (None = unknown)
+    """
+
+    __slots__ = ("station_idx", "columns", "source", "ts", "dataset_version")
+
+    def __init__(self, station_idx, columns, source=None, ts=None, dataset_version=None):
+        self.station_idx = station_idx
+        self.columns = columns
+        self.source = source
+        self.ts = ts
+        self.dataset_version = dataset_version
+
+    @classmethod
+    def from_rows(cls, rows, source=None, ts=None, dataset_version=None):
+        """
+        Build a frame from { station_idx: { pollutant: value or None } }.
+        """
+        idx = np.fromiter(sorted(rows), dtype=np.int32, count=len(rows))
+        columns = {}
+        for p in POLLUTANTS:
+            col = np.full(len(idx), np.nan, dtype=np.float32)
+            for i, sid in enumerate(idx):
+                v = rows[int(sid)].get(p)
+                if v is not None:
+                    col[i] = v
+            columns[p] = col
+        return cls(idx, columns, source=source, ts=ts, dataset_version=dataset_version)
+
+    @classmethod
+    def empty(cls, source=None, ts=None, dataset_version=None):
+        return cls.from_rows({}, source=source, ts=ts, dataset_version=dataset_version)
+
+    def __len__(self):
+        return len(self.station_idx)
+
+    @property
+    def nbytes(self):
+        return self.station_idx.nbytes + sum(c.nbytes for c in self.columns.values())
+
+    def row(self, station_idx):
+        """
+        Readings for one station as { pollutant: float or None }, or None if absent.
+        """
+        pos = int(np.searchsorted(self.station_idx, station_idx))
+        if pos >= len(self.station_idx) or self.station_idx[pos] != station_idx:
+            return None
+        out = {}
+        for p in POLLUTANTS:
+            v = self.columns[p][pos]
+            out[p] = None if np.isnan(v) else round(float(v), 3)
+        return out
+
+    def to_dict(self, names=None):
+        """
+        JSON-friendly column view. If `names` (registry list of station names)
+        is given, station names are included next to the ids.
+        """
+        ids = self.station_idx.tolist()
+        out = {"source": self.source, "ts": self.ts, "station_idx": ids}
+        if names is not None:
+            out["stations"] = [names[i] for i in ids]
+        for p in POLLUTANTS:
+            col = self.columns[p]
+            out[p] = [None if np.isnan(v) else round(float(v), 3) for v in col]
+        return out
+
+    @classmethod
+    def from_dict(cls, data, station_index=None, dataset_version=None):
+        """
+        Inverse of to_dict. With `station_index` ({ name: registry id }) and station
+        names in `data`, rows are keyed by name instead of by the stored ids, so a
+        frame written against another registry lands on the right stations (names
+        missing from station_index are dropped).
+        """
+        idx = np.asarray(data.get("station_idx") or [], dtype=np.int32)
+        columns = {}
+        for p in POLLUTANTS:
+            values = data.get(p) or [None] * len(idx)
+            columns[p] = np.array([np.nan if v is None else v for v in values], dtype=np.float32)
+        frame = cls(idx, columns, source=data.get("source"), ts=data.get("ts"),
+                    dataset_version=dataset_version)
+        names = data.get("stations")
+        if station_index is None or names is None:
+            return frame
+        new_of_pos = np.array([station_index.get(n, -1) for n in names], dtype=np.int32)
+        frame.station_idx = np.arange(len(names), dtype=np.int32)
+        return frame.remap(new_of_pos, dataset_version)
+
+    def remap(self, new_of_old, dataset_version=None):
+        """
+        Frame re-keyed onto another registry: new_of_old[old_id] is the new id of
+        a station, or -1 if it no longer exists (its readings are dropped).
+        """
+        new_of_old = np.asarray(new_of_old, dtype=np.int32)
+        known = self.station_idx < len(new_of_old)
+        ids = np.full(len(self.station_idx), -1, dtype=np.int32)
+        ids[known] = new_of_old[self.station_idx[known]]
+        keep = np.flatnonzero(ids >= 0)
+        keep = keep[np.argsort(ids[keep], kind="stable")]
+        return PollutantFrame(
+            ids[keep],
+            {p: c[keep] for p, c in self.columns.items()},
+            source=self.source,
+            ts=self.ts,
+            dataset_version=dataset_version,
+        )
+
+    def select(self, station_idx):
+        """
+        Sub-frame restricted to the given registry ids (missing ids are skipped).
+        """
+        mask = np.isin(self.station_idx, np.asarray(station_idx, dtype=np.int32))
+        return PollutantFrame(
+            self.station_idx[mask],
+            {p: c[mask] for p, c in self.columns.items()},
+            source=self.source,
+            ts=self.ts,
+            dataset_version=self.dataset_version,
+        )
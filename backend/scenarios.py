@@ -0,0 +1,395 @@
+import gzip
+import json
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from backend.pmap import PMap
+
+# Which shared store an override belongs to (same names as `applied_to`)
+SCENARIO_STORES = ("baseline", "live")
+
+# Memory cap for all overlays together, and a hard cap on their number
+SCENARIO_MAX_BYTES = 32 * 1024 * 1024
+SCENARIO_MAX_OVERLAYS = 10000
+
+# Undo steps kept per branch; older steps are forgotten
+SCENARIO_MAX_UNDO = 100
+DEFAULT_BRANCH = "main"
+
+# Export file: gzip-compressed JSON with this format tag
+SCENARIO_EXPORT_FORMAT = "co2-scenario"
+SCENARIO_EXPORT_VERSION = 1
+# Largest decompressed import accepted (a bigger overlay would not fit the store anyway)
+SCENARIO_MAX_IMPORT_BYTES = SCENARIO_MAX_BYTES
+_GUNZIP_CHUNK = 1 << 20
+
+# Rough cost of one override: trie path copy + leaf tuple + (value, origin) tuple + 2 floats
+_ENTRY_OVERHEAD_BYTES = 300
+
+_EMPTY_STATE = tuple(PMap() for _ in SCENARIO_STORES)
+
+
+def _gunzip(raw, limit=SCENARIO_MAX_IMPORT_BYTES):
+    """gzip.decompress that stops (ValueError) once the output exceeds `limit` bytes."""
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks, size, data = [], 0, raw
+    while not d.eof:
+        chunk = d.decompress(data, _GUNZIP_CHUNK)
+        data = d.unconsumed_tail
+        if not chunk and not data:
+            raise ValueError("not a scenario file: truncated gzip data")
+        size += len(chunk)
+        if size > limit:
+            raise ValueError(f"scenario file is larger than {limit} bytes uncompressed")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _store_pos(store):
+    return SCENARIO_STORES.index(store)
+
+
+class _Branch:
+    """
+    One line of scenario history. `state` is a tuple of PMaps (one per store,
+    name -> (value, origin)); undo / redo hold earlier / later states with the
+    number of overrides each step touched.
+    """
+
+    __slots__ = ("state", "undo", "redo")
+
+    def __init__(self, state=_EMPTY_STATE):
+        self.state = state
+        self.undo = []   # [(state, changes)]
+        self.redo = []
+
+    def nbytes(self):
+        head = sum(len(m) for m in self.state)
+        steps = sum(n for _, n in self.undo) + sum(n for _, n in self.redo)
+        return (head + steps) * _ENTRY_OVERHEAD_BYTES
+
+
+class ScenarioOverlay:
+    """
+    One planner's changes on top of the shared baseline / live values, with
+    named branches and undo / redo.
+
+    Only changed stations are stored, as name -> (value, origin) where origin is
+    the shared value the first intervention started from. When the shared value
+    moves (new live refresh, baseline switched to another day) the override no
+    longer applies. States are persistent maps, so forking a branch is O(1) and
+    history costs memory only for what changed.
+    """
+
+    __slots__ = ("branches", "current", "last_used", "nbytes", "context")
+
+    def __init__(self):
+        self.branches = {DEFAULT_BRANCH: _Branch()}
+        self.current = DEFAULT_BRANCH
+        self.last_used = time.time()
+        self.context = None   # shared-data context of an imported file (see export_bytes)
+        self._resize()
+
+    @property
+    def branch(self):
+        return self.branches[self.current]
+
+    def __len__(self):
+        return sum(len(m) for m in self.branch.state)
+
+    def _resize(self):
+        """Refresh the size estimate used by ScenarioStore (after every change)."""
+        self.nbytes = sys.getsizeof(self) + sum(
+            sys.getsizeof(name) + b.nbytes() for name, b in self.branches.items()
+        )
+
+    # ---- reads ----
+    def get(self, store, name, shared_value):
+        """Overridden value for `name`, or None if unchanged / stale."""
+        entry = self.branch.state[_store_pos(store)].get(name)
+        if entry is None or entry[1] != shared_value:
+            return None
+        return entry[0]
+
+    def items(self, store):
+        """(name, value, origin) for every override in `store` on the current branch."""
+        return [(name, v, o) for name, (v, o) in self.branch.state[_store_pos(store)].items()]
+
+    # ---- writes (each call is one undo step) ----
+    def _commit(self, state, n_changes):
+        branch = self.branch
+        if state is branch.state:
+            return
+        branch.undo.append((branch.state, n_changes))
+        del branch.undo[:-SCENARIO_MAX_UNDO]
+        branch.redo.clear()
+        branch.state = state
+        self._resize()
+
+    def apply(self, changes):
+        """
+        Record new values as one step. changes: [(store, name, value, shared_value)].
+        An existing override keeps its origin while the shared value is unchanged.
+        """
+        state = list(self.branch.state)
+        for store, name, value, shared_value in changes:
+            pos = _store_pos(store)
+            entry = state[pos].get(name)
+            origin = entry[1] if entry is not None and entry[1] == shared_value else shared_value
+            state[pos] = state[pos].set(name, (value, origin))
+        self._commit(tuple(state), len(changes))
+
+    def set(self, store, name, value, shared_value):
+        self.apply([(store, name, value, shared_value)])
+
+    def clear(self, store):
+        """Drop every override of one store (undoable)."""
+        pos = _store_pos(store)
+        state = self.branch.state
+        if len(state[pos]):
+            self._commit(state[:pos] + (PMap(),) + state[pos + 1:], len(state[pos]))
+
+    def undo(self):
+        branch = self.branch
+        if not branch.undo:
+            return False
+        state, n = branch.undo.pop()
+        branch.redo.append((branch.state, n))
+        branch.state = state
+        self._resize()
+        return True
+
+    def redo(self):
+        branch = self.branch
+        if not branch.redo:
+            return False
+        state, n = branch.redo.pop()
+        branch.undo.append((branch.state, n))
+        branch.state = state
+        self._resize()
+        return True
+
+    # ---- branches ----
+    def fork(self, name, source=None):
+        """New branch starting at the head of `source` (default: current). O(1)."""
+        if not name or name in self.branches:
+            raise ValueError(f"branch '{name}' already exists" if name else "branch name is required")
+        src = self.branches.get(source or self.current)
+        if src is None:
+            raise ValueError(f"unknown branch '{source}'")
+        self.branches[name] = _Branch(src.state)
+        self._resize()
+
+    def switch(self, name):
+        if name not in self.branches:
+            raise ValueError(f"unknown branch '{name}'")
+        self.current = name
+
+    def delete_branch(self, name):
+        if name not in self.branches:
+            raise ValueError(f"unknown branch '{name}'")
+        if len(self.branches) == 1:
+            raise ValueError("cannot delete the only branch")
+        del self.branches[name]
+        if self.current == name:
+            self.current = next(iter(self.branches))
+        self._resize()
+
+    def summary(self):
+        return {
+            "branch": self.current,
+            "branches": [
+                {"name": name, "changes": sum(len(m) for m in b.state)}
+                for name, b in self.branches.items()
+            ],
+            "can_undo": bool(self.branch.undo),
+            "can_redo": bool(self.branch.redo),
+        }
+
+    # ---- stale overrides ----
+    def stale(self, shared):
+        """
+        Overrides on any branch whose origin is not the current shared value, as
+        [{branch, applied_to, station, origin, shared_co2}]; shared = {store: {name: value}}.
+        """
+        out = []
+        for branch_name, b in self.branches.items():
+            for pos, store in enumerate(SCENARIO_STORES):
+                current = shared.get(store) or {}
+                for name, (_, origin) in b.state[pos].items():
+                    if current.get(name) != origin:
+                        out.append({"branch": branch_name, "applied_to": store, "station": name,
+                                    "origin": origin, "shared_co2": current.get(name)})
+        return out
+
+    def rebase(self, shared):
+        """
+        Move stale overrides onto the current shared values, keeping their relative
+        change (value * shared / origin). Not an undo step. Overrides of stations
+        without a current shared value stay stale. Returns how many were moved.
+        """
+        moved = 0
+        for b in self.branches.values():
+            state = list(b.state)
+            for pos, store in enumerate(SCENARIO_STORES):
+                current = shared.get(store) or {}
+                for name, (value, origin) in b.state[pos].items():
+                    now = current.get(name)
+                    if now is None or now == origin or not origin:
+                        continue
+                    state[pos] = state[pos].set(name, (round(value * now / origin, 2), now))
+                    moved += 1
+            b.state = tuple(state)
+        return moved
+
+    # ---- export / import ----
+    def export_bytes(self, context=None):
+        """
+        Branch heads as gzip-compressed JSON (history is not exported). `context`
+        describes the shared data the origins refer to (baseline day, live source,
+        dataset version); it comes back as .context on import.
+        """
+        doc = {
+            "format": SCENARIO_EXPORT_FORMAT,
+            "version": SCENARIO_EXPORT_VERSION,
+            "exported_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "context": context,
+            "current": self.current,
+            "branches": {
+                name: {
+                    store: [[n, v, o] for n, (v, o) in b.state[pos].items()]
+                    for pos, store in enumerate(SCENARIO_STORES)
+                }
+                for name, b in self.branches.items()
+            },
+        }
+        return gzip.compress(json.dumps(doc, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def import_bytes(cls, raw, known_stations=None):
+        """
+        Rebuild an overlay from export_bytes() output (gzip or plain JSON).
+        Overrides for stations not in `known_stations` are skipped.
+        Raises ValueError on malformed input.
+        """
+        try:
+            if raw[:2] == b"\x1f\x8b":
+                raw = _gunzip(raw)
+            doc = json.loads(raw.decode("utf-8"))
+        except (zlib.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"not a scenario file: {e}")
+
+        if not isinstance(doc, dict) or doc.get("format") != SCENARIO_EXPORT_FORMAT:
+            raise ValueError("not a scenario file")
+        if doc.get("version") != SCENARIO_EXPORT_VERSION:
+            raise ValueError(f"unsupported scenario version {doc.get('version')}")
+        branches = doc.get("branches")
+        if not isinstance(branches, dict) or not branches:
+            raise ValueError("scenario has no branches")
+
+        overlay = cls()
+        overlay.branches = {}
+        skipped = 0
+        for name, stores in branches.items():
+            state = []
+            for store in SCENARIO_STORES:
+                entries = []
+                for entry in (stores or {}).get(store) or []:
+                    try:
+                        station, value, origin = entry
+                        entries.append((str(station), (float(value), float(origin))))
+                    except (TypeError, ValueError):
+                        raise ValueError(f"malformed entry in branch '{name}'")
+                if known_stations is not None:
+                    kept = [e for e in entries if e[0] in known_stations]
+                    skipped += len(entries) - len(kept)
+                    entries = kept
+                state.append(PMap.from_items(entries))
+            overlay.branches[str(name)] = _Branch(tuple(state))
+
+        current = doc.get("current")
+        overlay.current = current if current in overlay.branches else next(iter(overlay.branches))
+        overlay.context = doc.get("context") if isinstance(doc.get("context"), dict) else None
+        overlay._resize()
+        return overlay, skipped
+
+
+class ScenarioStore:
+    """
+    Per-session overlays with LRU eviction.
+
+    Overlays are created on first write; least recently used ones are evicted
+    once the total estimated size exceeds max_bytes or there are more than
+    max_overlays. Thread-safe.
+
+    Overlays live in this process only: under several workers a session must keep
+    hitting the same one (single worker or sticky sessions). get() of an unknown
+    key is counted in `misses`.
+    """
+
+    def __init__(self, max_bytes=SCENARIO_MAX_BYTES, max_overlays=SCENARIO_MAX_OVERLAYS):
+        self.max_bytes = max_bytes
+        self.max_overlays = max_overlays
+        self._overlays = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Existing overlay for `key` (marked as recently used), or None."""
+        with self._lock:
+            overlay = self._overlays.get(key)
+            if overlay is None:
+                self.misses += 1
+                return None
+            self._overlays.move_to_end(key)
+            overlay.last_used = time.time()
+            return overlay
+
+    def get_or_create(self, key):
+        with self._lock:
+            overlay = self._overlays.get(key)
+            if overlay is None:
+                overlay = ScenarioOverlay()
+                self._overlays[key] = overlay
+            else:
+                self._overlays.move_to_end(key)
+            overlay.last_used = time.time()
+            return overlay
+
+    def put(self, key, overlay):
+        """Replace the overlay of `key` (e.g. with an imported scenario)."""
+        with self._lock:
+            overlay.last_used = time.time()
+            self._overlays[key] = overlay
+            self._overlays.move_to_end(key)
+
+    def discard(self, key):
+        with self._lock:
+            return self._overlays.pop(key, None) is not None
+
+    def enforce_limits(self, keep=None):
+        """Evict least recently used overlays (never `keep`) until within limits."""
+        with self._lock:
+            total = sum(o.nbytes for o in self._overlays.values())
+            for key in list(self._overlays.keys()):
+                if total <= self.max_bytes and len(self._overlays) <= self.max_overlays:
+                    break
+                if key == keep:
+                    continue
+                total -= self._overlays.pop(key).nbytes
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "overlays": len(self._overlays),
+                "overrides": sum(len(o) for o in self._overlays.values()),
+                "bytes": sum(o.nbytes for o in self._overlays.values()),
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "misses": self.misses,
+            }
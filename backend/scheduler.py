@@ -0,0 +1,112 @@
+import hashlib
+import random
+import time
+
+
+class SourceSchedule:
+    """
+    Polling state for one upstream feed (CPCB, OpenAQ, ...).
+
+    - conditional requests: remembers ETag / Last-Modified and a hash of the
+      last payload, so unchanged responses can be skipped without reparsing
+    - failures back off exponentially (base_interval * 2^n, capped) with jitter
+    - when the newest upstream timestamp moves, polling speeds up towards
+      min_interval; quiet polls relax back to base_interval
+    """
+
+    def __init__(self, name, base_interval, min_interval=60, max_interval=3600,
+                 backoff_factor=2.0, jitter=0.2, rng=None):
+        self.name = name
+        self.base_interval = float(base_interval)
+        self.min_interval = float(min(min_interval, base_interval))
+        self.max_interval = float(max(max_interval, base_interval))
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        self.newest_data_ts = None
+
+        self.interval = self.base_interval
+        self.failures = 0
+        self.next_due = 0.0
+        self.last_changed = False
+
+    # ---- request side ----
+    def is_due(self, now=None):
+        return (now if now is not None else time.time()) >= self.next_due
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def payload_changed(self, resp):
+        """
+        Decide from a response whether the payload needs parsing: not for a 304 or
+        a payload identical to the last one passed to commit_payload(). Read-only,
+        so a payload that then fails to parse is parsed (and fails) again next poll.
+        """
+        if getattr(resp, "status_code", 200) == 304:
+            return False
+        return hashlib.sha256(resp.content or b"").hexdigest() != self.content_hash
+
+    def commit_payload(self, resp):
+        """
+        Remember the validators and content hash of a response once its payload
+        was parsed successfully; later polls send them / compare against them.
+        """
+        headers = getattr(resp, "headers", None) or {}
+        self.etag = headers.get("ETag") or self.etag
+        self.last_modified = headers.get("Last-Modified") or self.last_modified
+        self.content_hash = hashlib.sha256(resp.content or b"").hexdigest()
+
+    # ---- outcome side ----
+    def _jittered(self, seconds):
+        return seconds * (1.0 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def record_success(self, changed, newest_data_ts=None, now=None):
+        """
+        Schedule the next poll after a successful fetch.
+        `newest_data_ts` is the most recent upstream timestamp seen (any comparable value).
+        """
+        now = now if now is not None else time.time()
+        self.failures = 0
+        self.last_changed = changed
+
+        fresh = newest_data_ts is not None and newest_data_ts != self.newest_data_ts
+        if newest_data_ts is not None:
+            self.newest_data_ts = newest_data_ts
+
+        if changed and fresh:
+            self.interval = max(self.min_interval, self.interval / 2.0)
+        else:
+            self.interval = min(self.base_interval, self.interval * 1.5)
+
+        self.next_due = now + self._jittered(self.interval)
+        return self.next_due
+
+    def record_failure(self, now=None):
+        now = now if now is not None else time.time()
+        self.failures += 1
+        self.last_changed = False
+        backoff = self.base_interval * (self.backoff_factor ** (self.failures - 1))
+        self.interval = self.base_interval
+        self.next_due = now + self._jittered(min(self.max_interval, backoff))
+        return self.next_due
+
+    def status(self, now=None):
+        now = now if now is not None else time.time()
+        return {
+            "source": self.name,
+            "interval_s": round(self.interval, 1),
+            "failures": self.failures,
+            "next_due_in_s": round(max(0.0, self.next_due - now), 1),
+            "last_changed": self.last_changed,
+            "newest_data_ts": self.newest_data_ts,
+        }
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Read-only dataset arrays shared between worker processes.
+#
+# The first worker to load a dataset version writes its arrays as .npy files into
+# <root>/<fingerprint>/ (on tmpfs when /dev/shm exists, so nothing lands on disk);
+# every worker then maps them with np.load(mmap_mode="r"). The pages live once in
+# the page cache no matter how many workers map them, so each extra worker adds
+# almost nothing to resident memory. Directories / files are 0700 / 0600.
+#
+# A set is published by renaming a fully written temp directory into place, so a
+# worker either sees a complete set or none. Sets of older fingerprints are removed
+# on publish; workers still mapping them keep their pages until they unmap.
+#
+# The per-user root is shared by every deployment of the app run by that user, so
+# each deployment publishes into its own <root>/<namespace>/ and only ever removes
+# sets from there (see deployment_namespace).
+SHARED_ARRAYS_ENV_DIR = "SHARED_ARRAYS_DIR"
+SHARED_ARRAYS_ENV_NAMESPACE = "SHARED_ARRAYS_NAMESPACE"
+_SHM_DIR = "/dev/shm"
+
+
+def default_root():
+    base = _SHM_DIR if os.path.isdir(_SHM_DIR) else tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, "getuid") else "user"
+    return os.path.join(base, f"co2-arrays-{uid}")
+
+
+def deployment_namespace(app_dir):
+    """
+    Subdirectory name for one deployment: SHARED_ARRAYS_NAMESPACE if set, else a
+    hash of the app's directory, so the workers of one instance share a namespace
+    and two checkouts running side by side do not delete each other's sets.
+    """
+    name = os.environ.get(SHARED_ARRAYS_ENV_NAMESPACE)
+    if name:
+        return _file_name(name)[:-len(".npy")]
+    return "app-" + hashlib.sha256(os.path.abspath(app_dir).encode("utf-8")).hexdigest()[:16]
+
+
+def _file_name(key):
+    # keys look like "baseline.cube"; keep them readable but path-safe
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in key) + ".npy"
+
+
+class SharedArrays:
+    """Publish / attach one named set of read-only arrays under `root`."""
+
+    def __init__(self, root, name):
+        self.root = root
+        self.name = name
+        self.path = os.path.join(root, name)
+        self.attached = False   # True if the set was published by another process
+        self.nbytes = 0
+
+    def attach(self, keys):
+        """{key: read-only memmap} if a complete set with all `keys` is published, else None."""
+        if not os.path.isdir(self.path):
+            return None
+        views = {}
+        try:
+            for key in keys:
+                views[key] = np.load(os.path.join(self.path, _file_name(key)), mmap_mode="r", allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        self.nbytes = sum(v.nbytes for v in views.values())
+        return views
+
+    def publish(self, arrays):
+        """Write `arrays` as a new set (unless another worker got there first)."""
+        # makedirs applies `mode` to the leaf only; the per-user parent must be 0700 too
+        os.makedirs(os.path.dirname(self.root), mode=0o700, exist_ok=True)
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=f".{self.name}-", dir=self.root)
+        try:
+            for key, value in arrays.items():
+                target = os.path.join(tmp, _file_name(key))
+                fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, np.ascontiguousarray(value), allow_pickle=False)
+            try:
+                os.rename(tmp, self.path)
+            except OSError:
+                # published concurrently by another worker: use theirs
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self._remove_stale()
+
+    def publish_or_attach(self, arrays):
+        """
+        Zero-copy views of `arrays` ({key: ndarray}) backed by the shared set,
+        publishing it first if needed. Returns (views, attached_existing).
+        """
+        views = self.attach(arrays.keys())
+        self.attached = views is not None
+        if views is None:
+            self.publish(arrays)
+            views = self.attach(arrays.keys())
+            if views is None:
+                raise OSError(f"shared arrays at {self.path} could not be attached")
+        return views, self.attached
+
+    def _remove_stale(self):
+        # root is this deployment's namespace, so every other set here is ours
+        for entry in os.listdir(self.root):
+            if entry == self.name or entry.startswith("."):
+                continue
+            shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
@@ -0,0 +1,90 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from backend.dataset_cache import day_numbers
+
+# The only station_day.csv columns the app reads: CO for the baseline, plus the
+# other pollutants of the live CO2 estimate for its historic climatology
+STATION_DAY_COLUMNS = ("StationId", "Date", "CO", "PM2.5", "PM10", "NO2")
+# float32 pollutant columns of the lean frame: (lean name, CSV name)
+LEAN_POLLUTANT_COLUMNS = (("CO", "CO"), ("PM25", "PM2.5"), ("PM10", "PM10"), ("NO2", "NO2"))
+# every lean column except the StationId categorical
+LEAN_NUMERIC_COLUMNS = ("StationIdx", "Day") + tuple(name for name, _ in LEAN_POLLUTANT_COLUMNS)
+
+
+def frame_bytes(df):
+    """Memory of a DataFrame including string payloads."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def station_columns(station_ids, station_map, col_of):
+    """
+    int32 column (registry id, or an extra baseline column) for every row's
+    StationId through station_map; -1 where the id or its station is unknown.
+    Works per unique id, so it costs O(rows) array work plus O(ids) dict lookups.
+    """
+    codes, unique_ids = pd.factorize(pd.Series(station_ids).astype(object))
+    col = np.array(
+        [col_of.get(station_map.get(sid), -1) for sid in unique_ids] + [-1], dtype=np.int32,
+    )
+    return col[codes]  # code -1 (missing id) picks the trailing -1
+
+
+def lean_frame(df, station_map, col_of):
+    """
+    Lean station_day rows:
+
+    - StationId:  categorical (codes instead of one string object per row)
+    - StationIdx: int32 baseline column / registry id, -1 = not mapped
+    - Day:        int32 days since 1970-01-01 (DAY_MISSING without a date)
+    - CO:         float32 mg/m³
+    - PM25, PM10, NO2: float32 µg/m³
+    """
+    return pd.DataFrame({
+        "StationId": pd.Categorical(df["StationId"].astype(object).where(df["StationId"].notna(), None)),
+        "StationIdx": station_columns(df["StationId"], station_map, col_of),
+        "Day": day_numbers(pd.to_datetime(df["Date"], errors="coerce")),
+        **{
+            name: pd.to_numeric(df[source], errors="coerce").to_numpy(dtype=np.float32)
+            for name, source in LEAN_POLLUTANT_COLUMNS
+        },
+    })
+
+
+class LeanStationDay:
+    """
+    Per-chunk transform for load_encrypted_csv: turns each parsed chunk into
+    lean_frame() rows and keeps count of what the same rows and columns would
+    have cost as before (default pandas dtypes, Date parsed to datetime64).
+    Thread-safe; chunks may be parsed in parallel.
+    """
+
+    def __init__(self, station_map, column_names):
+        self.station_map = station_map
+        self.col_of = {name: j for j, name in enumerate(column_names)}
+        self.default_bytes = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, chunk):
+        chunk["Date"] = pd.to_datetime(chunk["Date"], errors="coerce")
+        default_bytes = frame_bytes(chunk)
+        lean = lean_frame(chunk, self.station_map, self.col_of)
+        with self._lock:
+            self.default_bytes += default_bytes
+        return lean
+
+
+def memory_report(lean_df, default_bytes, lean=True):
+    """Summary of station_day memory use vs default pandas dtypes."""
+    lean_bytes = frame_bytes(lean_df)
+    return {
+        "lean": lean,
+        "rows": int(len(lean_df)),
+        "columns": [str(c) for c in lean_df.columns],
+        "bytes": lean_bytes,
+        "default_dtype_bytes": int(default_bytes),
+        "saved_bytes": int(default_bytes) - lean_bytes,
+        "saved_pct": round(100.0 * (1 - lean_bytes / default_bytes), 1) if default_bytes else 0.0,
+    }
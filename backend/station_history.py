@@ -0,0 +1,122 @@
+import numpy as np
+
+from backend.dataset_cache import DAY_MISSING, sanitized_co2
+
+# Daily CO2 history per station, for date-range queries.
+#
+# All station_day rows live in three flat arrays sorted by (station column, day):
+# the rows of column j are days[offsets[j]:offsets[j + 1]], so a date range is two
+# binary searches on an already sorted slice instead of filtering the DataFrame.
+# Columns are the baseline cube's columns (registry id first, see baseline_names).
+RESAMPLE_FREQS = ("day", "week", "month")
+
+
+def period_starts(days, freq):
+    """
+    Day number of the period each day number falls in: the day itself, the
+    Monday of its ISO week, or the 1st of its month.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    if freq == "day":
+        return days
+    if freq == "week":
+        return days - (days + 3) % 7   # day 0 (1970-01-01) is a Thursday
+    if freq == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    raise ValueError(f"freq must be one of {RESAMPLE_FREQS}")
+
+
+class StationHistory:
+    """Sorted per-station (day, CO2) arrays; see build()."""
+
+    def __init__(self, offsets, days, co2):
+        self.offsets = offsets   # int64 [n_columns + 1]
+        self.days = days         # int32 day numbers, sorted within each column
+        self.co2 = co2           # float32, sanitized like the baseline cube
+
+    @classmethod
+    def build(cls, station_idx, days, co, n_columns):
+        """
+        From station_day columns (cube column per row, -1 = unknown; day numbers;
+        CO in mg/m³). Rows without station or date are dropped, and when a station
+        has several rows on one day the last one wins, as in build_baseline_cube.
+        """
+        station_idx = np.asarray(station_idx, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int32)
+        keep = np.flatnonzero((station_idx >= 0) & (days != DAY_MISSING))
+        order = keep[np.lexsort((days[keep], station_idx[keep]))]  # stable: file order within a day
+        col, day = station_idx[order], days[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (col[1:] != col[:-1]) | (day[1:] != day[:-1])
+        order, col = order[last], col[last]
+
+        offsets = np.zeros(n_columns + 1, dtype=np.int64)
+        np.cumsum(np.bincount(col, minlength=n_columns), out=offsets[1:])
+        return cls(offsets, days[order], sanitized_co2(np.asarray(co)[order]))
+
+    def arrays(self):
+        return {"history.offsets": self.offsets, "history.days": self.days, "history.co2": self.co2}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays["history.offsets"], arrays["history.days"], arrays["history.co2"])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _bounds(self, column, start_day, end_day):
+        lo, hi = int(self.offsets[column]), int(self.offsets[column + 1])
+        days = self.days[lo:hi]
+        return (lo + int(np.searchsorted(days, start_day, side="left")),
+                lo + int(np.searchsorted(days, end_day, side="right")))
+
+    def series(self, column, start_day, end_day):
+        """(days, co2) views of one column within [start_day, end_day]."""
+        a, b = self._bounds(column, start_day, end_day)
+        return self.days[a:b], self.co2[a:b]
+
+    def extent(self, columns):
+        """(first day, last day) over `columns`, or None if they have no rows."""
+        firsts, lasts = [], []
+        for j in columns:
+            lo, hi = int(self.offsets[j]), int(self.offsets[j + 1])
+            if hi > lo:
+                firsts.append(int(self.days[lo]))
+                lasts.append(int(self.days[hi - 1]))
+        return (min(firsts), max(lasts)) if firsts else None
+
+    def resample(self, columns, start_day, end_day, freq="day"):
+        """
+        Rows of `columns` within [start_day, end_day] aggregated per day / week /
+        month. Several columns (a city) are pooled: every station-day counts once.
+        Returns arrays {period_start, mean, min, max, count, stations}, where
+        stations = how many of the columns have rows in the period.
+        """
+        keys, values, station_counts = [], [], []
+        for j in columns:
+            days, co2 = self.series(j, start_day, end_day)
+            if len(days):
+                k = period_starts(days, freq)
+                keys.append(k)
+                values.append(co2)
+                station_counts.append(np.unique(k))   # sorted, since days are
+        if not keys:
+            empty = np.array([], dtype=np.float64)
+            return {"period_start": np.array([], dtype=np.int64), "mean": empty, "min": empty,
+                    "max": empty, "count": np.array([], dtype=np.int64), "stations": np.array([], dtype=np.int64)}
+
+        keys = np.concatenate(keys)
+        values = np.concatenate(values).astype(np.float64)
+        if len(station_counts) > 1:
+            order = np.argsort(keys, kind="stable")
+            keys, values = keys[order], values[order]
+        periods, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+        stations = np.bincount(np.searchsorted(periods, np.concatenate(station_counts)), minlength=len(periods))
+        return {
+            "period_start": periods,
+            "mean": np.add.reduceat(values, starts) / counts,
+            "min": np.minimum.reduceat(values, starts),
+            "max": np.maximum.reduceat(values, starts),
+            "count": counts,
+            "stations": stations,
+        }
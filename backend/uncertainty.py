@@ -0,0 +1,133 @@
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backend.intervention_model import intervention_effect_array
+
+# 1-sigma input uncertainty used for sampling. Synthetic stations get much wider
+# NDVI / albedo spreads (their values are invented) and a random LULC class.
+NDVI_SIGMA = {"measured": 0.03, "synthetic": 0.10}
+ALBEDO_SIGMA = {"measured": 0.01, "synthetic": 0.03}
+BASE_CO2_REL_SIGMA = 0.05      # relative error of the starting CO2 value
+WIND_LOG_SIGMA = 0.30          # lognormal spread around the play-mode wind speed
+MIXING_REL_SIGMA = 0.20        # relative spread of the mixing height
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Work above this many (station × sample) evaluations is split across processes
+MC_PARALLEL_THRESHOLD = 2_000_000
+MC_MAX_PROCESSES = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+_pool = None
+
+
+def _get_pool():
+    """
+    Lazily created process pool, reused across requests. Uses the spawn start
+    method so workers never inherit the server's threads or locks.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=MC_MAX_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _simulate_chunk(args):
+    """
+    Sample and evaluate one chunk of stations.
+    Returns (per-station percentiles, per-city sums of co2_after per sample).
+    Each station has its own RNG stream seeded by (seed, registry id), so results
+    do not depend on how stations are split into chunks.
+    """
+    (seed, station_ids, base, ndvi, albedo, lulc_factor, synthetic, city_idx, n_cities,
+     lulc_choices, efficiency, wind, mixing, stagnation, n_samples, percentiles) = args
+
+    n = len(station_ids)
+    s_base = np.empty((n, n_samples))
+    s_ndvi = np.empty((n, n_samples))
+    s_albedo = np.empty((n, n_samples))
+    s_lulc = np.empty((n, n_samples))
+    s_wind = np.full((n, n_samples), np.nan)
+    s_mixing = np.full((n, n_samples), np.nan)
+
+    for k in range(n):
+        rng = np.random.default_rng([seed, int(station_ids[k])])
+        kind = "synthetic" if synthetic[k] else "measured"
+        s_base[k] = base[k] * (1.0 + rng.normal(0.0, BASE_CO2_REL_SIGMA, n_samples))
+        s_ndvi[k] = rng.normal(ndvi[k], NDVI_SIGMA[kind], n_samples)
+        s_albedo[k] = rng.normal(albedo[k], ALBEDO_SIGMA[kind], n_samples)
+        if synthetic[k]:
+            s_lulc[k] = rng.choice(lulc_choices, n_samples)
+        else:
+            s_lulc[k] = lulc_factor[k]
+        if not np.isnan(wind):
+            s_wind[k] = np.exp(rng.normal(np.log(max(wind, 0.05)), WIND_LOG_SIGMA, n_samples))
+        if not np.isnan(mixing):
+            s_mixing[k] = np.maximum(50.0, rng.normal(mixing, MIXING_REL_SIGMA * mixing, n_samples))
+
+    after = intervention_effect_array(
+        s_base, s_ndvi, s_albedo, s_lulc, efficiency, s_wind, s_mixing, stagnation
+    )
+    after = np.clip(after, 300.0, 2000.0)
+
+    station_pct = np.percentile(after, percentiles, axis=1).T  # [n, len(percentiles)]
+
+    city_sums = np.zeros((n_cities, n_samples))
+    np.add.at(city_sums, city_idx, after)
+    return station_pct, city_sums
+
+
+def run_monte_carlo(station_ids, base, ndvi, albedo, lulc_factor, synthetic, city_idx, n_cities,
+                    lulc_choices, efficiency=np.nan, wind=np.nan, mixing=np.nan, stagnation=1.0,
+                    n_samples=2000, seed=0, percentiles=DEFAULT_PERCENTILES):
+    """
+    Monte Carlo evaluation of the intervention model.
+
+    Per-station inputs are aligned arrays; city_idx maps each station to one of
+    n_cities groups. Large runs are split into station chunks evaluated in a
+    process pool.
+
+    Returns:
+      station_pct: [stations, len(percentiles)] percentiles of co2_after
+      city_pct:    [n_cities, len(percentiles)] percentiles of the city mean co2_after
+      chunks:      number of chunks evaluated (1 = in-process)
+    """
+    station_ids = np.asarray(station_ids, dtype=np.int64)
+    n = len(station_ids)
+    city_idx = np.asarray(city_idx, dtype=np.int64)
+    percentiles = tuple(percentiles)
+
+    def _args(sl):
+        return (seed, station_ids[sl], base[sl], ndvi[sl], albedo[sl], lulc_factor[sl], synthetic[sl],
+                city_idx[sl], n_cities, lulc_choices, efficiency, wind, mixing, stagnation,
+                n_samples, percentiles)
+
+    if n * n_samples <= MC_PARALLEL_THRESHOLD or MC_MAX_PROCESSES < 2:
+        chunks = [slice(0, n)]
+        outputs = [_simulate_chunk(_args(chunks[0]))]
+    else:
+        per_chunk = max(1, MC_PARALLEL_THRESHOLD // (2 * n_samples))
+        chunks = [slice(i, min(i + per_chunk, n)) for i in range(0, n, per_chunk)]
+        outputs = list(_get_pool().map(_simulate_chunk, [_args(sl) for sl in chunks]))
+
+    station_pct = np.concatenate([o[0] for o in outputs], axis=0) if outputs else np.empty((0, len(percentiles)))
+    city_sums = sum(o[1] for o in outputs)
+    city_counts = np.bincount(city_idx, minlength=n_cities).astype(np.float64)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        city_means = city_sums / city_counts[:, None]
+    city_pct = np.percentile(city_means, percentiles, axis=1).T
+
+    return station_pct, city_pct, len(chunks)
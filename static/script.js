@@ -973,15 +973,64 @@ function getSeasonalProfileForMonth(monthIndex) {
   return { co2Factor, tempDelta, mixingBase };
 }
 
-function drawMonthlyChart(cityName) {
+// Historic monthly series per city from /station_history (null = no data)
+const cityHistoryCache = new Map();
+let monthlyChartRequest = 0;
+
+async function fetchCityMonthlyHistory(cityName) {
+  if (cityHistoryCache.has(cityName)) return cityHistoryCache.get(cityName);
+  let history = null;
+  try {
+    const res = await fetch(`${BASE_URL}/station_history?freq=month&city=` + encodeURIComponent(cityName));
+    const data = await res.json();
+    if (data.success && data.periods.length) history = data;
+  } catch (err) {
+    console.warn('Station history fetch failed', err);
+  }
+  cityHistoryCache.set(cityName, history);
+  return history;
+}
+
+// Mean CO₂ per calendar month (index 0 = Jan) over all years, weighted by station-days
+function monthlyMeansFromHistory(history) {
+  const sums = new Array(12).fill(0);
+  const counts = new Array(12).fill(0);
+  history.periods.forEach((period, i) => {
+    const m = parseInt(period.slice(5, 7), 10) - 1;
+    sums[m] += history.mean[i] * history.count[i];
+    counts[m] += history.count[i];
+  });
+  return sums.map((sum, m) => (counts[m] ? sum / counts[m] : null));
+}
+
+async function drawMonthlyChart(cityName) {
   const container = document.getElementById('monthlyChart');
   if (!container) return;
 
   const months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
-  const factors = [];
-  for (let m = 1; m <= 12; m++) {
-    const profile = getSeasonalProfileForMonth(m);
-    factors.push(profile.co2Factor);
+
+  // Real historic CO₂ for the city when station_day has it, otherwise the
+  // synthetic seasonal build-up profile
+  const request = ++monthlyChartRequest;
+  const history = cityName ? await fetchCityMonthlyHistory(cityName) : null;
+  if (request !== monthlyChartRequest) return;  // another city was selected meanwhile
+  let values;
+  let hovertemplate;
+  let yTitle;
+  let titleText;
+  if (history) {
+    values = monthlyMeansFromHistory(history);
+    hovertemplate = '<b>%{x}</b><br>Historic mean CO₂ %{y:.0f} ppm<extra></extra>';
+    yTitle = 'Mean CO₂ (ppm)';
+    titleText = `${cityName} — historic monthly CO₂ (${history.start.slice(0, 4)}–${history.end.slice(0, 4)})`;
+  } else {
+    values = [];
+    for (let m = 1; m <= 12; m++) {
+      values.push(getSeasonalProfileForMonth(m).co2Factor);
+    }
+    hovertemplate = '<b>%{x}</b><br>Relative build-up ×%{y:.2f}<extra></extra>';
+    yTitle = 'Relative build-up (×)';
+    titleText = cityName ? `${cityName} — monthly stagnation potential` : 'Monthly stagnation potential';
   }
 
   const selectedEl = document.getElementById('weatherMonth');
@@ -990,7 +1039,7 @@ function drawMonthlyChart(cityName) {
     ? (new Date().getMonth())
     : (parseInt(selectedVal, 10) - 1);
 
-  const barColors = factors.map((f, idx) => {
+  const barColors = values.map((v, idx) => {
     const alpha = idx === selIndex ? 0.95 : 0.45;
     const base = idx === selIndex ? [56, 189, 248] : [148, 163, 184];
     return `rgba(${base[0]},${base[1]},${base[2]},${alpha})`;
@@ -999,24 +1048,24 @@ function drawMonthlyChart(cityName) {
   const data = [{
     type: 'bar',
     x: months,
-    y: factors,
+    y: values,
     marker: {
       color: barColors,
       line: { width: 1, color: 'rgba(15,23,42,1)' }
     },
-    hovertemplate: '<b>%{x}</b><br>Relative build-up ×%{y:.2f}<extra></extra>'
+    hovertemplate
   }];
 
   const layout = {
     title: {
-      text: cityName ? `${cityName} — monthly stagnation potential` : 'Monthly stagnation potential',
+      text: titleText,
       font: { size: 12, color: '#e5e7eb' }
     },
     margin: { t: 40, l: 40, r: 10, b: 40 },
     paper_bgcolor: 'rgba(15,23,42,0)',
     plot_bgcolor: 'rgba(15,23,42,0.9)',
     xaxis: { tickfont: { size: 11, color: '#9ca3af' } },
-    yaxis: { tickfont: { size: 11, color: '#9ca3af' }, title: 'Relative build-up (×)' }
+    yaxis: { tickfont: { size: 11, color: '#9ca3af' }, title: yTitle }
   };
 
   Plotly.react('monthlyChart', data, layout, { displaylogo: false, responsive: true });
@@ -0,0 +1,120 @@
+# chunked_datasets.py
+"""
+Encrypt / decrypt / verify chunked dataset containers (*.csv.cenc).
+
+A container holds row-aligned chunks that are each encrypted and authenticated
+on their own, plus an encrypted manifest with per-chunk row counts and sha256
+checksums. The app prefers encrypted/<name>.csv.cenc over <name>.csv.enc and
+decrypts its chunks in parallel while parsing them.
+
+Encrypt a plain CSV, or convert an existing single-token .enc file:
+    python tools/chunked_datasets.py encrypt station_day.csv encrypted/station_day.csv.cenc
+    python tools/chunked_datasets.py encrypt encrypted/station_day.csv.enc encrypted/station_day.csv.cenc
+
+Decrypt back to CSV (streamed, chunk by chunk), or only check every chunk:
+    python tools/chunked_datasets.py decrypt encrypted/station_day.csv.cenc station_day.csv
+    python tools/chunked_datasets.py verify encrypted/station_day.csv.cenc
+
+Needs DATA_FERNET_KEY (env, .env or app_config.bin), the same key as the .enc files.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from cryptography.fernet import Fernet
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from backend import config_loader  # noqa: E402
+from backend.chunked_dataset import (  # noqa: E402
+    ChunkedReader, container_key, decrypt_container, write_container,
+    DEFAULT_CHUNK_ROWS, DEFAULT_WORKERS,
+)
+
+
+def _secret():
+    # same config as the app (.env or app_config.bin, both relative to the project root)
+    cwd = os.getcwd()
+    os.chdir(ROOT_DIR)
+    try:
+        config_loader.load_config()
+    finally:
+        os.chdir(cwd)
+    key = os.environ.get("DATA_FERNET_KEY")
+    if not key:
+        raise RuntimeError("DATA_FERNET_KEY env var is required")
+    return key.encode("utf-8")
+
+
+def _source_lines(src, secret):
+    """Lines of the plaintext CSV; single-token .enc files are decrypted first."""
+    if src.endswith(".enc"):
+        with open(src, "rb") as f:
+            return io.BytesIO(Fernet(secret).decrypt(f.read()))
+    return open(src, "rb")
+
+
+def cmd_encrypt(args):
+    secret = _secret()
+    t0 = time.perf_counter()
+    with _source_lines(args.src, secret) as lines:
+        manifest = write_container(
+            args.dst, lines, container_key(secret),
+            rows_per_chunk=args.rows_per_chunk, source_name=os.path.basename(args.src),
+        )
+    print(f"Encrypted {args.src} -> {args.dst}: {manifest['total_rows']} rows in "
+          f"{len(manifest['chunks'])} chunks ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+def cmd_decrypt(args):
+    t0 = time.perf_counter()
+    tmp = f"{args.dst}.tmp"
+    with open(tmp, "wb") as out:
+        rows = decrypt_container(args.src, container_key(_secret()), out, workers=args.workers)
+    os.replace(tmp, args.dst)
+    print(f"Decrypted {args.src} -> {args.dst}: {rows} rows ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+def cmd_verify(args):
+    t0 = time.perf_counter()
+    with ChunkedReader(args.src, container_key(_secret())) as reader:
+        n_bytes = 0
+        for plain in reader.iter_chunks(workers=args.workers):
+            n_bytes += len(plain)
+        manifest = reader.manifest
+    print(f"OK {args.src}: {manifest['total_rows']} rows, {len(manifest['chunks'])} chunks, "
+          f"{n_bytes} plaintext bytes ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enc = sub.add_parser("encrypt", help="CSV or .enc -> chunked container")
+    enc.add_argument("src")
+    enc.add_argument("dst")
+    enc.add_argument("--rows-per-chunk", type=int, default=DEFAULT_CHUNK_ROWS)
+    enc.set_defaults(func=cmd_encrypt)
+
+    dec = sub.add_parser("decrypt", help="chunked container -> CSV")
+    dec.add_argument("src")
+    dec.add_argument("dst")
+    dec.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    dec.set_defaults(func=cmd_decrypt)
+
+    ver = sub.add_parser("verify", help="authenticate + checksum every chunk")
+    ver.add_argument("src")
+    ver.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ver.set_defaults(func=cmd_verify)
+
+    args = parser.parse_args()
+    if getattr(args, "rows_per_chunk", 1) < 1:
+        parser.error("--rows-per-chunk must be >= 1")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
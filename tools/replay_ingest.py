@@ -0,0 +1,333 @@
+# replay_ingest.py
+"""
+Replay recorded (or synthetic) CPCB / OpenAQ payloads through the live
+ingestion pipeline (fetch -> parse -> match -> estimate) against a local
+stand-in server, and report records/second and peak memory per stage.
+
+Record real payloads first (run from the project root):
+    LIVE_CAPTURE_DIR=captures python app.py
+
+Replay them, scaled to 10x the stations:
+    python tools/replay_ingest.py --captures captures --scale 10
+
+No captures? Generate a synthetic feed around our own stations:
+    python tools/replay_ingest.py --synthetic 300 --scale 10
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app resolves datasets / DBs relative to the project root
+os.chdir(ROOT_DIR)
+sys.path.insert(0, ROOT_DIR)
+# never start the background refresher (it would poll the real feeds)
+os.environ["LIVE_REFRESH_INTERVAL_SECONDS"] = "0"
+os.environ.pop("LIVE_CAPTURE_DIR", None)
+
+import app  # noqa: E402
+
+# station registry + DBs, no background threads
+app.create_app(start_background=False)
+
+
+# ----------------------- Payload sources -----------------------
+
+def _newest(paths):
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def load_captured_cpcb(captures_dir):
+    path = _newest(glob.glob(os.path.join(captures_dir, "cpcb", "*.json")))
+    if not path:
+        return None
+    print("[replay] CPCB payload:", path)
+    with open(path, "rb") as f:
+        return json.loads(f.read().decode("utf-8"))
+
+
+def load_captured_openaq(captures_dir):
+    """
+    { param_id: [result, ...] } from the newest capture of every
+    parameters_<id>_latest_p<page> file.
+    """
+    newest_page = {}
+    for path in glob.glob(os.path.join(captures_dir, "openaq", "parameters_*_latest_p*_*.json")):
+        m = re.match(r"parameters_(\d+)_latest_p(\d+)_\d+\.json$", os.path.basename(path))
+        if not m:
+            continue
+        key = (int(m.group(1)), int(m.group(2)))
+        if key not in newest_page or os.path.getmtime(path) > os.path.getmtime(newest_page[key]):
+            newest_page[key] = path
+
+    results_by_param = {}
+    for (param_id, _page), path in sorted(newest_page.items()):
+        with open(path, "rb") as f:
+            payload = json.loads(f.read().decode("utf-8"))
+        results_by_param.setdefault(param_id, []).extend(payload.get("results") or [])
+    return results_by_param or None
+
+
+def synthetic_cpcb(n_stations, rng):
+    """CPCB-shaped feed with n_stations placed within a few km of our own stations."""
+    cities = {}
+    for i in range(n_stations):
+        s = app.stations[i % len(app.stations)]
+        cities.setdefault((s["state"], s["city"]), []).append({
+            "stationName": f"Synthetic {i}",
+            "latitude": str(round(s["lat"] + rng.uniform(-0.03, 0.03), 5)),
+            "longitude": str(round(s["lon"] + rng.uniform(-0.03, 0.03), 5)),
+            "lastUpdate": time.strftime("%d-%m-%Y %H:00:00"),
+            "pollutants": [
+                {"indexId": "PM2.5", "avg": str(rng.randint(20, 250))},
+                {"indexId": "PM10", "avg": str(rng.randint(40, 400))},
+                {"indexId": "NO2", "avg": str(rng.randint(5, 90))},
+                {"indexId": "CO", "avg": str(round(rng.uniform(0.2, 3.0), 2))},
+            ],
+        })
+
+    states = {}
+    for (state, city), stations_in_city in cities.items():
+        states.setdefault(state, []).append({"cityId": city, "stationsInCity": stations_in_city})
+    return [{"stateId": state, "citiesInState": city_list} for state, city_list in states.items()]
+
+
+def synthetic_openaq(cpcb_payload):
+    """OpenAQ latest results derived from a CPCB-shaped payload (one result per pollutant)."""
+    readings, _ = app.parse_cpcb_payload(cpcb_payload)
+    now_iso = time.strftime("%Y-%m-%dT%H:00:00Z", time.gmtime())
+    results_by_param = {}
+    for loc_id, r in enumerate(readings or []):
+        for param_id, (pollutant, unit_factor) in app.OPENAQ_PARAMETERS.items():
+            v = r["pollutants"].get(pollutant)
+            if v is None:
+                continue
+            results_by_param.setdefault(param_id, []).append({
+                "locationsId": loc_id,
+                "sensorsId": loc_id * 10 + param_id,
+                "value": v / unit_factor,
+                "coordinates": {"latitude": r["lat"], "longitude": r["lon"]},
+                "datetime": {"utc": now_iso},
+            })
+    return results_by_param
+
+
+# ----------------------- Scaling -----------------------
+
+def _jitter(value, rng, spread=0.01):
+    try:
+        return str(round(float(value) + rng.uniform(-spread, spread), 5))
+    except (TypeError, ValueError):
+        return value
+
+
+def scale_cpcb(payload, factor, rng):
+    """Duplicate every CPCB station `factor` times with slightly shifted coordinates."""
+    if factor <= 1:
+        return payload
+    state_objs = copy.deepcopy(app._cpcb_state_objs(payload))
+    for state_obj in state_objs:
+        for city_obj in state_obj.get("citiesInState") or state_obj.get("cities") or []:
+            key = "stationsInCity" if "stationsInCity" in city_obj else "stations"
+            originals = city_obj.get(key) or []
+            scaled = list(originals)
+            for k in range(1, factor):
+                for st in originals:
+                    dup = copy.deepcopy(st)
+                    dup["stationName"] = f"{st.get('stationName', 'station')} #{k}"
+                    dup["latitude"] = _jitter(st.get("latitude"), rng)
+                    dup["longitude"] = _jitter(st.get("longitude"), rng)
+                    scaled.append(dup)
+            city_obj[key] = scaled
+    return state_objs
+
+
+def scale_openaq(results_by_param, factor, rng):
+    if factor <= 1:
+        return results_by_param
+    scaled = {}
+    for param_id, results in results_by_param.items():
+        out = list(results)
+        for k in range(1, factor):
+            for r in results:
+                dup = copy.deepcopy(r)
+                coords = dup.get("coordinates") or {}
+                if isinstance(coords, dict) and coords.get("latitude") is not None:
+                    coords["latitude"] = float(coords["latitude"]) + rng.uniform(-0.01, 0.01)
+                    coords["longitude"] = float(coords["longitude"]) + rng.uniform(-0.01, 0.01)
+                out.append(dup)
+        scaled[param_id] = out
+    return scaled
+
+
+# ----------------------- Stand-in server -----------------------
+
+def start_standin_server(cpcb_payload, results_by_param):
+    """Serve /cpcb and the OpenAQ v3 resources the app uses, on a free local port."""
+    cpcb_body = json.dumps(cpcb_payload).encode("utf-8")
+    location_ids = sorted({
+        r.get("locationsId") for results in results_by_param.values() for r in results
+        if r.get("locationsId") is not None
+    })
+
+    def _page(items, query):
+        limit = int(query.get("limit", [app.OPENAQ_LIMIT])[0])
+        page = int(query.get("page", [1])[0])
+        start = (page - 1) * limit
+        return {"meta": {"found": len(items), "page": page, "limit": limit},
+                "results": items[start:start + limit]}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            m = re.match(r"^/v3/parameters/(\d+)/latest$", url.path)
+            if url.path == "/cpcb":
+                body = cpcb_body
+            elif url.path == "/v3/locations":
+                body = json.dumps(_page([{"id": i} for i in location_ids], query)).encode("utf-8")
+            elif m:
+                body = json.dumps(_page(results_by_param.get(int(m.group(1)), []), query)).encode("utf-8")
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ----------------------- Measurement -----------------------
+
+def measure(report, stage, n_records, fn):
+    """Run fn() once, recording wall time and peak traced memory for the stage."""
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    n = n_records(result) if callable(n_records) else n_records
+    report.append({
+        "stage": stage,
+        "records": n,
+        "seconds": elapsed,
+        "records_per_s": (n / elapsed) if elapsed > 0 else float("inf"),
+        "peak_mib": max(0, peak - base) / (1024 * 1024),
+    })
+    return result
+
+
+def print_report(report):
+    print(f"{'stage':<22}{'records':>10}{'seconds':>11}{'records/s':>14}{'peak MiB':>11}")
+    for row in report:
+        print(f"{row['stage']:<22}{row['records']:>10}{row['seconds']:>11.4f}"
+              f"{row['records_per_s']:>14.0f}{row['peak_mib']:>11.2f}")
+
+
+def run(cpcb_payload, results_by_param, base_url):
+    import requests
+
+    report = []
+
+    # ---- CPCB ----
+    app.CPCB_FEED_URL = f"{base_url}/cpcb"
+    payload = measure(report, "cpcb.fetch", lambda p: sum(1 for _ in _iter_cpcb_stations(p)),
+                      lambda: requests.get(app.CPCB_FEED_URL, timeout=60).json())
+    readings, _ = measure(report, "cpcb.parse", lambda r: len(r[0] or []),
+                          lambda: app.parse_cpcb_payload(payload))
+    matches = measure(report, "cpcb.match", len(readings),
+                      lambda: app.match_readings_to_stations(readings))
+    measure(report, "cpcb.estimate", len(matches), lambda: app.build_live_maps(matches))
+    measure(report, "cpcb.end_to_end", len(readings), lambda: app.refresh_live_from_cpcb(timeout=60))
+
+    # ---- OpenAQ ----
+    app.OPENAQ_BASE_URL = f"{base_url}/v3"
+    app.OPENAQ_MAX_CALLS_PER_MIN = 10 ** 6
+    app.OPENAQ_API_KEY = app.OPENAQ_API_KEY or "replay"
+    n_points = sum(len(v) for v in results_by_param.values())
+
+    india_ids = measure(report, "openaq.locations", lambda ids: len(ids or ()),
+                        lambda: app.fetch_openaq_india_location_ids(timeout=60))
+    fetched = measure(report, "openaq.fetch", n_points, lambda: app.fetch_openaq_latest(timeout=60))
+    readings, _ = measure(report, "openaq.parse", lambda r: len(r[0]),
+                          lambda: app.parse_openaq_results(fetched, india_ids))
+    matches = measure(report, "openaq.match", len(readings),
+                      lambda: app.match_readings_to_stations(readings))
+    measure(report, "openaq.estimate", len(matches),
+            lambda: app.build_live_maps(matches, merge_pollutants=True))
+
+    app.openaq_live_cache = {}
+    app.openaq_locations_cache = {}
+    measure(report, "openaq.end_to_end", n_points, lambda: app.refresh_live_from_openaq(timeout=60))
+
+    return report
+
+
+def _iter_cpcb_stations(payload):
+    for state_obj in app._cpcb_state_objs(payload):
+        for city_obj in state_obj.get("citiesInState") or state_obj.get("cities") or []:
+            for st in city_obj.get("stationsInCity") or city_obj.get("stations") or []:
+                yield st
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--captures", help="directory written by LIVE_CAPTURE_DIR")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="generate a synthetic feed with this many CPCB stations")
+    parser.add_argument("--scale", type=int, default=1, help="duplicate every upstream station N times")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    cpcb_payload = load_captured_cpcb(args.captures) if args.captures else None
+    results_by_param = load_captured_openaq(args.captures) if args.captures else None
+    if cpcb_payload is None:
+        cpcb_payload = synthetic_cpcb(args.synthetic or len(app.stations), rng)
+    if results_by_param is None:
+        results_by_param = synthetic_openaq(cpcb_payload)
+
+    cpcb_payload = scale_cpcb(cpcb_payload, args.scale, rng)
+    results_by_param = scale_openaq(results_by_param, args.scale, rng)
+
+    server = start_standin_server(cpcb_payload, results_by_param)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print("[replay] stand-in server at", base_url)
+
+    tracemalloc.start()
+    try:
+        report = run(cpcb_payload, results_by_param, base_url)
+    finally:
+        tracemalloc.stop()
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()